@@ -0,0 +1,66 @@
+"""Add unique key on trading_pairs (exchange_id, symbol)
+
+Revision ID: 3f8a1c2d9b47
+Revises: 54c7ab8212f9
+Create Date: 2024-12-02 10:15:42.318204+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f8a1c2d9b47'
+down_revision = '54c7ab8212f9'
+branch_labels = None
+depends_on = None
+
+# 引用 trading_pairs.id 的表
+REFERENCING_TABLES = [
+    'market_data',
+    'order_books',
+    'order_book_depths',
+    'large_trade_records',
+    'kline_data',
+    'historical_metrics',
+    'market_analysis',
+]
+
+
+def _table_exists(table):
+    return sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade() -> None:
+    # 合併重複的交易對：引用改指向最小 id，再刪除其餘記錄
+    op.execute("""
+        CREATE TEMP TABLE trading_pair_duplicates AS
+        SELECT id, MIN(id) OVER (PARTITION BY exchange_id, symbol) AS keep_id
+        FROM trading_pairs
+    """)
+    op.execute("DELETE FROM trading_pair_duplicates WHERE id = keep_id")
+    for table in REFERENCING_TABLES:
+        # 部分表只由 create_all 建立，新環境中可能尚未存在
+        if not _table_exists(table):
+            continue
+        op.execute(f"""
+            UPDATE {table} t
+            SET trading_pair_id = d.keep_id
+            FROM trading_pair_duplicates d
+            WHERE t.trading_pair_id = d.id
+        """)
+    op.execute("""
+        DELETE FROM trading_pairs
+        WHERE id IN (SELECT id FROM trading_pair_duplicates)
+    """)
+    op.execute("DROP TABLE trading_pair_duplicates")
+
+    op.create_unique_constraint(
+        'uq_trading_pairs_exchange_symbol',
+        'trading_pairs',
+        ['exchange_id', 'symbol']
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_trading_pairs_exchange_symbol', 'trading_pairs', type_='unique')
@@ -0,0 +1,37 @@
+"""Restore unique key on kline_data (trading_pair_id, timestamp, interval)
+
+Revision ID: 7c2e4b9a1d35
+Revises: 3f8a1c2d9b47
+Create Date: 2024-12-05 14:02:17.553861+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2e4b9a1d35'
+down_revision = '3f8a1c2d9b47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 移除重複的K線，保留最新寫入的一筆
+    op.execute("""
+        DELETE FROM kline_data a
+        USING kline_data b
+        WHERE a.trading_pair_id = b.trading_pair_id
+        AND a.interval = b.interval
+        AND a.timestamp = b.timestamp
+        AND a.id < b.id
+    """)
+    op.create_unique_constraint(
+        'unique_kline_data',
+        'kline_data',
+        ['trading_pair_id', 'timestamp', 'interval']
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('unique_kline_data', 'kline_data', type_='unique')
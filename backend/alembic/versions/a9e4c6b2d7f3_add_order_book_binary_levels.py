@@ -0,0 +1,37 @@
+"""Add binary encoded levels to order book tables
+
+Revision ID: a9e4c6b2d7f3
+Revises: f5b1c8d4a2e9
+Create Date: 2024-12-10 09:42:18.274615+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9e4c6b2d7f3'
+down_revision = 'f5b1c8d4a2e9'
+branch_labels = None
+depends_on = None
+
+# 現有的 JSON 檔位由 scripts/encode_order_books.py 分批轉換
+TABLES = ['order_books', 'order_book_depths']
+
+
+def _table_exists(table):
+    return sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        # 兩表皆由 create_all 建立，新環境中可能尚未存在
+        if _table_exists(table):
+            op.add_column(table, sa.Column('book_data', sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    # 只有 book_data 的資料列須先以 scripts/encode_order_books.py --decode 還原為 JSON
+    for table in TABLES:
+        if _table_exists(table):
+            op.drop_column(table, 'book_data')
@@ -0,0 +1,62 @@
+"""Add trade_bars table
+
+Revision ID: b81d6f0e2a94
+Revises: 7c2e4b9a1d35
+Create Date: 2024-12-06 09:41:52.218604+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b81d6f0e2a94'
+down_revision = '7c2e4b9a1d35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'trade_bars',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('exchange_id', sa.Integer(), nullable=False),
+        sa.Column('trading_pair_id', sa.Integer(), nullable=False),
+        sa.Column('bar_type', sa.String(length=10), nullable=False),
+        sa.Column('bar_size', sa.String(length=20), nullable=False),
+        sa.Column('open_time', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('close_time', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('open_price', sa.Float(), nullable=False),
+        sa.Column('high_price', sa.Float(), nullable=False),
+        sa.Column('low_price', sa.Float(), nullable=False),
+        sa.Column('close_price', sa.Float(), nullable=False),
+        sa.Column('volume', sa.Float(), nullable=False),
+        sa.Column('quote_volume', sa.Float(), nullable=False),
+        sa.Column('number_of_trades', sa.Integer(), nullable=False),
+        sa.Column('taker_buy_base_volume', sa.Float(), nullable=True),
+        sa.Column('taker_buy_quote_volume', sa.Float(), nullable=True),
+        sa.Column('vwap', sa.Float(), nullable=True),
+        sa.Column('first_trade_id', sa.BigInteger(), nullable=False),
+        sa.Column('last_trade_id', sa.BigInteger(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['exchange_id'], ['exchanges.id'], ),
+        sa.ForeignKeyConstraint(['trading_pair_id'], ['trading_pairs.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint(
+            'trading_pair_id', 'bar_type', 'bar_size', 'first_trade_id',
+            name='uq_trade_bars_pair_spec_first_trade'
+        )
+    )
+    op.create_index(op.f('ix_trade_bars_open_time'), 'trade_bars', ['open_time'], unique=False)
+    op.create_index(
+        'ix_trade_bars_pair_spec_time',
+        'trade_bars',
+        ['trading_pair_id', 'bar_type', 'bar_size', 'open_time'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_trade_bars_pair_spec_time', table_name='trade_bars')
+    op.drop_index(op.f('ix_trade_bars_open_time'), table_name='trade_bars')
+    op.drop_table('trade_bars')
@@ -0,0 +1,42 @@
+"""Add backfill_jobs table
+
+Revision ID: c4d9e7f1a3b6
+Revises: b81d6f0e2a94
+Create Date: 2024-12-07 10:16:43.905127+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d9e7f1a3b6'
+down_revision = 'b81d6f0e2a94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'backfill_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('symbol', sa.String(length=20), nullable=False),
+        sa.Column('timeframe', sa.String(length=10), nullable=False),
+        sa.Column('start_ms', sa.BigInteger(), nullable=False),
+        sa.Column('end_ms', sa.BigInteger(), nullable=False),
+        sa.Column('gaps', sa.JSON(), nullable=False),
+        sa.Column('cursor_ms', sa.BigInteger(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('pages_done', sa.Integer(), nullable=False),
+        sa.Column('bars_saved', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_backfill_jobs_status', 'backfill_jobs', ['status', 'symbol', 'timeframe'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_backfill_jobs_status', table_name='backfill_jobs')
+    op.drop_table('backfill_jobs')
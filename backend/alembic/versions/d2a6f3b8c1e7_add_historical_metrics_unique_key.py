@@ -0,0 +1,37 @@
+"""Add unique key on historical_metrics (trading_pair_id, timeframe, timestamp)
+
+Revision ID: d2a6f3b8c1e7
+Revises: c4d9e7f1a3b6
+Create Date: 2024-12-07 15:38:05.274416+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a6f3b8c1e7'
+down_revision = 'c4d9e7f1a3b6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 移除重複回填產生的記錄，保留最新寫入的一筆
+    op.execute("""
+        DELETE FROM historical_metrics a
+        USING historical_metrics b
+        WHERE a.trading_pair_id = b.trading_pair_id
+        AND a.timeframe = b.timeframe
+        AND a.timestamp = b.timestamp
+        AND a.id < b.id
+    """)
+    op.create_unique_constraint(
+        'uq_historical_metrics_pair_timeframe_time',
+        'historical_metrics',
+        ['trading_pair_id', 'timeframe', 'timestamp']
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_historical_metrics_pair_timeframe_time', 'historical_metrics', type_='unique')
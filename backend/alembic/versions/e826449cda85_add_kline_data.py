@@ -69,17 +69,8 @@ def upgrade():
         sa.UniqueConstraint('trading_pair_id', 'timestamp', 'interval', name='unique_kline_data')
     )
     
-    # 可選：為大型數據集創建分區
-    # 注意：這需要PostgreSQL 10+並啟用分區功能
-    """
-    op.execute('''
-        CREATE TABLE IF NOT EXISTS kline_data_y2024m01 PARTITION OF kline_data
-        FOR VALUES FROM ('2024-01-01') TO ('2024-02-01');
-        
-        CREATE TABLE IF NOT EXISTS kline_data_y2024m02 PARTITION OF kline_data
-        FOR VALUES FROM ('2024-02-01') TO ('2024-03-01');
-    ''')
-    """
+    # 時間序列表的範圍分區見 f5b1c8d4a2e9_partition_time_series_tables，
+    # 之後的分區由 app/services/partition_manager.py 維護
 
 def downgrade():
     op.drop_table('kline_data')
\ No newline at end of file
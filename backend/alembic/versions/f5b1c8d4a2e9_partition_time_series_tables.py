@@ -0,0 +1,125 @@
+"""Partition market_data, order_books and historical_metrics by timestamp range
+
+Revision ID: f5b1c8d4a2e9
+Revises: d2a6f3b8c1e7
+Create Date: 2024-12-09 11:05:27.631948+00:00
+
+"""
+from datetime import datetime, timedelta, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5b1c8d4a2e9'
+down_revision = 'd2a6f3b8c1e7'
+branch_labels = None
+depends_on = None
+
+# 之後的分區由 PartitionManager 預先建立
+PREMAKE_DAYS = 7
+
+TABLES = {
+    'market_data': {
+        'granularity': 'day',
+        'foreign_keys': {'exchange_id': 'exchanges', 'trading_pair_id': 'trading_pairs'},
+        'indexes': {'ix_market_data_timestamp': ['timestamp'], 'ix_market_data_price': ['price']},
+        'unique': {}
+    },
+    'order_books': {
+        'granularity': 'day',
+        'foreign_keys': {'exchange_id': 'exchanges', 'trading_pair_id': 'trading_pairs'},
+        'indexes': {'ix_order_books_timestamp': ['timestamp']},
+        'unique': {}
+    },
+    'historical_metrics': {
+        'granularity': 'month',
+        'foreign_keys': {'trading_pair_id': 'trading_pairs'},
+        'indexes': {'idx_historical_metrics_pair_time': ['trading_pair_id', 'timestamp', 'timeframe']},
+        'unique': {'uq_historical_metrics_pair_timeframe_time': ['trading_pair_id', 'timeframe', 'timestamp']}
+    },
+}
+
+
+def _partition_ranges(granularity, first, last):
+    """與 PartitionManager 相同的命名與範圍"""
+    if granularity == 'day':
+        current = first.replace(hour=0, minute=0, second=0, microsecond=0)
+    else:
+        current = first.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while current <= last:
+        if granularity == 'day':
+            end = current + timedelta(days=1)
+            suffix = f"y{current:%Y}m{current:%m}d{current:%d}"
+        else:
+            end = (current + timedelta(days=32)).replace(day=1)
+            suffix = f"y{current:%Y}m{current:%m}"
+        yield suffix, current, end
+        current = end
+
+
+def _utc(value):
+    # 與 PartitionManager 一致，分區範圍以 UTC 計算，無時區的值視為本地時間
+    return value.astimezone(timezone.utc)
+
+
+def _add_constraints(table, spec, primary_key):
+    op.create_primary_key(f'{table}_pkey', table, primary_key)
+    for column, referred in spec['foreign_keys'].items():
+        op.create_foreign_key(f'{table}_{column}_fkey', table, referred, [column], ['id'])
+    for name, columns in spec['unique'].items():
+        op.create_unique_constraint(name, table, columns)
+    for name, columns in spec['indexes'].items():
+        op.create_index(name, table, columns, unique=False)
+
+
+def _swap_table(table, source, partitioned):
+    """以 source 的欄位建立新表並複製數據，sequence 改由新表持有"""
+    bind = op.get_bind()
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence(:table, 'id')"), {'table': source}).scalar()
+
+    partition_clause = ' PARTITION BY RANGE ("timestamp")' if partitioned else ''
+    op.execute(f'CREATE TABLE {table} (LIKE {source} INCLUDING DEFAULTS){partition_clause}')
+    if sequence:
+        op.execute(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id')
+
+    if partitioned:
+        spec = TABLES[table]
+        bounds = bind.execute(sa.text(f'SELECT MIN("timestamp"), MAX("timestamp") FROM {source}')).fetchone()
+        now = datetime.now(timezone.utc)
+        first = _utc(bounds[0]) if bounds[0] else now
+        last = max(_utc(bounds[1]) if bounds[1] else now, now + timedelta(days=PREMAKE_DAYS))
+        for suffix, start, end in _partition_ranges(spec['granularity'], first, last):
+            op.execute(
+                f"CREATE TABLE {table}_{suffix} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{start:%Y-%m-%d %H:%M:%S}+00') TO ('{end:%Y-%m-%d %H:%M:%S}+00')"
+            )
+        op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+
+    op.execute(f'INSERT INTO {table} SELECT * FROM {source}')
+    op.execute(f'DROP TABLE {source} CASCADE')
+
+
+def _table_exists(table):
+    return sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade() -> None:
+    for table, spec in TABLES.items():
+        # order_books 由 create_all 建立，新環境中可能尚未存在
+        if not _table_exists(table):
+            continue
+        op.execute(f'ALTER TABLE {table} RENAME TO {table}_legacy')
+        _swap_table(table, f'{table}_legacy', partitioned=True)
+        # 分區表的主鍵與唯一鍵必須包含分區鍵
+        _add_constraints(table, spec, ['id', 'timestamp'])
+
+
+def downgrade() -> None:
+    for table, spec in TABLES.items():
+        if not _table_exists(table):
+            continue
+        op.execute(f'ALTER TABLE {table} RENAME TO {table}_partitioned')
+        _swap_table(table, f'{table}_partitioned', partitioned=False)
+        _add_constraints(table, spec, ['id'])
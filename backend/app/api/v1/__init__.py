@@ -1,6 +1,8 @@
 from fastapi import APIRouter
 from .historical import router as historical_router
+from .collector import router as collector_router
 
 router = APIRouter()
 
-router.include_router(historical_router)
\ No newline at end of file
+router.include_router(historical_router)
+router.include_router(collector_router)
\ No newline at end of file
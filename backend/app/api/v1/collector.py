@@ -0,0 +1,28 @@
+# app/api/v1/collector.py
+
+from typing import Dict
+from fastapi import APIRouter, HTTPException
+
+from app.core.logging import logger
+from app.data_collectors.binance.rate_limiter import read_published_status
+
+router = APIRouter(prefix="/collector", tags=["collector"])
+
+@router.get("/rate-limiter")
+async def get_rate_limiter_status() -> Dict:
+    """獲取收集進程發佈的 Binance REST 限流器狀態"""
+    try:
+        status = await read_published_status()
+    except Exception as e:
+        logger.error(f"Error reading rate limiter status: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Rate limiter status unavailable: {e}"
+        )
+
+    if status is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Rate limiter status has not been published; the collector is not running"
+        )
+    return status
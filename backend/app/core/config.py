@@ -24,6 +24,9 @@ class Settings(BaseSettings):
     # Binance API配置
     BINANCE_API_KEY: str = ""
     BINANCE_API_SECRET: str = ""
+    # 指向本地模擬器時設為 http://127.0.0.1:8900 與 ws://127.0.0.1:8900/stream
+    BINANCE_REST_BASE_URL: str = "https://api.binance.com"
+    BINANCE_WS_BASE_URL: str = "wss://stream.binance.com:9443/stream"
 
     # 歷史數據收集配置
     HISTORICAL_DATA_TIMEFRAMES: List[str] = [
@@ -35,12 +38,113 @@ class Settings(BaseSettings):
     # Binance API 限制配置
     BINANCE_RATE_LIMIT: int = 1200
     BINANCE_WEIGHT_LIMIT: int = 1000
+    BINANCE_WEIGHT_SAFETY_RATIO: float = 0.9    # 只使用權重上限的比例，預留餘量避免 429
+    BINANCE_RATE_LIMIT_RETRIES: int = 2         # 收到 429 後的重試次數
+    BINANCE_RATE_LIMITER_STATUS_ENABLED: bool = True   # 收集進程將限流器狀態寫入 Redis，供 API 讀取
+    BINANCE_RATE_LIMITER_STATUS_INTERVAL: float = 5.0  # 寫入間隔（秒），鍵在三個間隔後過期
+
+    # Binance REST 連接池配置
+    BINANCE_HTTP2: bool = True                       # 啟用 HTTP/2（h2 由 httpx[http2] 安裝，缺少時退回 HTTP/1.1）
+    BINANCE_HTTP_MAX_CONNECTIONS: int = 20
+    BINANCE_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    BINANCE_HTTP_KEEPALIVE_EXPIRY: float = 120.0     # 閒置連接保留時間（秒）
+    BINANCE_HTTP_WARMUP_CONNECTIONS: int = 4         # 啟動時預先建立的連接數
     BINANCE_MAX_LIMIT: int = 1000
+
+    # Binance WebSocket 配置
+    BINANCE_WS_STREAMS_PER_CONNECTION: int = 200    # 每個連接的流數量（官方上限 1024）
+    BINANCE_WS_MAX_MESSAGES_PER_SECOND: int = 5     # 每個連接每秒最多發送的控制消息
+    BINANCE_WS_STREAMS_PER_SUBSCRIBE: int = 100     # 單條 SUBSCRIBE 消息包含的流數量
+    BINANCE_WS_SHARD_RECONNECT_DELAY: float = 5.0   # 分片重連的初始等待時間（秒）
+    BINANCE_WS_SHARD_MAX_RECONNECT_DELAY: float = 60.0
+    BINANCE_WS_JSON_DECODER: str = "auto"           # auto / orjson / msgspec / json
+
+    # WebSocket 消息隊列配置
+    INGEST_QUEUE_MAXSIZE: int = 10000
+    INGEST_QUEUE_OVERFLOW_POLICY: str = "drop"      # drop: 記錄並丟棄可合併消息 / block: 背壓
+    INGEST_QUEUE_LAG_WARNING: float = 2.0           # 隊列延遲告警閾值（秒）
+    INGEST_QUEUE_DRAIN_TIMEOUT: float = 5.0         # 關閉時等待消費者處理完剩餘消息的時間（秒）
+    
+    # 原始消息錄製配置
+    RECORDER_ENABLED: bool = False
+    RECORDER_DIRECTORY: str = "data/recordings"
+    RECORDER_SEGMENT_MAX_BYTES: int = 256 * 1024 * 1024  # 單個分段的未壓縮大小上限
+    RECORDER_SEGMENT_MAX_SECONDS: float = 3600.0         # 單個分段的時長上限（秒）
+    RECORDER_FLUSH_INTERVAL: float = 1.0
+    RECORDER_COMPRESSION_LEVEL: int = 6
+    
+    # 市場行情來源配置
+    MARKET_DATA_SOURCE: str = "rest"                # rest: 每分鐘輪詢 24hr ticker / stream: 全市場行情流
+    MARKET_TICKER_STREAM: str = "!miniTicker@arr"   # !miniTicker@arr 或 !ticker@arr
+    MARKET_TICKER_PERSIST_INTERVAL: float = 5.0     # 行情表寫入 market_data 的合併間隔（秒）
+    
+    # K線數據流配置
+    KLINE_STREAM_ENABLED: bool = False
+    KLINE_STREAM_INTERVALS: List[str] = ['1m']      # 訂閱的 @kline_<interval>
+    KLINE_FLUSH_INTERVAL: float = 1.0               # 已收盤K線的批次寫入間隔（秒）
+    KLINE_RECONCILE_MAX_BARS: int = 1000            # 斷線補齊的最大K線數，更早的缺口交由回填處理
+    
+    # 成交聚合K線配置
+    TRADE_BARS_ENABLED: bool = True
+    # 格式為 <類型>:<大小>，類型為 time（1s/1m 等）、tick（筆數）、volume（基礎幣數量）、dollar（成交額）
+    TRADE_BAR_SPECS: List[str] = ['time:1s', 'time:1m', 'tick:1000', 'dollar:1000000']
+    TRADE_BAR_FLUSH_INTERVAL: float = 1.0       # 已收盤K線的寫入間隔（秒）
+    TRADE_BAR_TIME_GRACE: float = 2.0           # 時間K線在本地時鐘超過結束時間多久後強制收盤（秒）
+    TRADE_BAR_WRITE_BATCH_SIZE: int = 2000      # trade_bars 每批寫入列數，避免單條語句超過參數上限
+    TRADE_BAR_MAX_PENDING: int = 200000         # 寫入失敗時最多保留的待寫入列數，超出時丟棄最舊的
+    TRADE_PERSIST_RAW: bool = False             # 是否仍將每筆成交寫入 market_data；啟用大額交易監控時一律寫入
+    LARGE_TRADE_MONITOR_ENABLED: bool = True    # 大額交易監控從 market_data 讀取逐筆成交，啟用時強制寫入原始成交
+    
+    # 訂單簿輪詢配置
+    ORDER_BOOK_POLL_INTERVAL: float = 5.0   # 輪詢週期（秒）
+    ORDER_BOOK_CONCURRENCY: int = 10        # 同時進行的快照請求數
+    ORDER_BOOK_LIMIT: int = 100             # 快照檔位數（100 檔權重為 5）
+    ORDER_BOOK_STORAGE: str = "binary"      # binary: 以 orderbook_codec 寫入 book_data / json: 寫入 bids、asks
     
     # 數據收集配置
     HISTORICAL_INITIAL_DAYS: int = 30
     HISTORICAL_UPDATE_INTERVAL: int = 60
     HISTORICAL_BATCH_SIZE: int = 500
+    HISTORICAL_UPSERT_BATCH_SIZE: int = 10000   # historical_metrics 每批 upsert 列數
+    HISTORICAL_MAX_CONCURRENCY: int = 8         # 歷史K線並發請求數
+    HISTORICAL_MAX_RETRIES: int = 5             # 單頁請求的最大重試次數
+    BACKFILL_MAX_PARALLEL_JOBS: int = 4         # 同時執行的回填任務數
+    BACKFILL_PREFETCH_PAGES: int = 2            # 每個任務預取的頁數
+    ARCHIVE_IMPORT_WORKERS: int = 4             # 歷史數據壓縮檔導入的進程數
+    ARCHIVE_IMPORT_CHUNK_ROWS: int = 200000     # 每次解析的 CSV 列數
+
+    # 寫入緩衝配置
+    WRITE_BUFFER_BATCH_SIZE: int = 500          # 每批最多寫入列數
+    WRITE_BUFFER_FLUSH_INTERVAL: float = 1.0    # 最長刷新間隔（秒）
+    WRITE_BUFFER_MAX_PENDING_ROWS: int = 100000  # 緩衝上限，超過即丟棄
+    WRITE_BUFFER_MAX_RETRIES: int = 5           # 同一批連續寫入失敗的次數上限，超過後移入死信
+    WRITE_BUFFER_DEAD_LETTER_DIRECTORY: str = "data/dead_letter"  # 死信 JSONL 目錄，留空則直接丟棄
+
+    # 分區配置
+    PARTITIONING_ENABLED: bool = True           # False 時不維護範圍分區，分區表只有預設分區
+    PARTITION_TABLES: Dict[str, str] = {        # 表 → 分區粒度（day / month）
+        'market_data': 'day',
+        'order_books': 'day',
+        'historical_metrics': 'month'
+    }
+    PARTITION_PREMAKE_DAYS: int = 7             # 預先建立未來分區的天數
+    PARTITION_RETENTION_DAYS: Dict[str, int] = {}  # 表 → 保留天數，未列出的表永久保留（如 {'order_books': DATA_RETENTION_DAYS}）
+    PARTITION_DROP_EXPIRED: bool = False        # False 時只分離過期分區，保留為獨立表；True 時刪除
+    PARTITION_MAINTENANCE_INTERVAL: int = 3600  # 分區維護間隔（秒）
+
+    # 深度數據歸檔配置
+    DEPTH_ARCHIVE_AFTER_DAYS: int = 7           # 超過天數的深度數據壓縮歸檔
+    DEPTH_ARCHIVE_RETENTION_DAYS: int = 90      # 歸檔數據保留天數
+    DEPTH_ARCHIVE_BATCH_SIZE: int = 5000        # 伺服器端游標每批讀取列數
+    DEPTH_ARCHIVE_WORKERS: int = 4              # 壓縮進程數，1 時在目前線程壓縮
+    DEPTH_ARCHIVE_COMPRESSION_LEVEL: int = 6    # zlib 壓縮級別 (0-9)
+
+    # 冷存儲配置
+    COLD_STORE_ENABLED: bool = True             # 分析時優先讀取已導出的月份
+    COLD_STORE_DIRECTORY: str = "data/cold_store"
+    COLD_STORE_FORMAT: str = "parquet"          # parquet: 壓縮、按 row group 過濾 / arrow: 未壓縮 IPC，可零拷貝映射
+    COLD_STORE_COMPRESSION: str = "zstd"        # 僅用於 parquet
+    COLD_STORE_ROW_GROUP_SIZE: int = 10080      # 每個 row group 的列數（1m 週期約一週）
 
     # 波動率配置
     VOLATILITY_FACTORS: Dict[str, int] = {
@@ -12,6 +12,7 @@ class GracefulShutdown:
         self.shutdown_handlers: List[Callable] = []
         self.is_shutting_down = False
         self.background_tasks: List[asyncio.Task] = []
+        self.write_buffers: List = []
         
         # 註冊信號處理器
         signal.signal(signal.SIGTERM, self._handle_signal)
@@ -21,6 +22,19 @@ class GracefulShutdown:
         """添加退出時需要執行的處理器"""
         self.shutdown_handlers.append(handler)
     
+    def register_write_buffer(self, buffer):
+        """註冊寫入緩衝區，退出時會在其他處理器之前刷新"""
+        if buffer not in self.write_buffers:
+            self.write_buffers.append(buffer)
+    
+    async def flush_write_buffers(self):
+        """刷新並關閉所有寫入緩衝區"""
+        for buffer in self.write_buffers:
+            try:
+                await buffer.close()
+            except Exception as e:
+                logger.error(f"Error flushing write buffer: {e}")
+    
     def _handle_signal(self, signum, frame):
         """處理終止信號"""
         if self.is_shutting_down:
@@ -48,6 +62,15 @@ class GracefulShutdown:
             # 設置超時時間
             shutdown_timeout = 30  # 30秒超時
             
+            # 先刷新寫入緩衝區，避免數據庫連接關閉後丟失數據
+            try:
+                await asyncio.wait_for(
+                    self.flush_write_buffers(),
+                    timeout=shutdown_timeout
+                )
+            except asyncio.TimeoutError:
+                logger.error("Flushing write buffers timed out")
+            
             # 創建所有處理器的任務
             tasks = []
             for handler in self.shutdown_handlers:
@@ -2,12 +2,16 @@ from .tasks import DataCollectionTasks
 from .collector import BinanceDataCollector
 from .client import BinanceClient
 from .websocket import BinanceWebSocket
+from .stream_manager import BinanceStreamManager
 from .depth_collector import DepthDataManager
+from .order_book import LocalOrderBook
 
 __all__ = [
     'DataCollectionTasks',
     'BinanceDataCollector',
     'BinanceClient',
     'BinanceWebSocket',
-    'DepthDataManager'
+    'BinanceStreamManager',
+    'DepthDataManager',
+    'LocalOrderBook'
 ]
\ No newline at end of file
@@ -0,0 +1,244 @@
+# backend/app/data_collectors/binance/async_historical_collector.py
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.services.historical.backfill_planner import FetchWindow
+from .historical_collector import HistoricalDataCollector
+from .rate_limiter import (
+    AdaptiveRateLimiter,
+    binance_rate_limiter,
+    get_endpoint_weight,
+    PRIORITY_BACKFILL
+)
+
+
+class AsyncHistoricalDataCollector(HistoricalDataCollector):
+    """以 httpx 並發抓取歷史K線的收集器
+
+    時間範圍按每頁 BINANCE_MAX_LIMIT 根K線切分，各頁並發請求，
+    請求以回填優先級經過進程級限流器，不會擠佔實時收集的額度。
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        rate_limiter: Optional[AdaptiveRateLimiter] = None,
+        max_concurrency: Optional[int] = None,
+        session_factory: Optional[Callable[[], Session]] = None
+    ):
+        super().__init__(db)
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=30.0,
+            headers={'X-MBX-APIKEY': settings.BINANCE_API_KEY}
+        )
+        self.rate_limiter = rate_limiter or binance_rate_limiter
+        self.semaphore = asyncio.Semaphore(max_concurrency or settings.HISTORICAL_MAX_CONCURRENCY)
+        # 提供 session_factory 時每次保存使用獨立 session，否則串行使用 self.db
+        self.session_factory = session_factory
+        self._db_lock = asyncio.Lock()
+
+    def _plan_pages(
+        self,
+        timeframe: str,
+        start_time: datetime,
+        end_time: datetime
+    ) -> List[Tuple[int, int]]:
+        """按K線數量上限切分時間範圍，返回毫秒時間戳區間"""
+        interval_ms = settings.get_timeframe_seconds(timeframe) * 1000
+        page_ms = interval_ms * settings.BINANCE_MAX_LIMIT
+        start_ms = int(start_time.timestamp() * 1000)
+        end_ms = int(end_time.timestamp() * 1000)
+
+        pages = []
+        current = start_ms
+        while current < end_ms:
+            page_end = min(current + page_ms, end_ms)
+            # endTime 包含邊界，減 1 毫秒避免與下一頁重疊
+            pages.append((current, page_end - 1))
+            current = page_end
+        return pages
+
+    async def _fetch_page(
+        self,
+        symbol: str,
+        timeframe: str,
+        start_ms: int,
+        end_ms: int
+    ) -> List[Dict]:
+        """抓取單頁K線，遇到 429 時由限流器依 Retry-After 暫停後重試"""
+        params = {
+            'symbol': symbol,
+            'interval': timeframe,
+            'startTime': start_ms,
+            'endTime': end_ms,
+            'limit': settings.BINANCE_MAX_LIMIT
+        }
+
+        weight = get_endpoint_weight("/api/v3/klines", params)
+
+        for attempt in range(settings.HISTORICAL_MAX_RETRIES):
+            await self.rate_limiter.acquire(weight, PRIORITY_BACKFILL)
+            async with self.semaphore:
+                try:
+                    response = await self.client.get("/api/v3/klines", params=params)
+                except httpx.TransportError as e:
+                    logger.warning(f"Network error fetching {symbol} {timeframe} klines: {e}")
+                    await asyncio.sleep(2 ** attempt)
+                    continue
+
+            self.rate_limiter.update_from_headers(response.headers, response.status_code)
+            if response.status_code == 429:
+                continue
+
+            response.raise_for_status()
+            return self._parse_klines(response.json())
+
+        raise RuntimeError(
+            f"Failed to fetch {symbol} {timeframe} klines after "
+            f"{settings.HISTORICAL_MAX_RETRIES} attempts"
+        )
+
+    async def collect_historical_data_async(
+        self,
+        symbol: str,
+        timeframe: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> List[Dict]:
+        """並發收集單個交易對與週期的歷史K線並保存"""
+        try:
+            if not end_time:
+                end_time = datetime.now()
+            if not start_time:
+                start_time = end_time - timedelta(days=settings.HISTORICAL_INITIAL_DAYS)
+
+            trading_pair_id = self._get_trading_pair_id(symbol)
+            if not trading_pair_id:
+                raise ValueError(f"Trading pair not found: {symbol}")
+
+            pages = self._plan_pages(timeframe, start_time, end_time)
+            results = await asyncio.gather(*[
+                self._fetch_page(symbol, timeframe, page_start, page_end)
+                for page_start, page_end in pages
+            ])
+
+            # 各頁互不重疊，按頁順序拼接即為時間順序
+            all_klines = [kline for page in results for kline in page]
+
+            await self._save_klines(trading_pair_id, timeframe, all_klines)
+            return all_klines
+
+        except Exception as e:
+            logger.error(f"Error collecting historical data for {symbol}: {e}")
+            raise
+
+    async def collect_many(
+        self,
+        symbols: List[str],
+        timeframes: List[str],
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> Dict[Tuple[str, str], int]:
+        """同時收集多個交易對與週期，返回每組收集到的K線數量"""
+        jobs = [(symbol, timeframe) for symbol in symbols for timeframe in timeframes]
+        results = await asyncio.gather(
+            *[
+                self.collect_historical_data_async(symbol, timeframe, start_time, end_time)
+                for symbol, timeframe in jobs
+            ],
+            return_exceptions=True
+        )
+
+        counts = {}
+        for job, result in zip(jobs, results):
+            if isinstance(result, Exception):
+                logger.error(f"Backfill failed for {job[0]} {job[1]}: {result}")
+                counts[job] = 0
+            else:
+                counts[job] = len(result)
+        return counts
+
+    async def collect_windows(self, windows: List[FetchWindow]) -> Dict[Tuple[str, str], int]:
+        """抓取規劃器產生的範圍，只保存缺口內的K線，返回每組保存的K線數量"""
+        results = await asyncio.gather(
+            *[self._collect_window(window) for window in windows],
+            return_exceptions=True
+        )
+
+        counts: Dict[Tuple[str, str], int] = {}
+        for window, result in zip(windows, results):
+            key = (window.symbol, window.timeframe)
+            if isinstance(result, Exception):
+                logger.error(f"Gap fill failed for {window.symbol} {window.timeframe}: {result}")
+                result = 0
+            counts[key] = counts.get(key, 0) + result
+        return counts
+
+    async def _collect_window(self, window: FetchWindow) -> int:
+        trading_pair_id = self._get_trading_pair_id(window.symbol)
+        if not trading_pair_id:
+            raise ValueError(f"Trading pair not found: {window.symbol}")
+
+        step_ms = settings.get_timeframe_seconds(window.timeframe) * 1000
+        pages = self._plan_pages(
+            window.timeframe,
+            datetime.fromtimestamp(window.start_ms / 1000),
+            datetime.fromtimestamp((window.end_ms + step_ms) / 1000)
+        )
+        results = await asyncio.gather(*[
+            self._fetch_page(window.symbol, window.timeframe, page_start, page_end)
+            for page_start, page_end in pages
+        ])
+        klines = [kline for page in results for kline in page]
+
+        saved = sum(
+            1 for kline in klines
+            if any(start <= kline['timestamp'] <= end for start, end in window.save_ranges)
+        )
+        missing = sum(gap.bars for gap in window.gaps) - saved
+        if missing:
+            # 上市前或停機期間沒有K線，屬正常情況
+            logger.info(f"{missing} bars unavailable from exchange for {window.symbol} {window.timeframe}")
+
+        await self._save_klines(trading_pair_id, window.timeframe, klines, window.save_ranges)
+        return saved
+
+    async def _save_klines(
+        self,
+        trading_pair_id: int,
+        timeframe: str,
+        klines: List[Dict],
+        save_ranges: Optional[List[Tuple[datetime, datetime]]] = None
+    ):
+        """在線程中計算指標並保存，避免阻塞事件循環"""
+        if not klines:
+            return
+
+        if self.session_factory is None:
+            async with self._db_lock:
+                await asyncio.to_thread(
+                    self._process_and_save_klines, trading_pair_id, timeframe, klines, None, save_ranges
+                )
+            return
+
+        def save():
+            db = self.session_factory()
+            try:
+                self._process_and_save_klines(trading_pair_id, timeframe, klines, db, save_ranges)
+            finally:
+                db.close()
+
+        await asyncio.to_thread(save)
+
+    async def aclose(self):
+        """關閉 HTTP 客戶端"""
+        await self.client.aclose()
+        self.close()
@@ -0,0 +1,324 @@
+# backend/app/data_collectors/binance/bar_aggregator.py
+
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.models.market import TradeBar
+from app.services.symbol_registry import symbol_registry
+
+BAR_TYPES = ('time', 'tick', 'volume', 'dollar')
+
+
+@dataclass(frozen=True)
+class BarSpec:
+    """K線規格，例如 time:1m、tick:1000、dollar:1000000"""
+    bar_type: str
+    size: str
+    threshold: float  # time 為毫秒，其餘為筆數/數量/成交額
+
+    @classmethod
+    def parse(cls, spec: str) -> 'BarSpec':
+        bar_type, _, size = spec.partition(':')
+        if bar_type not in BAR_TYPES or not size:
+            raise ValueError(f"Invalid bar spec: {spec}")
+        if bar_type == 'time':
+            if size.endswith('s'):
+                threshold = int(size[:-1]) * 1000
+            else:
+                threshold = settings.get_timeframe_seconds(size) * 1000
+        else:
+            threshold = float(size)
+        if threshold <= 0:
+            raise ValueError(f"Invalid bar spec: {spec}")
+        return cls(bar_type, size, threshold)
+
+    def __str__(self):
+        return f"{self.bar_type}:{self.size}"
+
+
+@dataclass
+class Bar:
+    """聚合中的K線"""
+    symbol: str
+    spec: BarSpec
+    open_time: int
+    close_time: int
+    open_price: float
+    high_price: float
+    low_price: float
+    close_price: float
+    first_trade_id: int
+    last_trade_id: int
+    volume: float = 0.0
+    quote_volume: float = 0.0
+    number_of_trades: int = 0
+    taker_buy_base_volume: float = 0.0
+    taker_buy_quote_volume: float = 0.0
+
+    @classmethod
+    def open(cls, symbol: str, spec: BarSpec, open_time: int, price: float, trade_id: int) -> 'Bar':
+        return cls(
+            symbol=symbol,
+            spec=spec,
+            open_time=open_time,
+            close_time=open_time,
+            open_price=price,
+            high_price=price,
+            low_price=price,
+            close_price=price,
+            first_trade_id=trade_id,
+            last_trade_id=trade_id
+        )
+
+    def add(self, price: float, quantity: float, trade_time: int, trade_id: int, is_buyer_maker: bool):
+        quote = price * quantity
+        if price > self.high_price:
+            self.high_price = price
+        if price < self.low_price:
+            self.low_price = price
+        self.close_price = price
+        self.volume += quantity
+        self.quote_volume += quote
+        self.number_of_trades += 1
+        self.last_trade_id = trade_id
+        if trade_time > self.close_time:
+            self.close_time = trade_time
+        # 買方為掛單方時主動成交方為賣方
+        if not is_buyer_maker:
+            self.taker_buy_base_volume += quantity
+            self.taker_buy_quote_volume += quote
+
+    @property
+    def vwap(self) -> Optional[float]:
+        return self.quote_volume / self.volume if self.volume else None
+
+    def is_full(self) -> bool:
+        """信息驅動K線是否已達到閾值"""
+        if self.spec.bar_type == 'tick':
+            return self.number_of_trades >= self.spec.threshold
+        if self.spec.bar_type == 'volume':
+            return self.volume >= self.spec.threshold
+        if self.spec.bar_type == 'dollar':
+            return self.quote_volume >= self.spec.threshold
+        return False
+
+    def to_row(self, exchange_id: int, trading_pair_id: int) -> Dict[str, Any]:
+        return {
+            'exchange_id': exchange_id,
+            'trading_pair_id': trading_pair_id,
+            'bar_type': self.spec.bar_type,
+            'bar_size': self.spec.size,
+            'open_time': datetime.fromtimestamp(self.open_time / 1000, tz=timezone.utc),
+            'close_time': datetime.fromtimestamp(self.close_time / 1000, tz=timezone.utc),
+            'open_price': self.open_price,
+            'high_price': self.high_price,
+            'low_price': self.low_price,
+            'close_price': self.close_price,
+            'volume': self.volume,
+            'quote_volume': self.quote_volume,
+            'number_of_trades': self.number_of_trades,
+            'taker_buy_base_volume': self.taker_buy_base_volume,
+            'taker_buy_quote_volume': self.taker_buy_quote_volume,
+            'vwap': self.vwap,
+            'first_trade_id': self.first_trade_id,
+            'last_trade_id': self.last_trade_id,
+            'created_at': datetime.utcnow()
+        }
+
+
+class TradeBarAggregator:
+    """由 @trade 流即時聚合K線
+
+    每個交易對/規格在記憶體中只保留一根未收盤的K線。時間K線在
+    下一個時間桶的成交到達、或本地時鐘超過結束時間加寬限期時收盤；
+    筆數/成交量/成交額K線在達到閾值時收盤。收盤的K線交給訂閱者，
+    並批次寫入 trade_bars，取代逐筆寫入 market_data。
+    """
+
+    def __init__(
+        self,
+        exchange_id: int,
+        session_factory: Callable[[], Session],
+        specs: Optional[List[str]] = None,
+        flush_interval: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        max_pending: Optional[int] = None
+    ):
+        self.exchange_id = exchange_id
+        self.session_factory = session_factory
+        self.specs = [BarSpec.parse(spec) for spec in (specs or settings.TRADE_BAR_SPECS)]
+        self.flush_interval = flush_interval or settings.TRADE_BAR_FLUSH_INTERVAL
+        self.grace_ms = int(settings.TRADE_BAR_TIME_GRACE * 1000)
+        self.batch_size = batch_size or settings.TRADE_BAR_WRITE_BATCH_SIZE
+        self.max_pending = max_pending or settings.TRADE_BAR_MAX_PENDING
+
+        self.bars: Dict[Tuple[str, BarSpec], Bar] = {}
+        self.pending: List[Dict[str, Any]] = []
+        self.subscribers: List[Callable[[Bar], Any]] = []
+        self.running = False
+        self.metrics = {
+            'trades': 0,
+            'late_trades': 0,
+            'bars_closed': 0,
+            'rows_written': 0,
+            'rows_dropped': 0,
+            'flush_count': 0,
+            'flush_errors': 0,
+            'subscriber_errors': 0,
+            'last_trade_time': None
+        }
+
+    def subscribe(self, callback: Callable[[Bar], Any]):
+        """訂閱收盤的K線，回調可為同步或異步函數"""
+        self.subscribers.append(callback)
+
+    def get_open_bar(self, symbol: str, spec: str) -> Optional[Bar]:
+        """獲取未收盤的K線"""
+        return self.bars.get((symbol, BarSpec.parse(spec)))
+
+    async def handle_message(self, data: Dict):
+        """處理逐筆成交事件"""
+        symbol = data['s']
+        price = float(data['p'])
+        quantity = float(data['q'])
+        trade_time = data['T']
+        trade_id = data['t']
+        is_buyer_maker = data['m']
+        self.metrics['trades'] += 1
+        self.metrics['last_trade_time'] = trade_time
+
+        for spec in self.specs:
+            key = (symbol, spec)
+            bar = self.bars.get(key)
+
+            if spec.bar_type == 'time':
+                bucket = trade_time - trade_time % int(spec.threshold)
+                if bar is not None and bucket != bar.open_time:
+                    if bucket < bar.open_time:
+                        # 所屬的時間K線已收盤
+                        self.metrics['late_trades'] += 1
+                        continue
+                    await self._close(key)
+                    bar = None
+                if bar is None:
+                    bar = self.bars[key] = Bar.open(symbol, spec, bucket, price, trade_id)
+                bar.add(price, quantity, trade_time, trade_id, is_buyer_maker)
+                continue
+
+            if bar is None:
+                bar = self.bars[key] = Bar.open(symbol, spec, trade_time, price, trade_id)
+            bar.add(price, quantity, trade_time, trade_id, is_buyer_maker)
+            if bar.is_full():
+                await self._close(key)
+
+    async def close_expired(self, now_ms: Optional[int] = None) -> int:
+        """收盤已過結束時間的時間K線（交易稀少時不會有下一筆成交觸發）"""
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        expired = [
+            key for key, bar in self.bars.items()
+            if key[1].bar_type == 'time'
+            and bar.open_time + key[1].threshold + self.grace_ms <= now_ms
+        ]
+        for key in expired:
+            await self._close(key)
+        return len(expired)
+
+    async def _close(self, key: Tuple[str, BarSpec]):
+        bar = self.bars.pop(key)
+        self.metrics['bars_closed'] += 1
+
+        trading_pair_id = symbol_registry.get_id(bar.symbol)
+        if trading_pair_id:
+            self.pending.append(bar.to_row(self.exchange_id, trading_pair_id))
+            self._trim_pending()
+
+        for callback in self.subscribers:
+            try:
+                result = callback(bar)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                self.metrics['subscriber_errors'] += 1
+                logger.error(f"Error in bar subscriber for {bar.symbol} {bar.spec}: {e}")
+
+    async def run_persistence(self):
+        """按間隔收盤過期的時間K線並寫入，直到停止"""
+        self.running = True
+        while self.running:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.close_expired()
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error persisting trade bars: {e}")
+
+    async def flush(self) -> int:
+        """將收盤的K線寫入 trade_bars"""
+        if not self.pending:
+            return 0
+
+        rows, self.pending = self.pending, []
+        try:
+            await asyncio.to_thread(self._write, rows)
+        except Exception:
+            self.metrics['flush_errors'] += 1
+            self.pending = rows + self.pending
+            self._trim_pending()
+            raise
+
+        self.metrics['rows_written'] += len(rows)
+        self.metrics['flush_count'] += 1
+        return len(rows)
+
+    def _trim_pending(self):
+        """數據庫長時間不可用時限制待寫入列數，丟棄最舊的K線"""
+        overflow = len(self.pending) - self.max_pending
+        if overflow > 0:
+            del self.pending[:overflow]
+            self.metrics['rows_dropped'] += overflow
+            logger.warning(f"Trade bar backlog over {self.max_pending} rows, dropped {overflow} oldest bars")
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        db = self.session_factory()
+        try:
+            # 重放或重連後重複的K線以唯一鍵忽略
+            stmt = pg_insert(TradeBar.__table__).on_conflict_do_nothing(
+                index_elements=['trading_pair_id', 'bar_type', 'bar_size', 'first_trade_id']
+            )
+            for start in range(0, len(rows), self.batch_size):
+                # executemany 由 SQLAlchemy 合併為多列 VALUES 語句
+                db.execute(stmt, rows[start:start + self.batch_size])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def close(self):
+        """停止並寫入剩餘的K線；未收盤的K線不寫入"""
+        self.running = False
+        try:
+            await self.close_expired()
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Error persisting trade bars on close: {e}")
+
+    def get_metrics(self) -> Dict:
+        """獲取聚合器指標"""
+        last_trade_time = self.metrics['last_trade_time']
+        return {
+            **{k: v for k, v in self.metrics.items() if k != 'last_trade_time'},
+            'specs': [str(spec) for spec in self.specs],
+            'open_bars': len(self.bars),
+            'pending_rows': len(self.pending),
+            'data_age_seconds': time.time() - last_trade_time / 1000 if last_trade_time else None
+        }
@@ -1,7 +1,9 @@
 # backend/app/data_collectors/binance/client.py
 from typing import Dict, Optional, List
+import asyncio
 import hmac
 import hashlib
+import importlib.util
 import time
 from urllib.parse import urlencode
 import backoff
@@ -10,23 +12,95 @@ from fastapi import HTTPException
 
 from app.core.config import settings
 from app.core.logging import logger
+from .rate_limiter import binance_rate_limiter, get_endpoint_weight, PRIORITY_LIVE
 
 class BinanceClient:
-    def __init__(self):
-        self.base_url = "https://api.binance.com"
+    """Binance REST 客戶端
+
+    設計為長期存活並在收集週期之間共用，以重用 TCP/TLS 連接；
+    也可以用 `async with BinanceClient()` 臨時使用。
+    """
+
+    def __init__(self, priority: int = PRIORITY_LIVE, http2: Optional[bool] = None):
+        self.base_url = settings.BINANCE_REST_BASE_URL
         self.api_key = settings.BINANCE_API_KEY
         self.api_secret = settings.BINANCE_API_SECRET
+        # 所有實例共用進程級限流器，priority 決定排隊順序
+        self.rate_limiter = binance_rate_limiter
+        self.priority = priority
+
+        # HTTP/2 需要安裝 h2，未安裝時退回 HTTP/1.1
+        http2 = settings.BINANCE_HTTP2 if http2 is None else http2
+        if http2 and importlib.util.find_spec('h2') is None:
+            logger.info("h2 is not installed, using HTTP/1.1 for Binance REST client")
+            http2 = False
+        self.http2 = http2
+
         self.client = httpx.AsyncClient(
+            base_url=self.base_url,
             timeout=30.0,
-            limits=httpx.Limits(max_keepalive_connections=5, max_connections=10)
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.BINANCE_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.BINANCE_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.BINANCE_HTTP_KEEPALIVE_EXPIRY
+            )
         )
+        self.pool_stats = {
+            'requests': 0,
+            'new_connections': 0,
+            'tls_handshakes': 0,
+            'http_versions': {}
+        }
     
     async def __aenter__(self):
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+    
+    async def close(self):
+        """關閉連接池"""
         await self.client.aclose()
     
+    async def _trace(self, event_name: str, info: Dict):
+        """httpcore trace 回調，統計新建連接與 TLS 握手次數"""
+        if event_name == 'connection.connect_tcp.complete':
+            self.pool_stats['new_connections'] += 1
+        elif event_name == 'connection.start_tls.complete':
+            self.pool_stats['tls_handshakes'] += 1
+    
+    async def warmup(self, connections: Optional[int] = None):
+        """預先建立連接，避免第一個收集週期承擔握手延遲"""
+        # HTTP/2 在單一連接上多路復用，只需建立一條
+        count = 1 if self.http2 else (connections or settings.BINANCE_HTTP_WARMUP_CONNECTIONS)
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *[self._make_request("GET", "/api/v3/ping") for _ in range(count)],
+            return_exceptions=True
+        )
+        failures = [r for r in results if isinstance(r, Exception)]
+        if failures:
+            logger.warning(f"Connection warmup: {len(failures)}/{count} requests failed: {failures[0]}")
+        logger.info(
+            f"Warmed up {count - len(failures)} Binance connection(s) "
+            f"in {time.perf_counter() - started:.2f}s (http2={self.http2})"
+        )
+    
+    def get_pool_stats(self) -> Dict:
+        """獲取連接重用統計"""
+        requests = self.pool_stats['requests']
+        new_connections = self.pool_stats['new_connections']
+        return {
+            'http2': self.http2,
+            'requests': requests,
+            'new_connections': new_connections,
+            'reused_connections': max(requests - new_connections, 0),
+            'reuse_ratio': (requests - new_connections) / requests if requests else 0.0,
+            'tls_handshakes': self.pool_stats['tls_handshakes'],
+            'http_versions': dict(self.pool_stats['http_versions'])
+        }
+    
     def _generate_signature(self, params: Dict) -> str:
         query_string = urlencode(params)
         return hmac.new(
@@ -37,24 +111,43 @@ class BinanceClient:
     
     @backoff.on_exception(
         backoff.expo,
-        (httpx.HTTPError, TimeoutError),
+        (httpx.TransportError, TimeoutError),
         max_tries=3
     )
-    async def _make_request(self, method: str, endpoint: str, params: Optional[Dict] = None) -> Dict:
-        """通用請求方法，包含重試機制"""
-        url = f"{self.base_url}{endpoint}"
+    async def _make_request(
+        self,
+        method: str,
+        endpoint: str,
+        params: Optional[Dict] = None,
+        priority: Optional[int] = None
+    ) -> Dict:
+        """通用請求方法，按權重限流；網絡錯誤時退避重試"""
         headers = {"X-MBX-APIKEY": self.api_key} if self.api_key else {}
+        weight = get_endpoint_weight(endpoint, params)
+        priority = self.priority if priority is None else priority
         
-        try:
+        for attempt in range(settings.BINANCE_RATE_LIMIT_RETRIES + 1):
+            await self.rate_limiter.acquire(weight, priority)
             response = await self.client.request(
                 method,
-                url,
+                endpoint,
                 params=params,
-                headers=headers
+                headers=headers,
+                extensions={'trace': self._trace}
             )
+            self.pool_stats['requests'] += 1
+            versions = self.pool_stats['http_versions']
+            versions[response.http_version] = versions.get(response.http_version, 0) + 1
+            self.rate_limiter.update_from_headers(response.headers, response.status_code)
+            
+            # 429 時限流器已依 Retry-After 暫停，下次 acquire 會等待；418 為封禁，不再重試
+            if response.status_code != 429 or attempt == settings.BINANCE_RATE_LIMIT_RETRIES:
+                break
+        
+        try:
             response.raise_for_status()
             return response.json()
-        except httpx.HTTPError as e:
+        except httpx.HTTPStatusError as e:
             logger.error(f"HTTP error occurred: {str(e)}")
             raise HTTPException(status_code=response.status_code, detail=str(e))
         except Exception as e:
@@ -63,7 +156,9 @@ class BinanceClient:
 
     async def get_exchange_info(self) -> Dict:
         """獲取交易所規則和交易對信息"""
-        return await self._make_request("GET", "/api/v3/exchangeInfo")
+        exchange_info = await self._make_request("GET", "/api/v3/exchangeInfo")
+        self.rate_limiter.configure_from_exchange_info(exchange_info)
+        return exchange_info
     
     async def get_ticker_24h(self, symbol: Optional[str] = None) -> Dict:
         """獲取24小時價格變動情況"""
@@ -77,8 +172,15 @@ class BinanceClient:
         params = {'symbol': symbol, 'limit': limit}
         return await self._make_request("GET", "/api/v3/depth", params)
 
-    async def get_klines(self, symbol: str, interval: str, limit: int = 500) -> List:
-        """獲取K線數據
+    async def get_klines(
+        self,
+        symbol: str,
+        interval: str,
+        limit: int = 500,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None
+    ) -> List:
+        """獲取K線數據，start_time/end_time 為毫秒時間戳
         intervals: 1m,3m,5m,15m,30m,1h,2h,4h,6h,8h,12h,1d,3d,1w,1M
         """
         params = {
@@ -86,4 +188,8 @@ class BinanceClient:
             'interval': interval,
             'limit': limit
         }
+        if start_time is not None:
+            params['startTime'] = start_time
+        if end_time is not None:
+            params['endTime'] = end_time
         return await self._make_request("GET", "/api/v3/klines", params)
\ No newline at end of file
@@ -2,18 +2,34 @@
 from datetime import datetime
 from typing import List, Dict, Optional
 import asyncio
+from contextlib import asynccontextmanager
 from sqlalchemy.orm import Session
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import SQLAlchemyError
 from app.core.config import settings
 from app.core.logging import logger
 from app.models.market import Exchange, TradingPair, MarketData, OrderBook
+from app.services.symbol_registry import symbol_registry
+from app.utils.bulk_copy import bulk_insert_columns
+from app.utils.orderbook_codec import storage_columns
 from .client import BinanceClient
 
+# 24hr ticker 寫入 market_data 的欄位
+MARKET_DATA_COLUMNS = (
+    'exchange_id', 'trading_pair_id', 'timestamp', 'price', 'side',
+    'open_price', 'high_price', 'low_price', 'close_price', 'volume',
+    'quote_volume', 'number_of_trades', 'price_change', 'price_change_percent',
+    'taker_buy_base_volume', 'taker_buy_quote_volume', 'weighted_average_price',
+    'created_at', 'updated_at'
+)
+
 class BinanceDataCollector:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, client: Optional[BinanceClient] = None):
         self.db = db
+        self.client = client  # 由收集運行時持有的共用客戶端
         self.exchange_id = self._get_or_create_exchange()
-        self.active_pairs = {}  # 緩存活動的交易對
+        self.symbol_registry = symbol_registry
     
     def _get_or_create_exchange(self) -> int:
         """獲取或創建交易所記錄"""
@@ -22,7 +38,7 @@ class BinanceDataCollector:
             if not exchange:
                 exchange = Exchange(
                     name="Binance",
-                    api_url="https://api.binance.com",
+                    api_url=settings.BINANCE_REST_BASE_URL,
                     status="active",
                     api_key=settings.BINANCE_API_KEY,
                     api_secret=settings.BINANCE_API_SECRET
@@ -37,138 +53,185 @@ class BinanceDataCollector:
     
     def _get_trading_pair_id(self, symbol: str) -> Optional[int]:
         """獲取交易對ID"""
-        if symbol in self.active_pairs:
-            return self.active_pairs[symbol]
-            
-        pair = self.db.query(TradingPair).filter_by(
-            exchange_id=self.exchange_id,
-            symbol=symbol,
-            is_active=1
-        ).first()
-        
-        if pair:
-            self.active_pairs[symbol] = pair.id
-            return pair.id
-        return None
+        return self.symbol_registry.get_id(symbol)
     
-    async def collect_trading_pairs(self) -> List[TradingPair]:
-        """收集並更新交易對信息"""
-        try:
+    @asynccontextmanager
+    async def _get_client(self):
+        """優先使用共用客戶端，未提供時建立臨時客戶端"""
+        if self.client is not None:
+            yield self.client
+        else:
             async with BinanceClient() as client:
+                yield client
+    
+    async def collect_trading_pairs(self) -> Dict[str, int]:
+        """以單條 upsert 同步交易對信息，返回 symbol → id 映射"""
+        try:
+            async with self._get_client() as client:
                 exchange_info = await client.get_exchange_info()
-                
-                pairs = []
-                for symbol_info in exchange_info['symbols']:
-                    if symbol_info['status'] != 'TRADING':
-                        continue
-                        
-                    pair = self.db.query(TradingPair).filter_by(
-                        exchange_id=self.exchange_id,
-                        symbol=symbol_info['symbol']
-                    ).first()
-                    
-                    if not pair:
-                        pair = TradingPair(
-                            exchange_id=self.exchange_id,
-                            symbol=symbol_info['symbol'],
-                            base_currency=symbol_info['baseAsset'],
-                            quote_currency=symbol_info['quoteAsset'],
-                            is_active=1
-                        )
-                        self.db.add(pair)
-                        pairs.append(pair)
-                    
-                    # 更新緩存
-                    self.active_pairs[symbol_info['symbol']] = pair.id
-                
-                if pairs:
-                    self.db.commit()
-                return pairs
+            
+            now = datetime.utcnow()
+            rows = [
+                {
+                    'exchange_id': self.exchange_id,
+                    'symbol': symbol_info['symbol'],
+                    'base_currency': symbol_info['baseAsset'],
+                    'quote_currency': symbol_info['quoteAsset'],
+                    'is_active': 1 if symbol_info['status'] == 'TRADING' else 0,
+                    'created_at': now,
+                    'updated_at': now
+                }
+                for symbol_info in exchange_info['symbols']
+            ]
+            if not rows:
+                return {}
+            
+            stmt = pg_insert(TradingPair).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                constraint='uq_trading_pairs_exchange_symbol',
+                set_={
+                    'base_currency': stmt.excluded.base_currency,
+                    'quote_currency': stmt.excluded.quote_currency,
+                    'is_active': stmt.excluded.is_active,
+                    'updated_at': stmt.excluded.updated_at
+                }
+            ).returning(TradingPair.symbol, TradingPair.id)
+            pair_ids = {symbol: pair_id for symbol, pair_id in self.db.execute(stmt)}
+            
+            # 已從 exchangeInfo 移除的交易對標記為停用
+            self.db.execute(
+                update(TradingPair)
+                .where(
+                    TradingPair.exchange_id == self.exchange_id,
+                    TradingPair.is_active == 1,
+                    TradingPair.symbol.not_in(list(pair_ids))
+                )
+                .values(is_active=0, updated_at=now)
+            )
+            self.db.commit()
+            
+            # 刷新共用註冊表
+            self.symbol_registry.load(self.db, self.exchange_id)
+            self.symbol_registry.update_from_exchange_info(exchange_info)
+            
+            logger.info(
+                f"Upserted {len(pair_ids)} trading pairs "
+                f"({len(self.symbol_registry.symbols())} active)"
+            )
+            return pair_ids
                 
         except Exception as e:
             logger.error(f"Error collecting trading pairs: {str(e)}")
             self.db.rollback()
             raise
     
-    async def collect_market_data(self, symbols: Optional[List[str]] = None) -> List[MarketData]:
-        """收集市場數據"""
+    async def collect_market_data(self, symbols: Optional[List[str]] = None) -> int:
+        """收集市場數據，以欄位陣列批次寫入，返回寫入筆數"""
         try:
-            async with BinanceClient() as client:
+            async with self._get_client() as client:
                 tickers = await client.get_ticker_24h()
-                if isinstance(tickers, dict):  # 單一交易對的情況
-                    tickers = [tickers]
-                
-                if symbols:
-                    tickers = [t for t in tickers if t['symbol'] in symbols]
-                
-                market_data = []
-                for ticker in tickers:
-                    pair_id = self._get_trading_pair_id(ticker['symbol'])
-                    if not pair_id:
-                        continue
-                    
-                    # 確保價格和交易方向不為空
-                    close_price = float(ticker['lastPrice'])
-                    open_price = float(ticker['openPrice'])
-                    
-                    data = MarketData(
-                        exchange_id=self.exchange_id,
-                        trading_pair_id=pair_id,
-                        timestamp=datetime.now(),
-                        # 設置 price 為收盤價
-                        price=close_price,
-                        # 根據價格變動決定交易方向
-                        side='buy' if close_price >= open_price else 'sell',
-                        open_price=open_price,
-                        high_price=float(ticker['highPrice']),
-                        low_price=float(ticker['lowPrice']),
-                        close_price=close_price,
-                        volume=float(ticker['volume']),
-                        quote_volume=float(ticker['quoteVolume']),
-                        number_of_trades=int(ticker['count']),
-                        price_change=float(ticker['priceChange']),
-                        price_change_percent=float(ticker['priceChangePercent']),
-                        taker_buy_base_volume=float(ticker.get('takerBuyBaseVolume', 0)),
-                        taker_buy_quote_volume=float(ticker.get('takerBuyQuoteVolume', 0)),
-                        weighted_average_price=float(ticker.get('weightedAvgPrice', close_price))
-                    )
-                    self.db.add(data)
-                    market_data.append(data)
-                
-                if market_data:
-                    self.db.commit()
-                    logger.info(f"Collected {len(market_data)} market data records")
-                return market_data
+            if isinstance(tickers, dict):  # 單一交易對的情況
+                tickers = [tickers]
+            
+            if symbols:
+                symbol_set = set(symbols)
+                tickers = [t for t in tickers if t['symbol'] in symbol_set]
+            
+            columns = self._tickers_to_columns(tickers, datetime.now())
+            row_count = len(columns['trading_pair_id'])
+            if row_count:
+                method = bulk_insert_columns(self.db, MarketData.__table__, columns)
+                self.db.commit()
+                logger.info(f"Collected {row_count} market data records ({method})")
+            return row_count
                 
         except Exception as e:
             logger.error(f"Error collecting market data: {str(e)}")
             self.db.rollback()
             raise
     
+    def _tickers_to_columns(self, tickers: List[Dict], timestamp: datetime) -> Dict[str, List]:
+        """將 24hr ticker 陣列轉換為 market_data 欄位陣列，不建立 ORM 物件"""
+        columns: Dict[str, List] = {name: [] for name in MARKET_DATA_COLUMNS}
+        now = datetime.utcnow()
+        
+        for ticker in tickers:
+            pair_id = self._get_trading_pair_id(ticker['symbol'])
+            if not pair_id:
+                continue
+            
+            close_price = float(ticker['lastPrice'])
+            open_price = float(ticker['openPrice'])
+            
+            columns['exchange_id'].append(self.exchange_id)
+            columns['trading_pair_id'].append(pair_id)
+            columns['timestamp'].append(timestamp)
+            # price 為收盤價，交易方向依價格變動決定
+            columns['price'].append(close_price)
+            columns['side'].append('buy' if close_price >= open_price else 'sell')
+            columns['open_price'].append(open_price)
+            columns['high_price'].append(float(ticker['highPrice']))
+            columns['low_price'].append(float(ticker['lowPrice']))
+            columns['close_price'].append(close_price)
+            columns['volume'].append(float(ticker['volume']))
+            columns['quote_volume'].append(float(ticker['quoteVolume']))
+            columns['number_of_trades'].append(int(ticker['count']))
+            columns['price_change'].append(float(ticker['priceChange']))
+            columns['price_change_percent'].append(float(ticker['priceChangePercent']))
+            columns['taker_buy_base_volume'].append(float(ticker.get('takerBuyBaseVolume', 0)))
+            columns['taker_buy_quote_volume'].append(float(ticker.get('takerBuyQuoteVolume', 0)))
+            columns['weighted_average_price'].append(float(ticker.get('weightedAvgPrice', close_price)))
+            # COPY 不會套用 ORM 的預設值
+            columns['created_at'].append(now)
+            columns['updated_at'].append(now)
+        
+        return columns
+    
     async def collect_order_books(self, symbols: List[str]) -> List[OrderBook]:
-        """收集訂單簿數據"""
+        """並發收集訂單簿數據，整批寫入"""
         try:
-            async with BinanceClient() as client:
-                order_books = []
-                for symbol in symbols:
-                    pair_id = self._get_trading_pair_id(symbol)
-                    if not pair_id:
-                        continue
-                    
-                    book_data = await client.get_order_book(symbol)
-                    order_book = OrderBook(
+            async with self._get_client() as client:
+                semaphore = asyncio.Semaphore(settings.ORDER_BOOK_CONCURRENCY)
+                
+                async def fetch(symbol: str, pair_id: int) -> Optional[OrderBook]:
+                    async with semaphore:
+                        try:
+                            book_data = await client.get_order_book(
+                                symbol, limit=settings.ORDER_BOOK_LIMIT
+                            )
+                        except Exception as e:
+                            logger.error(f"Error fetching order book for {symbol}: {str(e)}")
+                            return None
+                    info = self.symbol_registry.get(symbol)
+                    return OrderBook(
                         exchange_id=self.exchange_id,
                         trading_pair_id=pair_id,
                         timestamp=datetime.now(),
-                        bids=book_data['bids'],
-                        asks=book_data['asks'],
-                        last_update_id=book_data['lastUpdateId']
+                        last_update_id=book_data['lastUpdateId'],
+                        **storage_columns(
+                            book_data['bids'], book_data['asks'],
+                            info.tick_size if info else None,
+                            info.step_size if info else None
+                        )
                     )
-                    self.db.add(order_book)
-                    order_books.append(order_book)
+                
+                targets = [
+                    (symbol, pair_id) for symbol, pair_id in
+                    ((symbol, self._get_trading_pair_id(symbol)) for symbol in symbols)
+                    if pair_id
+                ]
+                results = await asyncio.gather(
+                    *[fetch(symbol, pair_id) for symbol, pair_id in targets]
+                )
+                order_books = [book for book in results if book is not None]
                 
                 if order_books:
+                    self.db.add_all(order_books)
                     self.db.commit()
+                if len(order_books) < len(targets):
+                    logger.warning(
+                        f"Fetched {len(order_books)}/{len(targets)} order books this cycle"
+                    )
                 return order_books
                 
         except Exception as e:
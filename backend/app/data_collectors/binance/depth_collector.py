@@ -3,104 +3,152 @@
 import asyncio
 from typing import Dict, List, Optional
 from datetime import datetime
-import json
 
 from app.core.logging import logger
 from app.models.market import OrderBook
+from app.services.symbol_registry import symbol_registry
+from app.utils.orderbook_codec import storage_columns
 from sqlalchemy.orm import Session
+from .client import BinanceClient
+from .order_book import LocalOrderBook
 
 class DepthDataManager:
-    def __init__(self, db: Session):
+    def __init__(
+        self,
+        db: Session,
+        exchange_id: Optional[int] = None,
+        client: Optional[BinanceClient] = None,
+        write_buffers=None,
+        snapshot_limit: int = 1000,
+        persist_levels: int = 20
+    ):
         self.db = db
-        self.depth_cache: Dict[str, Dict] = {}
-        self.last_update_id: Dict[str, int] = {}
-        
+        self.exchange_id = exchange_id  # 未指定時使用交易對所屬的交易所
+        self.client = client
+        self.write_buffers = write_buffers  # 可選的 WriteBufferManager
+        self.snapshot_limit = snapshot_limit
+        self.persist_levels = persist_levels
+        self.order_books: Dict[str, LocalOrderBook] = {}
+        self.resync_tasks: Dict[str, asyncio.Task] = {}
+        self.max_snapshot_retries = 5
+
     async def process_depth_update(self, symbol: str, data: Dict):
-        """處理深度數據更新"""
+        """處理 @depth 增量更新"""
         try:
             # 確保數據有效性
             if not self._validate_depth_data(data):
                 logger.warning(f"Invalid depth data received for {symbol}")
                 return
-                
-            # 更新本地緩存
-            self._update_depth_cache(symbol, data)
-            
-            # 創建訂單簿記錄
-            order_book = OrderBook(
-                trading_pair_id=self._get_trading_pair_id(symbol),
-                timestamp=datetime.now(),
-                bids=data.get('b', []),  # Binance格式的買單
-                asks=data.get('a', []),  # Binance格式的賣單
-                last_update_id=data.get('u', 0)  # 最後更新ID
-            )
-            
-            self.db.add(order_book)
-            await self.db.commit()
-            
+
+            book = self._get_order_book(symbol)
+            applied = book.process_diff(data)
+
+            # 尚未同步或發現斷檔時，以快照重新同步
+            if not book.synced:
+                self._schedule_resync(symbol)
+                return
+
+            if applied and self.write_buffers is not None:
+                self._persist_book(symbol, book)
+
         except Exception as e:
             logger.error(f"Error processing depth update for {symbol}: {e}")
-            await self.db.rollback()
-    
+
     def _validate_depth_data(self, data: Dict) -> bool:
         """驗證深度數據的有效性"""
-        required_fields = ['u', 'b', 'a']  # u: updateId, b: bids, a: asks
+        required_fields = ['U', 'u', 'b', 'a']  # U/u: 首末更新ID, b: bids, a: asks
         return all(field in data for field in required_fields)
-    
-    def _update_depth_cache(self, symbol: str, data: Dict):
-        """更新深度數據緩存"""
-        if symbol not in self.depth_cache:
-            self.depth_cache[symbol] = {'bids': {}, 'asks': {}}
-            
-        # 更新買單
-        for bid in data.get('b', []):
-            price, quantity = float(bid[0]), float(bid[1])
-            if quantity > 0:
-                self.depth_cache[symbol]['bids'][price] = quantity
-            else:
-                self.depth_cache[symbol]['bids'].pop(price, None)
-                
-        # 更新賣單
-        for ask in data.get('a', []):
-            price, quantity = float(ask[0]), float(ask[1])
-            if quantity > 0:
-                self.depth_cache[symbol]['asks'][price] = quantity
-            else:
-                self.depth_cache[symbol]['asks'].pop(price, None)
-                
-        # 更新最後更新ID
-        self.last_update_id[symbol] = data.get('u', 0)
-    
-    def get_current_depth(self, symbol: str) -> Dict:
-        """獲取當前深度數據"""
-        if symbol not in self.depth_cache:
+
+    def _get_order_book(self, symbol: str) -> LocalOrderBook:
+        """獲取（必要時建立）本地訂單簿"""
+        book = self.order_books.get(symbol)
+        if book is None:
+            book = LocalOrderBook(symbol)
+            self.order_books[symbol] = book
+        return book
+
+    def _schedule_resync(self, symbol: str):
+        """安排快照同步，同一交易對同時只有一個同步任務"""
+        task = self.resync_tasks.get(symbol)
+        if task and not task.done():
+            return
+        self.resync_tasks[symbol] = asyncio.create_task(self._resync(symbol))
+
+    async def _resync(self, symbol: str):
+        """取得 REST 快照並重放緩存的增量事件"""
+        book = self._get_order_book(symbol)
+        for attempt in range(1, self.max_snapshot_retries + 1):
+            try:
+                snapshot = await self._fetch_snapshot(symbol)
+                if book.apply_snapshot(snapshot):
+                    logger.info(
+                        f"Order book synced for {symbol} at update {book.last_update_id}"
+                    )
+                    return
+            except Exception as e:
+                logger.error(f"Error fetching depth snapshot for {symbol}: {e}")
+
+            await asyncio.sleep(min(attempt, 5))
+
+        logger.error(f"Failed to sync order book for {symbol} after {self.max_snapshot_retries} attempts")
+
+    async def _fetch_snapshot(self, symbol: str) -> Dict:
+        """獲取 /api/v3/depth 快照"""
+        if self.client is not None:
+            return await self.client.get_order_book(symbol, limit=self.snapshot_limit)
+        async with BinanceClient() as client:
+            return await client.get_order_book(symbol, limit=self.snapshot_limit)
+
+    def _persist_book(self, symbol: str, book: LocalOrderBook):
+        """將重建後的前 N 檔加入寫入緩衝區"""
+        top = book.top_levels(self.persist_levels)
+        info = symbol_registry.get(symbol)
+        self.write_buffers.add(OrderBook, {
+            'exchange_id': self.exchange_id if self.exchange_id is not None else (info.exchange_id if info else None),
+            'trading_pair_id': self._get_trading_pair_id(symbol),
+            'timestamp': datetime.now(),
+            'last_update_id': top['lastUpdateId'],
+            **storage_columns(
+                top['bids'], top['asks'],
+                info.tick_size if info else None,
+                info.step_size if info else None
+            )
+        })
+
+    def get_current_depth(self, symbol: str, limit: int = 20) -> Dict:
+        """獲取當前深度數據（檔位已排序，無需重新排序）"""
+        book = self.order_books.get(symbol)
+        if book is None:
             return {'bids': [], 'asks': []}
-            
-        cache = self.depth_cache[symbol]
-        
-        # 轉換為排序後的列表格式
-        bids = sorted(
-            [[price, qty] for price, qty in cache['bids'].items()],
-            key=lambda x: x[0],
-            reverse=True
-        )
-        asks = sorted(
-            [[price, qty] for price, qty in cache['asks'].items()],
-            key=lambda x: x[0]
-        )
-        
+        return book.top_levels(limit)
+
+    def get_book_summary(self, symbol: str, levels: int = 20) -> Optional[Dict]:
+        """獲取中間價、價差與累計深度"""
+        book = self.order_books.get(symbol)
+        if book is None or not book.synced:
+            return None
+        depth = book.cumulative_depth(levels)
         return {
-            'bids': bids[:20],  # 只返回前20檔
-            'asks': asks[:20],
-            'lastUpdateId': self.last_update_id.get(symbol, 0)
+            'symbol': symbol,
+            'mid_price': book.mid_price(),
+            'spread': book.spread(),
+            'bid_depth': depth['bids'],
+            'ask_depth': depth['asks'],
+            'last_update_id': book.last_update_id
         }
-    
+
+    def get_sync_status(self) -> List[Dict]:
+        """獲取所有訂單簿的同步狀態"""
+        return [book.get_status() for book in self.order_books.values()]
+
     def clear_depth_cache(self, symbol: str):
         """清除深度數據緩存"""
-        self.depth_cache.pop(symbol, None)
-        self.last_update_id.pop(symbol, None)
-    
-    def _get_trading_pair_id(self, symbol: str) -> int:
-        """獲取交易對ID（需要實現）"""
-        # TODO: 實現從資料庫獲取交易對ID的邏輯
-        pass
\ No newline at end of file
+        self.order_books.pop(symbol, None)
+        task = self.resync_tasks.pop(symbol, None)
+        if task and not task.done():
+            task.cancel()
+
+    def _get_trading_pair_id(self, symbol: str) -> Optional[int]:
+        """從註冊表獲取交易對ID"""
+        symbol_registry.ensure_loaded(self.db)
+        return symbol_registry.get_id(symbol)
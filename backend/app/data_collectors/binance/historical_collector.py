@@ -2,22 +2,40 @@
 
 import time
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import requests
 import pandas as pd
 import numpy as np
 from sqlalchemy.orm import Session
-from sqlalchemy import select, and_
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app.core.config import settings
 from app.core.logging import logger
-from app.models.historical import HistoricalMetrics, MarketAnalysis
-from app.models.market import TradingPair
+from app.models.historical import HistoricalMetrics
+from app.services.symbol_registry import symbol_registry
+from app.services.historical.backfill_planner import warmup_bars
+from app.services.historical.cold_store import mark_stale_months
+from app.utils.bulk_copy import columns_to_rows
+
+# historical_metrics 欄位 → _calculate_metrics 結果欄位
+PRICE_COLUMNS = {
+    'open_price': 'open',
+    'high_price': 'high',
+    'low_price': 'low',
+    'close_price': 'close',
+    'volume': 'volume'
+}
+METRIC_COLUMNS = [
+    'volatility', 'ma7', 'ma25', 'ma99', 'rsi', 'bb_upper', 'bb_middle', 'bb_lower',
+    'bb_width', 'returns', 'log_returns', 'realized_volatility', 'price_momentum',
+    'volume_momentum'
+]
 
 class HistoricalDataCollector:
     def __init__(self, db: Session):
         self.db = db
-        self.base_url = "https://api.binance.com"
+        self.base_url = settings.BINANCE_REST_BASE_URL
         self.session = requests.Session()
         self.session.headers.update({
             'X-MBX-APIKEY': settings.BINANCE_API_KEY
@@ -31,8 +49,8 @@ class HistoricalDataCollector:
         timeframe: str,
         start_time: Optional[datetime] = None,
         end_time: Optional[datetime] = None
-    ) -> List[Dict]:
-        """收集歷史K線數據"""
+    ) -> int:
+        """收集歷史K線數據並逐批保存，返回保存的K線數量"""
         try:
             # 設置時間範圍
             if not end_time:
@@ -41,12 +59,14 @@ class HistoricalDataCollector:
                 start_time = end_time - timedelta(days=settings.HISTORICAL_INITIAL_DAYS)
             
             # 檢查交易對是否存在
-            trading_pair = self._get_trading_pair(symbol)
-            if not trading_pair:
+            trading_pair_id = self._get_trading_pair_id(symbol)
+            if not trading_pair_id:
                 raise ValueError(f"Trading pair not found: {symbol}")
             
-            # 分批收集數據
-            all_klines = []
+            # 逐批保存，只保留計算指標所需的前置K線，記憶體不隨範圍增長
+            warmup = warmup_bars(timeframe)
+            tail: List[Dict] = []
+            saved = 0
             current_start = start_time
             
             while current_start < end_time:
@@ -64,7 +84,13 @@ class HistoricalDataCollector:
                 )
                 
                 if klines:
-                    all_klines.extend(klines)
+                    saved += self._process_and_save_klines(
+                        trading_pair_id,
+                        timeframe,
+                        tail + klines,
+                        save_ranges=[(klines[0]['timestamp'], klines[-1]['timestamp'])]
+                    )
+                    tail = (tail + klines)[-warmup:]
                     
                 # 更新開始時間
                 current_start = current_end
@@ -72,10 +98,7 @@ class HistoricalDataCollector:
                 # 檢查並等待速率限制
                 self._handle_rate_limit()
             
-            # 處理並保存數據
-            self._process_and_save_klines(trading_pair.id, timeframe, all_klines)
-            
-            return all_klines
+            return saved
             
         except Exception as e:
             logger.error(f"Error collecting historical data for {symbol}: {e}")
@@ -102,82 +125,120 @@ class HistoricalDataCollector:
             response = self.session.get(url, params=params)
             response.raise_for_status()
             
-            klines = response.json()
-            return [
-                {
-                    'timestamp': datetime.fromtimestamp(k[0] / 1000),
-                    'open': float(k[1]),
-                    'high': float(k[2]),
-                    'low': float(k[3]),
-                    'close': float(k[4]),
-                    'volume': float(k[5]),
-                    'close_time': datetime.fromtimestamp(k[6] / 1000),
-                    'quote_volume': float(k[7]),
-                    'trades': int(k[8]),
-                    'taker_buy_base': float(k[9]),
-                    'taker_buy_quote': float(k[10])
-                }
-                for k in klines
-            ]
+            return self._parse_klines(response.json())
             
         except Exception as e:
             logger.error(f"Error fetching klines: {e}")
             raise
     
+    @staticmethod
+    def _parse_klines(klines: List[List]) -> List[Dict]:
+        """將 /api/v3/klines 的陣列格式轉換為字典"""
+        return [
+            {
+                'timestamp': datetime.fromtimestamp(k[0] / 1000),
+                'open': float(k[1]),
+                'high': float(k[2]),
+                'low': float(k[3]),
+                'close': float(k[4]),
+                'volume': float(k[5]),
+                'close_time': datetime.fromtimestamp(k[6] / 1000),
+                'quote_volume': float(k[7]),
+                'trades': int(k[8]),
+                'taker_buy_base': float(k[9]),
+                'taker_buy_quote': float(k[10])
+            }
+            for k in klines
+        ]
+    
     def _process_and_save_klines(
         self,
         trading_pair_id: int,
         timeframe: str,
-        klines: List[Dict]
-    ) -> None:
-        """處理和保存K線數據"""
+        klines: List[Dict],
+        db: Optional[Session] = None,
+        save_ranges: Optional[List[Tuple[datetime, datetime]]] = None
+    ) -> int:
+        """處理和保存K線數據，指定 save_ranges 時只保存範圍內的K線（其餘僅用於計算指標）"""
+        db = db or self.db
         try:
-            # 轉換為DataFrame進行計算
-            df = pd.DataFrame(klines)
-            if df.empty:
-                return
-                
-            # 確保時間戳是正確的日期時間格式
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            
-            # 計算技術指標，傳入時間週期
-            metrics = self._calculate_metrics(df, timeframe)
-            
-            # 保存到數據庫
-            for timestamp, row in metrics.iterrows():
-                historical_metric = HistoricalMetrics(
-                    trading_pair_id=trading_pair_id,
-                    timestamp=timestamp,
-                    timeframe=timeframe,
-                    open_price=row['open'],
-                    high_price=row['high'],
-                    low_price=row['low'],
-                    close_price=row['close'],
-                    volume=row['volume'],
-                    volatility=row.get('volatility'),
-                    ma7=row.get('ma7'),
-                    ma25=row.get('ma25'),
-                    ma99=row.get('ma99'),
-                    rsi=row.get('rsi'),
-                    bb_upper=row.get('bb_upper'),
-                    bb_middle=row.get('bb_middle'),
-                    bb_lower=row.get('bb_lower'),
-                    bb_width=row.get('bb_width'),
-                    returns=row.get('returns'),
-                    log_returns=row.get('log_returns'),
-                    realized_volatility=row.get('realized_volatility'),
-                    price_momentum=row.get('price_momentum'),
-                    volume_momentum=row.get('volume_momentum')
-                )
-                self.db.add(historical_metric)
-                
-            # 分批提交以提高性能
-            self.db.commit()
+            saved = self._stage_metrics(db, trading_pair_id, timeframe, klines, save_ranges)
+            db.commit()
+            return saved
             
         except Exception as e:
             logger.error(f"Error processing and saving klines: {e}")
-            self.db.rollback()
+            db.rollback()
             raise
+
+    def _stage_metrics(
+        self,
+        db: Session,
+        trading_pair_id: int,
+        timeframe: str,
+        klines: List[Dict],
+        save_ranges: Optional[List[Tuple[datetime, datetime]]] = None
+    ) -> int:
+        """計算指標並 upsert，不提交，由調用方決定事務邊界"""
+        # 轉換為DataFrame進行計算
+        df = pd.DataFrame(klines)
+        if df.empty:
+            return 0
+            
+        # 確保時間戳是正確的日期時間格式
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        
+        # 計算技術指標，傳入時間週期
+        metrics = self._calculate_metrics(df, timeframe)
+        if save_ranges is not None:
+            mask = np.zeros(len(metrics), dtype=bool)
+            for range_start, range_end in save_ranges:
+                mask |= (metrics.index >= range_start) & (metrics.index <= range_end)
+            metrics = metrics[mask]
+
+        rows = self._metrics_to_rows(trading_pair_id, timeframe, metrics)
+        saved = self._upsert_metrics(db, rows)
+
+        # 回填寫入已導出的月份時，冷存儲中的文件需重新導出
+        if saved:
+            symbol_registry.ensure_loaded(db)
+            info = symbol_registry.get_by_id(trading_pair_id)
+            if info is not None:
+                mark_stale_months('metrics', info.symbol, timeframe, metrics.index[0], metrics.index[-1])
+        return saved
+
+    @staticmethod
+    def _metrics_to_rows(trading_pair_id: int, timeframe: str, metrics: pd.DataFrame) -> List[Dict]:
+        """整列轉換為 historical_metrics 列，NaN 與無窮值寫為 NULL"""
+        columns: Dict[str, list] = {
+            'trading_pair_id': [trading_pair_id] * len(metrics),
+            'timestamp': metrics.index.to_pydatetime().tolist(),
+            'timeframe': [timeframe] * len(metrics)
+        }
+        sources = {**PRICE_COLUMNS, **{column: column for column in METRIC_COLUMNS}}
+        for column, source in sources.items():
+            values = metrics[source].to_numpy(dtype=float)
+            columns[column] = np.where(np.isfinite(values), values, None).tolist()
+        return columns_to_rows(columns)
+
+    def _upsert_metrics(self, db: Session, rows: List[Dict]) -> int:
+        """分批 INSERT ... ON CONFLICT DO UPDATE，重複回填只會覆蓋既有記錄"""
+        if not rows:
+            return 0
+
+        stmt = pg_insert(HistoricalMetrics.__table__)
+        stmt = stmt.on_conflict_do_update(
+            constraint='uq_historical_metrics_pair_timeframe_time',
+            set_={
+                **{column: stmt.excluded[column] for column in [*PRICE_COLUMNS, *METRIC_COLUMNS]},
+                'updated_at': func.now()
+            }
+        )
+        batch_size = settings.HISTORICAL_UPSERT_BATCH_SIZE
+        for start in range(0, len(rows), batch_size):
+            # executemany 由 SQLAlchemy 合併為多列 VALUES 語句
+            db.execute(stmt, rows[start:start + batch_size])
+        return len(rows)
     
     def _calculate_metrics(self, df: pd.DataFrame, timeframe: str = '1h') -> pd.DataFrame:
         """計算技術指標和波動率"""
@@ -237,15 +298,11 @@ class HistoricalDataCollector:
             logger.error(f"Error calculating metrics: {e}")
             raise
     
-    def _get_trading_pair(self, symbol: str) -> Optional[TradingPair]:
-        """獲取交易對信息"""
+    def _get_trading_pair_id(self, symbol: str) -> Optional[int]:
+        """從註冊表獲取交易對ID"""
         try:
-            return self.db.query(TradingPair).filter(
-                and_(
-                    TradingPair.symbol == symbol,
-                    TradingPair.is_active == 1
-                )
-            ).first()
+            symbol_registry.ensure_loaded(self.db)
+            return symbol_registry.get_id(symbol)
         except Exception as e:
             logger.error(f"Error getting trading pair: {e}")
             raise
@@ -0,0 +1,180 @@
+# backend/app/data_collectors/binance/ingest_queue.py
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.logging import logger
+
+FIFO = 'fifo'            # 按順序保留每條消息
+CONFLATE = 'conflate'    # 每個流只保留最新一條
+
+_CONFLATED = object()    # 佔位符，實際 payload 存放在 latest 中
+
+
+def stream_policy(stream: str) -> str:
+    """依流類型決定排隊策略
+
+    交易、K線與增量深度必須逐條處理；行情與部分深度快照只需最新值。
+    全市場陣列流（!ticker@arr）每次只包含有變化的交易對，不能合併。
+    """
+    if stream.endswith('@arr'):
+        return FIFO
+    channel = stream.split('@', 1)[1] if '@' in stream else stream
+    if channel.startswith(('ticker', 'miniTicker', 'bookTicker')):
+        return CONFLATE
+    if channel.startswith('depth'):
+        levels = channel[len('depth'):].split('@', 1)[0]
+        # depth5/10/20 為部分快照，depth 與 depth@100ms 為增量
+        return CONFLATE if levels.isdigit() else FIFO
+    return FIFO
+
+
+class IngestionQueue:
+    """讀取 socket 與處理回調之間的有界隊列"""
+
+    def __init__(self, maxsize: Optional[int] = None, overflow_policy: Optional[str] = None):
+        self.maxsize = maxsize or settings.INGEST_QUEUE_MAXSIZE
+        # drop: 記錄並丟棄可合併的消息；block: 對所有消息施加背壓
+        self.overflow_policy = overflow_policy or settings.INGEST_QUEUE_OVERFLOW_POLICY
+        self.items: Deque[Tuple[str, Any, float]] = deque()
+        self.latest: Dict[str, Any] = {}
+        self.policies: Dict[str, str] = {}
+        self._condition = asyncio.Condition()
+        # 關閉後不再接受消息，get() 取完剩餘消息後返回 None
+        self.closed = False
+        self.metrics = {
+            'enqueued': 0,
+            'dispatched': 0,
+            'conflated': 0,
+            'dropped': 0,
+            'backpressure_waits': 0,
+            'last_lag': 0.0,
+            'max_lag': 0.0,
+            'total_lag': 0.0
+        }
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _policy(self, stream: str) -> str:
+        policy = self.policies.get(stream)
+        if policy is None:
+            policy = self.policies[stream] = stream_policy(stream)
+        return policy
+
+    async def put(self, stream: str, payload: Any) -> bool:
+        """放入消息，返回是否已接受"""
+        if self.closed:
+            return False
+        policy = self._policy(stream)
+
+        # 已有待處理的同流消息時直接覆蓋，不佔用隊列空間
+        if policy == CONFLATE and stream in self.latest:
+            self.latest[stream] = payload
+            self.metrics['conflated'] += 1
+            return True
+
+        async with self._condition:
+            if len(self.items) >= self.maxsize:
+                if policy == CONFLATE and self.overflow_policy != 'block':
+                    self.metrics['dropped'] += 1
+                    if self.metrics['dropped'] % 1000 == 1:
+                        logger.warning(
+                            f"Ingestion queue full ({self.maxsize}), "
+                            f"dropped {self.metrics['dropped']} messages so far"
+                        )
+                    return False
+
+                # 交易等不可丟棄的消息施加背壓，暫停讀取 socket
+                self.metrics['backpressure_waits'] += 1
+                while len(self.items) >= self.maxsize and not self.closed:
+                    await self._condition.wait()
+                if self.closed:
+                    return False
+
+                # 等待期間可能已有同流消息入隊
+                if policy == CONFLATE and stream in self.latest:
+                    self.latest[stream] = payload
+                    self.metrics['conflated'] += 1
+                    return True
+
+            if policy == CONFLATE:
+                self.latest[stream] = payload
+                payload = _CONFLATED
+            self.items.append((stream, payload, time.monotonic()))
+            self.metrics['enqueued'] += 1
+            self._condition.notify_all()
+            return True
+
+    async def get(self) -> Optional[Tuple[str, Any]]:
+        """取出最早的消息，隊列已關閉且為空時返回 None"""
+        async with self._condition:
+            while not self.items:
+                if self.closed:
+                    return None
+                await self._condition.wait()
+
+            stream, payload, enqueued_at = self.items.popleft()
+            if payload is _CONFLATED:
+                payload = self.latest.pop(stream)
+
+            lag = time.monotonic() - enqueued_at
+            self.metrics['dispatched'] += 1
+            self.metrics['last_lag'] = lag
+            self.metrics['max_lag'] = max(self.metrics['max_lag'], lag)
+            self.metrics['total_lag'] += lag
+
+            self._condition.notify_all()
+            return stream, payload
+
+    async def close(self):
+        """停止接受消息並喚醒等待中的讀取方與寫入方"""
+        async with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def carry_over(self, previous: 'IngestionQueue'):
+        """沿用被取代隊列的累計指標，分片重建後計數不歸零"""
+        for key in ('enqueued', 'dispatched', 'conflated', 'dropped', 'backpressure_waits', 'total_lag'):
+            self.metrics[key] += previous.metrics[key]
+        self.metrics['max_lag'] = max(self.metrics['max_lag'], previous.metrics['max_lag'])
+
+    def clear(self):
+        """清空隊列"""
+        self.items.clear()
+        self.latest.clear()
+
+    def get_metrics(self) -> Dict:
+        """獲取隊列指標"""
+        current_lag = time.monotonic() - self.items[0][2] if self.items else 0.0
+        return {
+            'size': len(self.items),
+            'maxsize': self.maxsize,
+            'overflow_policy': self.overflow_policy,
+            'enqueued': self.metrics['enqueued'],
+            'dispatched': self.metrics['dispatched'],
+            'conflated': self.metrics['conflated'],
+            'dropped': self.metrics['dropped'],
+            'backpressure_waits': self.metrics['backpressure_waits'],
+            'current_lag': current_lag,
+            'last_lag': self.metrics['last_lag'],
+            'max_lag': self.metrics['max_lag'],
+            'avg_lag': self.metrics['total_lag'] / max(self.metrics['dispatched'], 1)
+        }
+
+
+def merge_queue_metrics(metrics: List[Dict]) -> Dict:
+    """匯總多個隊列的指標"""
+    if not metrics:
+        return {}
+    counters = ('size', 'maxsize', 'enqueued', 'dispatched', 'conflated', 'dropped', 'backpressure_waits')
+    merged = {key: sum(m[key] for m in metrics) for key in counters}
+    merged.update({
+        'current_lag': max(m['current_lag'] for m in metrics),
+        'max_lag': max(m['max_lag'] for m in metrics),
+        'avg_lag': sum(m['avg_lag'] * m['dispatched'] for m in metrics) / max(merged['dispatched'], 1)
+    })
+    return merged
@@ -0,0 +1,304 @@
+# backend/app/data_collectors/binance/kline_stream.py
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.models.market import KlineData
+from app.services.symbol_registry import symbol_registry
+from .client import BinanceClient
+
+# (symbol, interval)
+BarKey = Tuple[str, str]
+
+
+class KlineStreamConsumer:
+    """@kline_<interval> 數據流的消費者
+
+    未收盤的K線只保存在記憶體中（每個交易對/週期一根），
+    收到 x=true 的已收盤K線後才批次 upsert 到 kline_data。
+    每個交易對/週期記錄最後一根已收盤K線的開盤時間；斷線重連
+    或重啟後收到的第一筆事件若與其不連續，即以 REST 補齊缺口。
+    """
+
+    def __init__(
+        self,
+        exchange_id: int,
+        session_factory: Callable[[], Session],
+        client: BinanceClient,
+        intervals: Optional[List[str]] = None,
+        flush_interval: Optional[float] = None
+    ):
+        self.exchange_id = exchange_id
+        self.session_factory = session_factory
+        self.client = client
+        self.intervals = intervals or settings.KLINE_STREAM_INTERVALS
+        self.flush_interval = flush_interval or settings.KLINE_FLUSH_INTERVAL
+
+        self.current_bars: Dict[BarKey, Dict] = {}
+        self.last_closed: Dict[BarKey, int] = {}
+        # 以 (trading_pair_id, interval, 開盤時間) 去重，同一根K線只寫入最後一版
+        self.pending: Dict[Tuple[int, str, int], Dict] = {}
+        self.reconcile_tasks: Set[asyncio.Task] = set()
+        self.running = False
+        self.metrics = {
+            'messages': 0,
+            'closed_bars': 0,
+            'rows_upserted': 0,
+            'flush_count': 0,
+            'flush_errors': 0,
+            'gaps_detected': 0,
+            'bars_reconciled': 0,
+            'reconcile_errors': 0,
+            'last_event_time': None
+        }
+
+    def streams(self, symbols: Iterable[str]) -> List[str]:
+        """構建訂閱的流名稱"""
+        return [
+            f"{symbol.lower()}@kline_{interval}"
+            for symbol in symbols
+            for interval in self.intervals
+        ]
+
+    async def start(self):
+        """從數據庫載入各交易對/週期最後一根K線，作為缺口檢查的起點"""
+        try:
+            rows = await asyncio.to_thread(self._load_last_closed)
+        except Exception as e:
+            logger.error(f"Error loading last closed klines: {e}")
+            return
+
+        for trading_pair_id, interval, timestamp in rows:
+            info = symbol_registry.get_by_id(trading_pair_id)
+            if info is not None and interval in self.intervals:
+                self.last_closed[(info.symbol, interval)] = _to_ms(timestamp)
+
+    def _load_last_closed(self) -> List[Tuple[int, str, datetime]]:
+        db = self.session_factory()
+        try:
+            return db.query(
+                KlineData.trading_pair_id,
+                KlineData.interval,
+                func.max(KlineData.timestamp)
+            ).filter(
+                KlineData.exchange_id == self.exchange_id,
+                KlineData.is_complete.is_(True)
+            ).group_by(
+                KlineData.trading_pair_id,
+                KlineData.interval
+            ).all()
+        finally:
+            db.close()
+
+    async def handle_message(self, data: Dict):
+        """處理K線事件"""
+        kline = data['k']
+        key = (kline['s'], kline['i'])
+        open_time = kline['t']
+        self.metrics['messages'] += 1
+        self.metrics['last_event_time'] = data.get('E')
+
+        self._check_gap(key, open_time)
+
+        if not kline['x']:
+            self.current_bars[key] = kline
+            return
+
+        self.current_bars.pop(key, None)
+        self.metrics['closed_bars'] += 1
+        self.last_closed[key] = max(self.last_closed.get(key, 0), open_time)
+        self._queue(self._stream_bar_to_row(kline), 'binance_ws')
+
+    def get_current_bar(self, symbol: str, interval: str) -> Optional[Dict]:
+        """獲取未收盤的K線"""
+        return self.current_bars.get((symbol, interval))
+
+    def _check_gap(self, key: BarKey, open_time: int):
+        """事件與最後一根已收盤K線不連續時，排程補齊其間的K線"""
+        last = self.last_closed.get(key)
+        if last is None:
+            return
+
+        interval_ms = settings.get_timeframe_seconds(key[1]) * 1000
+        expected = last + interval_ms
+        if open_time <= expected:
+            return
+
+        self.metrics['gaps_detected'] += 1
+        # 先推進檢查點，補齊期間的後續事件不重複觸發
+        self.last_closed[key] = open_time - interval_ms
+        # 超過上限的舊缺口交由歷史回填處理
+        start_time = max(expected, open_time - settings.KLINE_RECONCILE_MAX_BARS * interval_ms)
+        logger.info(
+            f"Kline gap detected for {key[0]} {key[1]}: "
+            f"{(open_time - expected) // interval_ms} bars missing, reconciling via REST"
+        )
+        task = asyncio.create_task(self._reconcile(key, start_time, open_time - 1))
+        self.reconcile_tasks.add(task)
+        task.add_done_callback(self.reconcile_tasks.discard)
+
+    async def _reconcile(self, key: BarKey, start_time: int, end_time: int):
+        """以 REST 取得缺失的已收盤K線"""
+        symbol, interval = key
+        try:
+            klines = await self.client.get_klines(
+                symbol,
+                interval,
+                limit=settings.KLINE_RECONCILE_MAX_BARS,
+                start_time=start_time,
+                end_time=end_time
+            )
+        except Exception as e:
+            self.metrics['reconcile_errors'] += 1
+            logger.error(f"Error reconciling klines for {symbol} {interval}: {e}")
+            return
+
+        now_ms = int(time.time() * 1000)
+        for kline in klines:
+            # 只補已收盤的K線
+            if kline[6] >= now_ms:
+                continue
+            row = self._rest_bar_to_row(symbol, interval, kline)
+            if row is not None:
+                self._queue(row, 'binance_rest')
+                self.metrics['bars_reconciled'] += 1
+
+    def _queue(self, row: Optional[Dict], source: str):
+        if row is None:
+            return
+        row['source'] = source
+        self.pending[(row['trading_pair_id'], row['interval'], _to_ms(row['timestamp']))] = row
+
+    async def run_persistence(self):
+        """按間隔寫入已收盤的K線，直到停止"""
+        self.running = True
+        while self.running:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error persisting klines: {e}")
+
+    async def flush(self) -> int:
+        """將待寫入的K線 upsert 到 kline_data"""
+        if not self.pending:
+            return 0
+
+        pending, self.pending = self.pending, {}
+        try:
+            await asyncio.to_thread(self._write, list(pending.values()))
+        except Exception:
+            self.metrics['flush_errors'] += 1
+            # 保留失敗的K線，較新的版本優先
+            pending.update(self.pending)
+            self.pending = pending
+            raise
+
+        self.metrics['rows_upserted'] += len(pending)
+        self.metrics['flush_count'] += 1
+        return len(pending)
+
+    def _write(self, rows: List[Dict]):
+        db = self.session_factory()
+        try:
+            stmt = pg_insert(KlineData.__table__).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['trading_pair_id', 'timestamp', 'interval'],
+                set_={
+                    column: stmt.excluded[column]
+                    for column in rows[0]
+                    if column not in ('trading_pair_id', 'timestamp', 'interval', 'created_at')
+                }
+            )
+            db.execute(stmt)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _stream_bar_to_row(self, kline: Dict) -> Optional[Dict]:
+        return self._build_row(
+            kline['s'], kline['i'], kline['t'],
+            kline['o'], kline['h'], kline['l'], kline['c'],
+            kline['v'], kline['q'], kline['n'], kline['V'], kline['Q']
+        )
+
+    def _rest_bar_to_row(self, symbol: str, interval: str, kline: List) -> Optional[Dict]:
+        return self._build_row(
+            symbol, interval, kline[0],
+            kline[1], kline[2], kline[3], kline[4],
+            kline[5], kline[7], kline[8], kline[9], kline[10]
+        )
+
+    def _build_row(
+        self, symbol, interval, open_time,
+        open_price, high, low, close,
+        volume, quote_volume, trades, taker_base, taker_quote
+    ) -> Optional[Dict]:
+        trading_pair_id = symbol_registry.get_id(symbol)
+        if not trading_pair_id:
+            return None
+
+        volume = float(volume)
+        quote_volume = float(quote_volume)
+        high = float(high)
+        low = float(low)
+        now = datetime.utcnow()
+        return {
+            'exchange_id': self.exchange_id,
+            'trading_pair_id': trading_pair_id,
+            'timestamp': datetime.fromtimestamp(open_time / 1000, tz=timezone.utc),
+            'interval': interval,
+            'open_price': float(open_price),
+            'high_price': high,
+            'low_price': low,
+            'close_price': float(close),
+            'volume': volume,
+            'quote_volume': quote_volume,
+            'number_of_trades': int(trades),
+            'taker_buy_base_volume': float(taker_base),
+            'taker_buy_quote_volume': float(taker_quote),
+            'vwap': quote_volume / volume if volume else None,
+            'volatility': (high - low) / low * 100 if low else None,
+            'is_complete': True,
+            'created_at': now,
+            'updated_at': now
+        }
+
+    async def close(self):
+        """停止並寫入剩餘的K線"""
+        self.running = False
+        if self.reconcile_tasks:
+            await asyncio.gather(*self.reconcile_tasks, return_exceptions=True)
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Error persisting klines on close: {e}")
+
+    def get_metrics(self) -> Dict:
+        """獲取K線流指標"""
+        last_event_time = self.metrics['last_event_time']
+        return {
+            **{k: v for k, v in self.metrics.items() if k != 'last_event_time'},
+            'intervals': self.intervals,
+            'open_bars': len(self.current_bars),
+            'pending_rows': len(self.pending),
+            'reconciling': len(self.reconcile_tasks),
+            'data_age_seconds': time.time() - last_event_time / 1000 if last_event_time else None
+        }
+
+
+def _to_ms(timestamp: datetime) -> int:
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return int(timestamp.timestamp() * 1000)
@@ -0,0 +1,195 @@
+# backend/app/data_collectors/binance/messages.py
+
+import json
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from app.core.logging import logger
+
+try:
+    import orjson
+except ImportError:  # 可選依賴
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # 可選依賴
+    msgspec = None
+
+
+class JsonDecoder:
+    """WebSocket 消息的 JSON 解碼器"""
+
+    def __init__(self, name: str, loads: Callable[[Union[str, bytes]], Any]):
+        self.name = name
+        self.loads = loads
+
+    def __repr__(self):
+        return f"<JsonDecoder({self.name})>"
+
+
+def available_decoders() -> List[str]:
+    """列出目前環境可用的解碼器，依優先順序排列"""
+    names = []
+    if orjson is not None:
+        names.append('orjson')
+    if msgspec is not None:
+        names.append('msgspec')
+    names.append('json')
+    return names
+
+
+def get_json_decoder(name: Optional[str] = None) -> JsonDecoder:
+    """獲取解碼器，'auto' 或未指定時選用最快的可用實現"""
+    if not name or name == 'auto':
+        name = available_decoders()[0]
+
+    if name == 'orjson' and orjson is not None:
+        return JsonDecoder('orjson', orjson.loads)
+    if name == 'msgspec' and msgspec is not None:
+        return JsonDecoder('msgspec', msgspec.json.Decoder().decode)
+    if name != 'json':
+        logger.warning(f"JSON decoder '{name}' is not available, falling back to json")
+    return JsonDecoder('json', json.loads)
+
+
+@dataclass
+class TradeMessage:
+    """逐筆成交 (@trade)"""
+    symbol: str
+    event_time: int
+    trade_id: int
+    price: float
+    quantity: float
+    trade_time: int
+    is_buyer_maker: bool
+
+    @classmethod
+    def from_payload(cls, data: Dict) -> 'TradeMessage':
+        return cls(
+            symbol=data['s'],
+            event_time=data['E'],
+            trade_id=data['t'],
+            price=float(data['p']),
+            quantity=float(data['q']),
+            trade_time=data['T'],
+            is_buyer_maker=data['m']
+        )
+
+
+@dataclass
+class TickerMessage:
+    """24小時行情 (@ticker / @miniTicker)"""
+    symbol: str
+    event_time: int
+    open_price: float
+    high_price: float
+    low_price: float
+    close_price: float
+    volume: float
+    quote_volume: float
+    number_of_trades: Optional[int] = None
+    price_change: Optional[float] = None
+    price_change_percent: Optional[float] = None
+    weighted_average_price: Optional[float] = None
+
+    @classmethod
+    def from_payload(cls, data: Dict) -> 'TickerMessage':
+        # miniTicker 不含 n/p/P/w 欄位
+        return cls(
+            symbol=data['s'],
+            event_time=data['E'],
+            open_price=float(data['o']),
+            high_price=float(data['h']),
+            low_price=float(data['l']),
+            close_price=float(data['c']),
+            volume=float(data['v']),
+            quote_volume=float(data['q']),
+            number_of_trades=int(data['n']) if 'n' in data else None,
+            price_change=float(data['p']) if 'p' in data else None,
+            price_change_percent=float(data['P']) if 'P' in data else None,
+            weighted_average_price=float(data['w']) if 'w' in data else None
+        )
+
+
+@dataclass
+class DepthMessage:
+    """深度數據 (@depth 增量或 @depth<N> 部分快照)"""
+    bids: List[List[str]]
+    asks: List[List[str]]
+    last_update_id: int
+    first_update_id: Optional[int] = None
+    symbol: Optional[str] = None
+    event_time: Optional[int] = None
+
+    @classmethod
+    def from_payload(cls, data: Dict) -> 'DepthMessage':
+        if 'lastUpdateId' in data:
+            return cls(
+                bids=data['bids'],
+                asks=data['asks'],
+                last_update_id=data['lastUpdateId']
+            )
+        return cls(
+            bids=data['b'],
+            asks=data['a'],
+            last_update_id=data['u'],
+            first_update_id=data.get('U'),
+            symbol=data.get('s'),
+            event_time=data.get('E')
+        )
+
+
+@dataclass
+class KlineMessage:
+    """K線 (@kline_<interval>)"""
+    symbol: str
+    event_time: int
+    interval: str
+    open_time: int
+    close_time: int
+    open_price: float
+    high_price: float
+    low_price: float
+    close_price: float
+    volume: float
+    quote_volume: float
+    number_of_trades: int
+    taker_buy_base_volume: float
+    taker_buy_quote_volume: float
+    is_closed: bool
+
+    @classmethod
+    def from_payload(cls, data: Dict) -> 'KlineMessage':
+        k = data['k']
+        return cls(
+            symbol=data['s'],
+            event_time=data['E'],
+            interval=k['i'],
+            open_time=k['t'],
+            close_time=k['T'],
+            open_price=float(k['o']),
+            high_price=float(k['h']),
+            low_price=float(k['l']),
+            close_price=float(k['c']),
+            volume=float(k['v']),
+            quote_volume=float(k['q']),
+            number_of_trades=int(k['n']),
+            taker_buy_base_volume=float(k['V']),
+            taker_buy_quote_volume=float(k['Q']),
+            is_closed=k['x']
+        )
+
+
+def message_type_for_stream(stream: str) -> Optional[type]:
+    """依流名稱判斷消息類型"""
+    channel = stream.split('@', 1)[1] if '@' in stream else stream
+    if channel == 'trade':
+        return TradeMessage
+    if channel in ('ticker', 'miniTicker'):
+        return TickerMessage
+    if channel.startswith('depth'):
+        return DepthMessage
+    if channel.startswith('kline_'):
+        return KlineMessage
+    return None
@@ -0,0 +1,220 @@
+# backend/app/data_collectors/binance/order_book.py
+
+from collections import deque
+from itertools import islice
+from typing import Deque, Dict, List, Optional, Tuple
+
+from sortedcontainers import SortedDict
+
+from app.core.logging import logger
+
+
+class OrderBookSide:
+    """以 SortedDict 維護排序的單邊價格檔位
+
+    價格鍵保持有序（買單以負價格存放），單一價位的新增與刪除為 O(log n)，
+    查詢前 N 檔、最優價與累計深度都不需要重新排序。
+    """
+
+    def __init__(self, descending: bool):
+        self.descending = descending
+        self._levels: SortedDict = SortedDict()
+
+    def __len__(self) -> int:
+        return len(self._levels)
+
+    def _key(self, price: float) -> float:
+        return -price if self.descending else price
+
+    def _price(self, key: float) -> float:
+        return -key if self.descending else key
+
+    def clear(self):
+        """清空所有檔位"""
+        self._levels.clear()
+
+    def load(self, levels: List[List[str]]):
+        """以快照檔位重建"""
+        self._levels = SortedDict(
+            (self._key(float(price)), float(quantity))
+            for price, quantity in levels
+            if float(quantity) > 0
+        )
+
+    def update(self, price: float, quantity: float):
+        """更新單一價位，數量為 0 時刪除該價位"""
+        key = self._key(price)
+        if quantity > 0:
+            self._levels[key] = quantity
+        else:
+            self._levels.pop(key, None)
+
+    def best(self) -> Optional[Tuple[float, float]]:
+        """最優價位"""
+        if not self._levels:
+            return None
+        key, quantity = self._levels.peekitem(0)
+        return self._price(key), quantity
+
+    def top(self, n: int) -> List[List[float]]:
+        """前 N 檔 [price, quantity]"""
+        return [
+            [self._price(key), quantity]
+            for key, quantity in islice(self._levels.items(), n)
+        ]
+
+    def cumulative_depth(self, n: Optional[int] = None, price_limit: Optional[float] = None) -> float:
+        """累計深度，可限制檔數或價格範圍"""
+        if price_limit is not None:
+            # 買單取價格 >= limit 的檔位，賣單取價格 <= limit 的檔位
+            end = self._levels.bisect_right(self._key(price_limit))
+            if n is not None:
+                end = min(end, n)
+        else:
+            end = len(self._levels) if n is None else min(n, len(self._levels))
+        return sum(islice(self._levels.values(), end))
+
+
+class LocalOrderBook:
+    """本地訂單簿，依照 Binance 的快照加增量流程同步
+
+    1. 快照到達前先緩存 @depth 增量事件
+    2. 丟棄 u <= lastUpdateId 的事件，第一個事件需滿足 U <= lastUpdateId+1 <= u
+    3. 之後每個事件的 U 必須等於上一個事件的 u+1，否則視為斷檔並重新同步
+    """
+
+    def __init__(self, symbol: str, max_buffer_size: int = 5000):
+        self.symbol = symbol
+        self.bids = OrderBookSide(descending=True)
+        self.asks = OrderBookSide(descending=False)
+        self.last_update_id: Optional[int] = None
+        self.synced = False
+        # 快照後的第一個事件只需涵蓋 lastUpdateId+1
+        self.awaiting_first_event = False
+        self.buffer: Deque[Dict] = deque(maxlen=max_buffer_size)
+        self.metrics = {
+            'updates_applied': 0,
+            'updates_buffered': 0,
+            'updates_skipped': 0,
+            'sequence_gaps': 0,
+            'snapshots_applied': 0
+        }
+
+    def reset(self):
+        """標記為未同步，保留已緩存的增量事件"""
+        self.synced = False
+        self.last_update_id = None
+        self.bids.clear()
+        self.asks.clear()
+
+    def process_diff(self, event: Dict) -> bool:
+        """處理增量事件，返回是否已套用"""
+        if not self.synced:
+            self.buffer.append(event)
+            self.metrics['updates_buffered'] += 1
+            return False
+
+        if event['u'] <= self.last_update_id:
+            self.metrics['updates_skipped'] += 1
+            return False
+
+        expected = self.last_update_id + 1
+        if self.awaiting_first_event:
+            in_sequence = event['U'] <= expected
+        else:
+            in_sequence = event['U'] == expected
+
+        if not in_sequence:
+            logger.warning(
+                f"Order book sequence gap for {self.symbol}: "
+                f"expected U={expected}, got U={event['U']}"
+            )
+            self.metrics['sequence_gaps'] += 1
+            self.reset()
+            self.buffer.clear()
+            self.buffer.append(event)
+            return False
+
+        self._apply(event)
+        return True
+
+    def apply_snapshot(self, snapshot: Dict) -> bool:
+        """套用 REST 快照並重放緩存事件，返回是否同步成功"""
+        last_update_id = snapshot['lastUpdateId']
+
+        pending = [event for event in self.buffer if event['u'] > last_update_id]
+        if pending and pending[0]['U'] > last_update_id + 1:
+            # 快照早於緩存的第一個事件，需要重新取得快照
+            logger.warning(f"Snapshot for {self.symbol} is older than buffered updates")
+            return False
+
+        self.bids.load(snapshot['bids'])
+        self.asks.load(snapshot['asks'])
+        self.last_update_id = last_update_id
+        self.synced = True
+        self.awaiting_first_event = True
+        self.buffer.clear()
+        self.metrics['snapshots_applied'] += 1
+
+        for event in pending:
+            self.process_diff(event)
+            if not self.synced:
+                return False
+        return True
+
+    def _apply(self, event: Dict):
+        """套用已通過序號檢查的事件"""
+        for price, quantity in event.get('b', []):
+            self.bids.update(float(price), float(quantity))
+        for price, quantity in event.get('a', []):
+            self.asks.update(float(price), float(quantity))
+        self.last_update_id = event['u']
+        self.awaiting_first_event = False
+        self.metrics['updates_applied'] += 1
+
+    def best_bid(self) -> Optional[Tuple[float, float]]:
+        return self.bids.best()
+
+    def best_ask(self) -> Optional[Tuple[float, float]]:
+        return self.asks.best()
+
+    def mid_price(self) -> Optional[float]:
+        """中間價"""
+        bid, ask = self.bids.best(), self.asks.best()
+        if not bid or not ask:
+            return None
+        return (bid[0] + ask[0]) / 2
+
+    def spread(self) -> Optional[float]:
+        """買賣價差"""
+        bid, ask = self.bids.best(), self.asks.best()
+        if not bid or not ask:
+            return None
+        return ask[0] - bid[0]
+
+    def top_levels(self, n: int = 20) -> Dict:
+        """前 N 檔深度"""
+        return {
+            'bids': self.bids.top(n),
+            'asks': self.asks.top(n),
+            'lastUpdateId': self.last_update_id or 0
+        }
+
+    def cumulative_depth(self, n: Optional[int] = None) -> Dict[str, float]:
+        """買賣雙方累計深度"""
+        return {
+            'bids': self.bids.cumulative_depth(n),
+            'asks': self.asks.cumulative_depth(n)
+        }
+
+    def get_status(self) -> Dict:
+        """同步狀態與統計"""
+        return {
+            'symbol': self.symbol,
+            'synced': self.synced,
+            'last_update_id': self.last_update_id,
+            'bid_levels': len(self.bids),
+            'ask_levels': len(self.asks),
+            'buffered': len(self.buffer),
+            **self.metrics
+        }
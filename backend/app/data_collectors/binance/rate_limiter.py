@@ -0,0 +1,312 @@
+# backend/app/data_collectors/binance/rate_limiter.py
+
+import asyncio
+import heapq
+import itertools
+import json
+import time
+from datetime import datetime
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+from app.core.logging import logger
+
+# 請求優先級，數值越小越先執行
+PRIORITY_LIVE = 0       # 實時收集（行情、訂單簿、交易對）
+PRIORITY_DEFAULT = 1
+PRIORITY_BACKFILL = 2   # 歷史回填
+
+# 固定權重的端點
+ENDPOINT_WEIGHTS: Dict[str, int] = {
+    '/api/v3/ping': 1,
+    '/api/v3/time': 1,
+    '/api/v3/exchangeInfo': 20,
+    '/api/v3/klines': 2,
+    '/api/v3/uiKlines': 2,
+    '/api/v3/trades': 25,
+    '/api/v3/historicalTrades': 25,
+    '/api/v3/aggTrades': 2,
+    '/api/v3/avgPrice': 2,
+}
+
+# /api/v3/depth 的權重依 limit 而定：(limit 上限, 權重)
+DEPTH_WEIGHTS: List[Tuple[int, int]] = [(100, 5), (500, 25), (1000, 50), (5000, 250)]
+
+
+def get_endpoint_weight(endpoint: str, params: Optional[Dict] = None) -> int:
+    """計算單次請求的權重"""
+    params = params or {}
+    if endpoint == '/api/v3/depth':
+        limit = int(params.get('limit', 100))
+        return next((weight for upper, weight in DEPTH_WEIGHTS if limit <= upper), 250)
+    if endpoint in ('/api/v3/ticker/24hr', '/api/v3/ticker/price', '/api/v3/ticker/bookTicker'):
+        # 不指定交易對時返回全市場數據，權重高得多
+        if 'symbol' in params:
+            return 2
+        return 80 if endpoint == '/api/v3/ticker/24hr' else 4
+    return ENDPOINT_WEIGHTS.get(endpoint, 1)
+
+
+class AdaptiveRateLimiter:
+    """依請求權重與響應頭調整額度的進程級限流器
+
+    Binance 以每分鐘（按整分鐘對齊）的已用權重限流，並在
+    X-MBX-USED-WEIGHT-1m 響應頭返回伺服器端計數。本限流器：
+    - 按端點權重扣減本地額度，並以響應頭校正；
+    - 只使用上限的 BINANCE_WEIGHT_SAFETY_RATIO，在觸發 429 前停止發送；
+    - 收到 429/418 時依 Retry-After 暫停所有請求；
+    - 等待中的請求按優先級排隊，實時收集先於歷史回填。
+    """
+
+    def __init__(
+        self,
+        weight_limit: Optional[int] = None,
+        safety_ratio: Optional[float] = None,
+        window_seconds: int = 60
+    ):
+        self.weight_limit = weight_limit or settings.BINANCE_WEIGHT_LIMIT
+        self.safety_ratio = safety_ratio or settings.BINANCE_WEIGHT_SAFETY_RATIO
+        self.window_seconds = window_seconds
+        self.window_start = self._current_window()
+        self.used_weight = 0
+        self.server_used_weight: Optional[int] = None
+        self.blocked_until = 0.0
+
+        self._waiters: List[Tuple[int, int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+        self.metrics = {
+            'requests': 0,
+            'weight_granted': 0,
+            'waits': 0,
+            'total_wait_time': 0.0,
+            'rate_limited': 0,
+            'banned': 0,
+            'requests_by_priority': {}
+        }
+
+    @property
+    def budget(self) -> int:
+        """本窗口可使用的權重"""
+        return int(self.weight_limit * self.safety_ratio)
+
+    def _current_window(self) -> float:
+        now = time.time()
+        return now - now % self.window_seconds
+
+    def _roll_window(self):
+        window = self._current_window()
+        if window != self.window_start:
+            self.window_start = window
+            self.used_weight = 0
+            self.server_used_weight = None
+
+    def _can_spend(self, weight: int) -> bool:
+        if time.time() < self.blocked_until:
+            return False
+        self._roll_window()
+        # 單次請求權重超過預算時，只在窗口空閒時放行
+        return self.used_weight + weight <= self.budget or self.used_weight == 0
+
+    def _next_opportunity(self) -> float:
+        """下一次可能放行的時間（epoch 秒）"""
+        if time.time() < self.blocked_until:
+            return self.blocked_until
+        return self.window_start + self.window_seconds
+
+    def _schedule(self):
+        """按優先級放行等待中的請求"""
+        while self._waiters:
+            priority, _, weight, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._can_spend(weight):
+                break
+            heapq.heappop(self._waiters)
+            self._spend(weight, priority)
+            future.set_result(None)
+
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+        if self._waiters:
+            loop = asyncio.get_running_loop()
+            delay = max(self._next_opportunity() - time.time(), 0.01)
+            self._wakeup = loop.call_later(delay, self._schedule)
+
+    def _spend(self, weight: int, priority: int):
+        self.used_weight += weight
+        self.metrics['requests'] += 1
+        self.metrics['weight_granted'] += weight
+        by_priority = self.metrics['requests_by_priority']
+        by_priority[priority] = by_priority.get(priority, 0) + 1
+
+    async def acquire(self, weight: int = 1, priority: int = PRIORITY_DEFAULT):
+        """取得額度；不足或被封禁時按優先級排隊等待"""
+        # 沒有更高優先級的等待者時直接放行
+        if (not self._waiters or self._waiters[0][0] > priority) and self._can_spend(weight):
+            self._spend(weight, priority)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), weight, future))
+        self.metrics['waits'] += 1
+        started = time.monotonic()
+        try:
+            self._schedule()
+            await future
+        finally:
+            self.metrics['total_wait_time'] += time.monotonic() - started
+            if not future.done():
+                future.cancel()
+
+    def update_from_headers(self, headers: Mapping[str, str], status_code: int = 200):
+        """依響應頭校正已用權重並處理 429/418"""
+        used = headers.get('x-mbx-used-weight-1m')
+        if used is not None:
+            self._roll_window()
+            self.server_used_weight = int(used)
+            # 伺服器計數包含同一 IP 的其他進程，取兩者較大值
+            self.used_weight = max(self.used_weight, self.server_used_weight)
+
+        if status_code in (418, 429):
+            retry_after = float(headers.get('retry-after') or self.window_seconds)
+            self.blocked_until = max(self.blocked_until, time.time() + retry_after)
+            if status_code == 418:
+                self.metrics['banned'] += 1
+                logger.error(f"Binance IP ban received, pausing all requests for {retry_after}s")
+            else:
+                self.metrics['rate_limited'] += 1
+                logger.warning(f"Binance rate limit hit, pausing requests for {retry_after}s")
+
+        if self._waiters:
+            self._schedule()
+
+    def configure_from_exchange_info(self, exchange_info: Dict):
+        """依 exchangeInfo 的 rateLimits 設定權重上限"""
+        for limit in exchange_info.get('rateLimits', []):
+            if (
+                limit.get('rateLimitType') == 'REQUEST_WEIGHT'
+                and limit.get('interval') == 'MINUTE'
+                and limit.get('intervalNum') == 1
+            ):
+                if limit['limit'] != self.weight_limit:
+                    logger.info(
+                        f"Updating Binance weight limit from {self.weight_limit} to {limit['limit']}"
+                    )
+                    self.weight_limit = limit['limit']
+                return
+
+    def get_status(self) -> Dict:
+        """獲取限流器狀態"""
+        self._roll_window()
+        now = time.time()
+        return {
+            'weight_limit': self.weight_limit,
+            'budget': self.budget,
+            'used_weight': self.used_weight,
+            'server_used_weight': self.server_used_weight,
+            'window_resets_in': self.window_start + self.window_seconds - now,
+            'blocked': now < self.blocked_until,
+            'blocked_for': max(self.blocked_until - now, 0.0),
+            'queued': sum(1 for waiter in self._waiters if not waiter[3].done()),
+            'requests': self.metrics['requests'],
+            'weight_granted': self.metrics['weight_granted'],
+            'waits': self.metrics['waits'],
+            'avg_wait_time': self.metrics['total_wait_time'] / max(self.metrics['waits'], 1),
+            'rate_limited': self.metrics['rate_limited'],
+            'banned': self.metrics['banned'],
+            'requests_by_priority': {
+                {PRIORITY_LIVE: 'live', PRIORITY_DEFAULT: 'default', PRIORITY_BACKFILL: 'backfill'}
+                .get(priority, str(priority)): count
+                for priority, count in self.metrics['requests_by_priority'].items()
+            }
+        }
+
+
+# 進程內所有 Binance REST 請求共用的限流器
+binance_rate_limiter = AdaptiveRateLimiter()
+
+# 收集進程發佈限流器狀態的 Redis 鍵
+RATE_LIMITER_STATUS_KEY = 'collector:binance_rate_limiter'
+
+
+class RateLimiterStatusPublisher:
+    """定期將收集進程的限流器狀態寫入 Redis
+
+    限流器是進程級的，API 進程中的實例不經手任何收集請求，
+    因此 API 讀取由收集進程發佈的狀態。鍵帶有過期時間，
+    收集進程停止後狀態會自動消失。
+    """
+
+    def __init__(
+        self,
+        limiter: Optional[AdaptiveRateLimiter] = None,
+        redis_client: Optional[aioredis.Redis] = None,
+        interval: Optional[float] = None
+    ):
+        self.limiter = limiter or binance_rate_limiter
+        self.redis = redis_client or aioredis.from_url(settings.REDIS_URL)
+        self.interval = interval or settings.BINANCE_RATE_LIMITER_STATUS_INTERVAL
+        self.running = False
+        self.metrics = {
+            'published': 0,
+            'errors': 0,
+            'last_published': None
+        }
+
+    async def publish(self):
+        """寫入一次當前狀態"""
+        status = self.limiter.get_status()
+        status['published_at'] = time.time()
+        await self.redis.set(
+            RATE_LIMITER_STATUS_KEY, json.dumps(status),
+            ex=max(int(self.interval * 3), 1)
+        )
+        self.metrics['published'] += 1
+        self.metrics['last_published'] = datetime.now().isoformat()
+
+    async def run(self):
+        """按間隔發佈狀態，直到停止"""
+        self.running = True
+        while self.running:
+            try:
+                await self.publish()
+            except Exception as e:
+                self.metrics['errors'] += 1
+                logger.warning(f"Error publishing rate limiter status: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def close(self):
+        """停止發佈並移除已發佈的狀態"""
+        self.running = False
+        try:
+            await self.redis.delete(RATE_LIMITER_STATUS_KEY)
+        except Exception as e:
+            logger.warning(f"Error removing rate limiter status: {e}")
+        finally:
+            await self.redis.close()
+
+    def get_metrics(self) -> Dict:
+        """獲取發佈指標"""
+        return dict(self.metrics)
+
+
+async def read_published_status(redis_client: Optional[aioredis.Redis] = None) -> Optional[Dict]:
+    """讀取收集進程發佈的限流器狀態，未發佈或已過期時返回 None"""
+    client = redis_client or aioredis.from_url(settings.REDIS_URL)
+    try:
+        raw = await client.get(RATE_LIMITER_STATUS_KEY)
+    finally:
+        if redis_client is None:
+            await client.close()
+
+    if raw is None:
+        return None
+    status = json.loads(raw)
+    status['age_seconds'] = max(time.time() - status['published_at'], 0.0)
+    return status
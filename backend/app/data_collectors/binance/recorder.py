@@ -0,0 +1,238 @@
+# backend/app/data_collectors/binance/recorder.py
+
+import asyncio
+import gzip
+import struct
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+from app.core.config import settings
+from app.core.logging import logger
+
+# 每筆記錄：長度前綴（不含自身）、序號、接收時間（epoch 納秒）、流名稱長度
+RECORD_HEADER = struct.Struct('<IQQH')
+SEGMENT_SUFFIX = '.seg.gz'
+
+
+@dataclass
+class RecordedFrame:
+    """錄製的原始 WebSocket 消息"""
+    seq: int
+    recv_time_ns: int
+    stream: str
+    frame: bytes
+
+
+def encode_record(seq: int, recv_time_ns: int, stream: str, frame: bytes) -> bytes:
+    stream_bytes = stream.encode()
+    body_length = RECORD_HEADER.size - 4 + len(stream_bytes) + len(frame)
+    return RECORD_HEADER.pack(body_length, seq, recv_time_ns, len(stream_bytes)) + stream_bytes + frame
+
+
+def read_segment(path: Union[str, Path]) -> Iterator[RecordedFrame]:
+    """逐筆讀取分段文件；結尾不完整的記錄（寫入中斷）會被忽略"""
+    with gzip.open(path, 'rb') as f:
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            body_length, seq, recv_time_ns, stream_length = RECORD_HEADER.unpack(header)
+            body = f.read(body_length - (RECORD_HEADER.size - 4))
+            if len(body) < body_length - (RECORD_HEADER.size - 4):
+                logger.warning(f"Truncated record {seq} at end of {path}")
+                return
+            yield RecordedFrame(
+                seq=seq,
+                recv_time_ns=recv_time_ns,
+                stream=body[:stream_length].decode(),
+                frame=body[stream_length:]
+            )
+
+
+def list_segments(directory: Union[str, Path]) -> List[Path]:
+    """按時間順序列出目錄下的分段文件"""
+    return sorted(Path(directory).glob(f'*{SEGMENT_SUFFIX}'))
+
+
+def read_segments(paths: Iterable[Union[str, Path]]) -> Iterator[RecordedFrame]:
+    """依序讀取多個分段文件"""
+    for path in paths:
+        yield from read_segment(path)
+
+
+class MarketDataRecorder:
+    """將原始 WebSocket 消息寫入輪替的壓縮分段文件
+
+    熱路徑只把編碼後的記錄追加到記憶體緩衝區，背景任務定期在
+    線程中寫入 gzip 文件；分段達到大小或時長上限時輪替。
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        segment_max_bytes: Optional[int] = None,
+        segment_max_seconds: Optional[float] = None,
+        flush_interval: Optional[float] = None,
+        prefix: str = 'binance'
+    ):
+        self.directory = Path(directory or settings.RECORDER_DIRECTORY)
+        self.segment_max_bytes = segment_max_bytes or settings.RECORDER_SEGMENT_MAX_BYTES
+        self.segment_max_seconds = segment_max_seconds or settings.RECORDER_SEGMENT_MAX_SECONDS
+        self.flush_interval = flush_interval or settings.RECORDER_FLUSH_INTERVAL
+        self.prefix = prefix
+
+        self.seq = 0
+        self.buffer = bytearray()
+        self.segment: Optional[gzip.GzipFile] = None
+        self.segment_path: Optional[Path] = None
+        self.segment_bytes = 0
+        self.segment_opened_at = 0.0
+        self.segment_index = 0
+        self.running = False
+        self._flush_lock = asyncio.Lock()
+        self.metrics = {
+            'frames_recorded': 0,
+            'bytes_recorded': 0,
+            'segments_written': 0,
+            'flush_errors': 0
+        }
+
+    def record(self, stream: Optional[str], frame: Union[str, bytes]):
+        """追加一條原始消息"""
+        if isinstance(frame, str):
+            frame = frame.encode()
+        self.seq += 1
+        self.buffer += encode_record(self.seq, time.time_ns(), stream or '', frame)
+        self.metrics['frames_recorded'] += 1
+
+    async def run(self):
+        """按間隔寫入緩衝區，直到停止"""
+        self.running = True
+        while self.running:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing market data recorder: {e}")
+
+    async def flush(self) -> int:
+        """將緩衝區寫入目前的分段"""
+        async with self._flush_lock:
+            if not self.buffer:
+                return 0
+            chunk, self.buffer = bytes(self.buffer), bytearray()
+            try:
+                await asyncio.to_thread(self._write_chunk, chunk)
+            except Exception:
+                self.metrics['flush_errors'] += 1
+                self.buffer = bytearray(chunk) + self.buffer
+                raise
+            self.metrics['bytes_recorded'] += len(chunk)
+            return len(chunk)
+
+    def _write_chunk(self, chunk: bytes):
+        if self.segment is not None and (
+            self.segment_bytes >= self.segment_max_bytes
+            or time.time() - self.segment_opened_at >= self.segment_max_seconds
+        ):
+            self._close_segment()
+        if self.segment is None:
+            self._open_segment()
+        self.segment.write(chunk)
+        self.segment_bytes += len(chunk)
+
+    def _open_segment(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_index += 1
+        name = f"{self.prefix}-{datetime.utcnow():%Y%m%dT%H%M%S}-{self.segment_index:04d}{SEGMENT_SUFFIX}"
+        self.segment_path = self.directory / name
+        self.segment = gzip.open(self.segment_path, 'wb', compresslevel=settings.RECORDER_COMPRESSION_LEVEL)
+        self.segment_bytes = 0
+        self.segment_opened_at = time.time()
+        logger.info(f"Recording market data to {self.segment_path}")
+
+    def _close_segment(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+            self.metrics['segments_written'] += 1
+
+    async def close(self):
+        """寫入剩餘記錄並關閉目前的分段"""
+        self.running = False
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Error flushing market data recorder on close: {e}")
+        await asyncio.to_thread(self._close_segment)
+
+    def get_metrics(self) -> Dict:
+        """獲取錄製指標"""
+        return {
+            **self.metrics,
+            'buffered_bytes': len(self.buffer),
+            'segment': str(self.segment_path) if self.segment_path else None,
+            'segment_bytes': self.segment_bytes
+        }
+
+
+class ReplayEngine:
+    """將錄製的消息按原始時間間隔送回 process_frame
+
+    speed=1 為原速，N 為 N 倍速，None 為不等待的最快速度；
+    目標通常是已註冊回調、未連接的 BinanceWebSocket。
+    """
+
+    def __init__(self, target, speed: Optional[float] = 1.0, streams: Optional[Iterable[str]] = None):
+        if speed is not None and speed <= 0:
+            raise ValueError(f"Invalid replay speed: {speed}")
+        self.target = target
+        self.speed = speed
+        self.streams = set(streams) if streams else None
+        self.metrics = {
+            'frames_replayed': 0,
+            'frames_skipped': 0,
+            'errors': 0,
+            'duration': 0.0,
+            'recorded_span': 0.0
+        }
+
+    async def replay(self, frames: Iterable[RecordedFrame]) -> Dict:
+        """重放消息並返回統計"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        first_recv_ns: Optional[int] = None
+        last_recv_ns: Optional[int] = None
+
+        for record in frames:
+            if self.streams is not None and record.stream not in self.streams:
+                self.metrics['frames_skipped'] += 1
+                continue
+
+            if first_recv_ns is None:
+                first_recv_ns = record.recv_time_ns
+            last_recv_ns = record.recv_time_ns
+
+            if self.speed is not None:
+                due = started + (record.recv_time_ns - first_recv_ns) / 1e9 / self.speed
+                delay = due - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif self.metrics['frames_replayed'] % 1000 == 0:
+                # 最快速度下定期讓出事件循環
+                await asyncio.sleep(0)
+
+            try:
+                await self.target.process_frame(record.frame)
+                self.metrics['frames_replayed'] += 1
+            except Exception as e:
+                self.metrics['errors'] += 1
+                logger.error(f"Error replaying frame {record.seq}: {e}")
+
+        self.metrics['duration'] = loop.time() - started
+        if first_recv_ns is not None:
+            self.metrics['recorded_span'] = (last_recv_ns - first_recv_ns) / 1e9
+        return dict(self.metrics)
@@ -0,0 +1,283 @@
+# backend/app/data_collectors/binance/stream_manager.py
+
+import asyncio
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.logging import logger
+from .websocket import BinanceWebSocket
+from .ingest_queue import merge_queue_metrics
+from .recorder import MarketDataRecorder
+
+
+class BinanceStreamManager:
+    """將數據流分散到多個組合流連接的 WebSocket 管理器
+
+    每個分片是一個獨立的 BinanceWebSocket，有自己的讀取任務；
+    某個分片失敗時只會重建該分片並重新訂閱其數據流。
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        streams_per_connection: Optional[int] = None,
+        recorder: Optional[MarketDataRecorder] = None
+    ):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.streams_per_connection = min(
+            streams_per_connection or settings.BINANCE_WS_STREAMS_PER_CONNECTION,
+            1024  # Binance 單連接流數量上限
+        )
+        self.shards: List[BinanceWebSocket] = []
+        self.shard_streams: List[List[str]] = []
+        self.stream_shard: Dict[str, int] = {}
+        self.callbacks: Dict[str, List[Tuple[Callable, bool]]] = {}
+        self.reader_tasks: Dict[int, asyncio.Task] = {}
+        self.shard_restarts: Dict[int, int] = {}
+        self.running = True
+        self.start_time = datetime.now()
+
+    def _create_shard(self, index: int) -> BinanceWebSocket:
+        """建立分片連接"""
+        return BinanceWebSocket(base_url=self.base_url, name=f"shard-{index}", recorder=self.recorder)
+
+    def _assign_streams(self, streams: List[str]) -> Dict[int, List[str]]:
+        """將新的數據流分配到有剩餘容量的分片"""
+        assignments: Dict[int, List[str]] = {}
+        for stream in streams:
+            if stream in self.stream_shard:
+                continue
+
+            index = next(
+                (
+                    i for i, shard_streams in enumerate(self.shard_streams)
+                    if len(shard_streams) < self.streams_per_connection
+                ),
+                None
+            )
+            if index is None:
+                index = len(self.shards)
+                self.shards.append(self._create_shard(index))
+                self.shard_streams.append([])
+
+            self.shard_streams[index].append(stream)
+            self.stream_shard[stream] = index
+            assignments.setdefault(index, []).append(stream)
+        return assignments
+
+    async def connect(self):
+        """連接所有尚未連接的分片"""
+        for shard in self.shards:
+            if not shard.websocket:
+                await shard.connect()
+
+    async def subscribe(self, streams: List[str]):
+        """訂閱數據流，自動分配到各分片"""
+        if isinstance(streams, str):
+            streams = [streams]
+
+        self.running = True
+        assignments = self._assign_streams(streams)
+        for index, shard_streams in assignments.items():
+            shard = self.shards[index]
+            shard.running = True
+            await shard.subscribe(shard_streams)
+            for stream in shard_streams:
+                for callback, typed in self.callbacks.get(stream, []):
+                    await shard.add_callback(stream, callback, typed)
+
+            # 監聽已啟動時，為新分片啟動讀取任務
+            if self.reader_tasks and index not in self.reader_tasks:
+                self.reader_tasks[index] = asyncio.create_task(self._run_shard(index))
+
+        if assignments:
+            logger.info(
+                f"Subscribed {sum(len(s) for s in assignments.values())} streams "
+                f"across {len(self.shards)} shards"
+            )
+
+    async def add_callback(self, stream: str, callback: Callable, typed: bool = False):
+        """為數據流添加回調函數"""
+        self.callbacks.setdefault(stream, []).append((callback, typed))
+        index = self.stream_shard.get(stream)
+        if index is not None:
+            await self.shards[index].add_callback(stream, callback, typed)
+
+    async def start_listening(self):
+        """為每個分片啟動讀取任務並等待其結束"""
+        self.running = True
+        for index in range(len(self.shards)):
+            if index not in self.reader_tasks:
+                self.reader_tasks[index] = asyncio.create_task(self._run_shard(index))
+
+        try:
+            # 新分片可能在監聽期間加入，持續等待直到全部結束
+            while self.running and self.reader_tasks:
+                await asyncio.wait(
+                    list(self.reader_tasks.values()),
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                self.reader_tasks = {
+                    index: task for index, task in self.reader_tasks.items()
+                    if not task.done()
+                }
+        finally:
+            await self.close()
+
+    async def _run_shard(self, index: int):
+        """運行單個分片的讀取循環，失敗時只重建該分片"""
+        delay = settings.BINANCE_WS_SHARD_RECONNECT_DELAY
+        while self.running:
+            shard = self.shards[index]
+            try:
+                await shard.start_listening()
+                if not self.running:
+                    break
+            except Exception as e:
+                logger.error(f"Shard {index} failed: {e}")
+
+            if not self.running:
+                break
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, settings.BINANCE_WS_SHARD_MAX_RECONNECT_DELAY)
+
+            try:
+                await self._restart_shard(index)
+                delay = settings.BINANCE_WS_SHARD_RECONNECT_DELAY
+            except Exception as e:
+                logger.error(f"Failed to restart shard {index}: {e}")
+
+    async def _restart_shard(self, index: int):
+        """關閉舊分片，重建分片連接並重新訂閱其數據流"""
+        old_shard = self.shards[index]
+        try:
+            # 釋放舊分片的連接與消費任務
+            await old_shard.close()
+        except Exception as e:
+            logger.error(f"Error closing shard {index}: {e}")
+
+        shard = self._create_shard(index)
+        shard.health_metrics['reconnect_count'] = old_shard.health_metrics['reconnect_count'] + 1
+        if shard.ingest_queue is not None and old_shard.ingest_queue is not None:
+            shard.ingest_queue.carry_over(old_shard.ingest_queue)
+        self.shards[index] = shard
+
+        streams = self.shard_streams[index]
+        await shard.subscribe(streams)
+        for stream in streams:
+            for callback, typed in self.callbacks.get(stream, []):
+                await shard.add_callback(stream, callback, typed)
+
+        self.shard_restarts[index] = self.shard_restarts.get(index, 0) + 1
+        logger.info(f"Shard {index} restarted with {len(streams)} streams")
+
+    async def reconnect(self):
+        """只重連已斷開的分片"""
+        for index, shard in enumerate(self.shards):
+            connected = shard.websocket is not None and not shard.websocket.closed
+            if not connected:
+                await self._reconnect_shard(index)
+
+    async def _reconnect_shard(self, index: int):
+        """停止分片的讀取任務後重建分片，再為新分片啟動讀取任務"""
+        task = self.reader_tasks.pop(index, None)
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                logger.error(f"Shard {index} reader failed: {e}")
+
+        await self._restart_shard(index)
+        if task is not None and self.running:
+            self.reader_tasks[index] = asyncio.create_task(self._run_shard(index))
+
+    async def unsubscribe(self, streams: List[str]):
+        """取消訂閱數據流"""
+        if isinstance(streams, str):
+            streams = [streams]
+
+        by_shard: Dict[int, List[str]] = {}
+        for stream in streams:
+            index = self.stream_shard.pop(stream, None)
+            self.callbacks.pop(stream, None)
+            if index is not None:
+                self.shard_streams[index].remove(stream)
+                by_shard.setdefault(index, []).append(stream)
+
+        for index, shard_streams in by_shard.items():
+            await self.shards[index].unsubscribe(shard_streams)
+
+    async def close(self):
+        """關閉所有分片"""
+        self.running = False
+        for task in self.reader_tasks.values():
+            if not task.done():
+                task.cancel()
+        self.reader_tasks.clear()
+
+        for shard in self.shards:
+            await shard.close()
+        self.shards.clear()
+        self.shard_streams.clear()
+        self.stream_shard.clear()
+        self.callbacks.clear()
+
+    def get_subscription_status(self) -> Dict:
+        """獲取訂閱狀態"""
+        shard_status = [shard.get_subscription_status() for shard in self.shards]
+        return {
+            'connected': bool(shard_status) and all(s['connected'] for s in shard_status),
+            'subscriptions': list(self.stream_shard.keys()),
+            'shard_count': len(self.shards),
+            'health_metrics': {
+                'uptime': str(datetime.now() - self.start_time),
+                'messages_received': sum(s['health_metrics']['messages_received'] for s in shard_status),
+                'errors_count': sum(s['health_metrics']['errors_count'] for s in shard_status),
+                'reconnect_count': sum(s['health_metrics']['reconnect_count'] for s in shard_status)
+            },
+            'shards': [
+                {
+                    'index': index,
+                    'streams': len(self.shard_streams[index]),
+                    'connected': status['connected'],
+                    'restarts': self.shard_restarts.get(index, 0),
+                    'messages_received': status['health_metrics']['messages_received'],
+                    'errors_count': status['health_metrics']['errors_count']
+                }
+                for index, status in enumerate(shard_status)
+            ]
+        }
+
+    def get_health_metrics(self) -> Dict:
+        """獲取匯總健康指標，格式與 BinanceWebSocket 相同"""
+        shard_metrics = [shard.get_health_metrics() for shard in self.shards]
+        messages = sum(shard.health_metrics['messages_received'] for shard in self.shards)
+        errors = sum(shard.health_metrics['errors_count'] for shard in self.shards)
+        ages = [m['connection_status']['last_message_age_seconds'] for m in shard_metrics]
+        max_age = max(ages) if ages else 0.0
+
+        return {
+            'uptime': str(datetime.now() - self.start_time),
+            'messages_per_second': sum(m['messages_per_second'] for m in shard_metrics),
+            'error_rate': errors / max(messages + errors, 1),
+            'connection_status': {
+                'connected': bool(shard_metrics) and all(
+                    m['connection_status']['connected'] for m in shard_metrics
+                ),
+                'last_message_age': str(max_age),
+                'last_message_age_seconds': max_age,
+                'reconnect_count': sum(
+                    m['connection_status']['reconnect_count'] for m in shard_metrics
+                )
+            },
+            'ingest_queue': merge_queue_metrics(
+                [m['ingest_queue'] for m in shard_metrics if m.get('ingest_queue')]
+            ),
+            'shards': shard_metrics
+        }
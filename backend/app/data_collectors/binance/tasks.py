@@ -1,34 +1,100 @@
 # backend/app/data_collectors/binance/tasks.py
 
 import asyncio
+import time
+from functools import partial
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Set
 from sqlalchemy.orm import Session
 from sqlalchemy import func
+from app.core.config import settings
 from app.core.database import SessionLocal
 from app.core.logging import logger
 from app.models.market import MarketData, OrderBook, TradingPair
+from app.services.symbol_registry import symbol_registry
+from app.services.partition_manager import PartitionManager
+from app.utils.orderbook_codec import storage_columns
+from .bar_aggregator import TradeBarAggregator
+from .client import BinanceClient
 from .collector import BinanceDataCollector
-from .websocket import BinanceWebSocket
+from .kline_stream import KlineStreamConsumer
+from .rate_limiter import RateLimiterStatusPublisher
+from .recorder import MarketDataRecorder
+from .stream_manager import BinanceStreamManager
+from .ticker_table import LatestTickerTable
+from .write_buffer import WriteBufferManager
 
 class DataCollectionTasks:
     def __init__(self):
         self.db: Session = SessionLocal()
-        self.collector = BinanceDataCollector(self.db)
-        self.websocket = BinanceWebSocket()
+        # 整個收集運行時共用一個 REST 連接池
+        self.client = BinanceClient()
+        self.collector = BinanceDataCollector(self.db, client=self.client)
+        # 錄製所有分片收到的原始消息
+        self.recorder: Optional[MarketDataRecorder] = None
+        if settings.RECORDER_ENABLED:
+            self.recorder = MarketDataRecorder()
+        self.websocket = BinanceStreamManager(recorder=self.recorder)
+        self.write_buffers = WriteBufferManager(SessionLocal)
+        # stream 模式下以全市場行情流取代 24hr ticker 輪詢
+        self.ticker_table: Optional[LatestTickerTable] = None
+        if settings.MARKET_DATA_SOURCE == 'stream':
+            self.ticker_table = LatestTickerTable(self.collector.exchange_id, SessionLocal)
+        # K線流只在收盤時寫入，斷線後以 REST 補齊
+        self.kline_stream: Optional[KlineStreamConsumer] = None
+        if settings.KLINE_STREAM_ENABLED:
+            self.kline_stream = KlineStreamConsumer(self.collector.exchange_id, SessionLocal, self.client)
+        # 逐筆成交聚合為K線，取代逐筆寫入 market_data
+        self.bar_aggregator: Optional[TradeBarAggregator] = None
+        if settings.TRADE_BARS_ENABLED:
+            self.bar_aggregator = TradeBarAggregator(self.collector.exchange_id, SessionLocal)
+        # 預先建立寫入所需的分區，並以整個分區為單位處理過期數據
+        self.partition_manager: Optional[PartitionManager] = None
+        if settings.PARTITIONING_ENABLED:
+            self.partition_manager = PartitionManager(SessionLocal)
+        # 限流器只存在於本進程，發佈到 Redis 供 API 查詢
+        self.rate_limiter_publisher: Optional[RateLimiterStatusPublisher] = None
+        if settings.BINANCE_RATE_LIMITER_STATUS_ENABLED:
+            self.rate_limiter_publisher = RateLimiterStatusPublisher()
         self.running = False
         self.active_symbols: Set[str] = set()
         self.last_health_check = datetime.now()
         self.health_check_interval = timedelta(minutes=5)
+        self.last_queue_dropped = 0
+        self.order_book_cycle_stats = {
+            'cycles': 0,
+            'overruns': 0,
+            'last_duration': 0.0,
+            'max_duration': 0.0,
+            'total_duration': 0.0,
+            'last_books': 0,
+            'interval': settings.ORDER_BOOK_POLL_INTERVAL
+        }
         
     async def start_collection(self, symbols: Optional[List[str]] = None):
         """啟動數據採集任務"""
         self.running = True
         self.active_symbols = set(symbols) if symbols else set()
+        if self.ticker_table is not None:
+            self.ticker_table.symbols = self.active_symbols
         
         try:
+            # 寫入前確保當前分區存在
+            if self.partition_manager is not None:
+                await asyncio.to_thread(self.partition_manager.maintain)
+
+            # 在此處導入以避免模組載入時就註冊信號處理器
+            from app.core.shutdown import graceful_shutdown
+            graceful_shutdown.register_write_buffer(self.write_buffers)
+            await self.write_buffers.start(MarketData, OrderBook)
+            
+            # 預先建立連接
+            await self.client.warmup()
+            
             # 首先更新交易對信息
             await self.collector.collect_trading_pairs()
+            if self.kline_stream is not None:
+                await self.kline_stream.start()
             
             # 啟動各個採集任務
             tasks = [
@@ -37,6 +103,16 @@ class DataCollectionTasks:
                 asyncio.create_task(self._run_websocket_collection()),
                 asyncio.create_task(self._run_health_check())
             ]
+            if self.kline_stream is not None:
+                tasks.append(asyncio.create_task(self.kline_stream.run_persistence()))
+            if self.bar_aggregator is not None:
+                tasks.append(asyncio.create_task(self.bar_aggregator.run_persistence()))
+            if self.recorder is not None:
+                tasks.append(asyncio.create_task(self.recorder.run()))
+            if self.partition_manager is not None:
+                tasks.append(asyncio.create_task(self._run_partition_maintenance()))
+            if self.rate_limiter_publisher is not None:
+                tasks.append(asyncio.create_task(self.rate_limiter_publisher.run()))
             
             # 等待所有任務完成
             await asyncio.gather(*tasks)
@@ -51,9 +127,32 @@ class DataCollectionTasks:
         """停止數據採集"""
         self.running = False
         await self.websocket.close()
+        if self.ticker_table is not None:
+            await self.ticker_table.close()
+        if self.kline_stream is not None:
+            await self.kline_stream.close()
+        if self.bar_aggregator is not None:
+            await self.bar_aggregator.close()
+        if self.recorder is not None:
+            await self.recorder.close()
+        if self.rate_limiter_publisher is not None:
+            await self.rate_limiter_publisher.close()
+        await self.write_buffers.close()
+        await self.client.close()
     
+    async def _run_partition_maintenance(self):
+        """定期維護分區，首次已在啟動時執行"""
+        while self.running:
+            await asyncio.sleep(settings.PARTITION_MAINTENANCE_INTERVAL)
+            await asyncio.to_thread(self.partition_manager.maintain)
+
     async def _run_market_data_collection(self):
         """運行市場數據採集"""
+        if self.ticker_table is not None:
+            # 數據由全市場行情流提供，這裡只負責按間隔持久化
+            await self.ticker_table.run_persistence()
+            return
+        
         while self.running:
             try:
                 symbols = list(self.active_symbols) if self.active_symbols else None
@@ -66,33 +165,57 @@ class DataCollectionTasks:
                 await asyncio.sleep(5)  # 錯誤後等待5秒重試
     
     async def _run_order_book_collection(self):
-        """運行訂單簿數據採集"""
+        """運行訂單簿數據採集，按固定節奏輪詢"""
+        interval = settings.ORDER_BOOK_POLL_INTERVAL
         while self.running:
             try:
+                started = time.monotonic()
                 if self.active_symbols:
-                    await self.collector.collect_order_books(list(self.active_symbols))
-                    logger.info(f"Order books collected for {len(self.active_symbols)} symbols")
-                await asyncio.sleep(5)  # 每5秒更新一次
+                    order_books = await self.collector.collect_order_books(list(self.active_symbols))
+                    self._record_order_book_cycle(time.monotonic() - started, len(order_books))
+                    logger.info(f"Order books collected for {len(order_books)}/{len(self.active_symbols)} symbols")
+                
+                # 扣除本週期耗時，保持固定節奏
+                await asyncio.sleep(max(interval - (time.monotonic() - started), 0))
                 
             except Exception as e:
                 logger.error(f"Error in order book collection: {str(e)}")
                 await asyncio.sleep(2)  # 錯誤後等待2秒重試
     
+    def _record_order_book_cycle(self, duration: float, books: int):
+        """記錄訂單簿輪詢週期耗時"""
+        stats = self.order_book_cycle_stats
+        stats['cycles'] += 1
+        stats['last_duration'] = duration
+        stats['max_duration'] = max(stats['max_duration'], duration)
+        stats['total_duration'] += duration
+        stats['last_books'] = books
+        
+        if duration > stats['interval']:
+            stats['overruns'] += 1
+            logger.warning(
+                f"Order book cycle took {duration:.2f}s, exceeding the "
+                f"{stats['interval']}s interval for {len(self.active_symbols)} symbols; "
+                f"raise ORDER_BOOK_POLL_INTERVAL or ORDER_BOOK_CONCURRENCY"
+            )
+    
     async def _run_websocket_collection(self):
         """運行WebSocket數據採集"""
         while self.running:
             try:
-                await self.websocket.connect()
-                
                 # 構建訂閱列表
                 subscriptions = []
                 for symbol in self.active_symbols:
                     symbol_lower = symbol.lower()
-                    subscriptions.extend([
-                        f"{symbol_lower}@trade",
-                        f"{symbol_lower}@ticker",
-                        f"{symbol_lower}@depth20@100ms"
-                    ])
+                    subscriptions.append(f"{symbol_lower}@trade")
+                    # stream 模式下單個交易對的行情已包含在全市場行情流中
+                    if self.ticker_table is None:
+                        subscriptions.append(f"{symbol_lower}@ticker")
+                    subscriptions.append(f"{symbol_lower}@depth20@100ms")
+                if self.ticker_table is not None:
+                    subscriptions.append(settings.MARKET_TICKER_STREAM)
+                if self.kline_stream is not None:
+                    subscriptions.extend(self.kline_stream.streams(self.active_symbols))
                 
                 # 訂閱數據流
                 if subscriptions:
@@ -100,7 +223,17 @@ class DataCollectionTasks:
                     
                     # 添加數據處理回調
                     for stream in subscriptions:
-                        if '@trade' in stream:
+                        if stream == settings.MARKET_TICKER_STREAM:
+                            await self.websocket.add_callback(
+                                stream,
+                                self.ticker_table.handle_message
+                            )
+                        elif '@kline_' in stream:
+                            await self.websocket.add_callback(
+                                stream,
+                                self.kline_stream.handle_message
+                            )
+                        elif '@trade' in stream:
                             await self.websocket.add_callback(
                                 stream,
                                 self._handle_trade_message
@@ -111,13 +244,19 @@ class DataCollectionTasks:
                                 self._handle_ticker_message
                             )
                         elif '@depth' in stream:
+                            # 部分深度流的數據不含交易對符號，需從流名稱帶入
                             await self.websocket.add_callback(
                                 stream,
-                                self._handle_depth_message
+                                partial(
+                                    self._handle_depth_message,
+                                    symbol=stream.split('@')[0].upper()
+                                )
                             )
                     
-                    # 開始監聽
+                    # 開始監聽（每個分片各自讀取與重連）
                     await self.websocket.start_listening()
+                else:
+                    await asyncio.sleep(5)
                 
             except Exception as e:
                 logger.error(f"WebSocket error: {str(e)}")
@@ -132,22 +271,29 @@ class DataCollectionTasks:
             symbol = data.get('s')  # 交易對符號
             if not symbol or symbol not in self.active_symbols:
                 return
-                
-            # 創建交易記錄
-            trade_data = MarketData(
-                trading_pair_id=self._get_trading_pair_id(symbol),
-                timestamp=datetime.fromtimestamp(data['T'] / 1000),  # 轉換時間戳
-                price=float(data['p']),
-                volume=float(data['q']),
-                is_buyer_maker=data['m']
-            )
             
-            self.db.add(trade_data)
-            await self.db.commit()
+            if self.bar_aggregator is not None:
+                await self.bar_aggregator.handle_message(data)
+                # 大額交易監控讀取 market_data 中的逐筆成交，啟用時不可略過
+                if not (settings.TRADE_PERSIST_RAW or settings.LARGE_TRADE_MONITOR_ENABLED):
+                    return
+            
+            price = float(data['p'])
+            
+            # 加入寫入緩衝區，由背景任務批次寫入
+            self.write_buffers.add(MarketData, {
+                'exchange_id': self.collector.exchange_id,
+                'trading_pair_id': self._get_trading_pair_id(symbol),
+                'timestamp': datetime.fromtimestamp(data['T'] / 1000),  # 轉換時間戳
+                'price': price,
+                'close_price': price,
+                'volume': float(data['q']),
+                # 買方為掛單方時，主動成交方為賣方
+                'side': 'sell' if data['m'] else 'buy'
+            })
             
         except Exception as e:
             logger.error(f"Error processing trade message: {e}")
-            await self.db.rollback()
 
     async def _handle_ticker_message(self, data: Dict):
         """處理行情消息"""
@@ -155,51 +301,62 @@ class DataCollectionTasks:
             symbol = data.get('s')  # 交易對符號
             if not symbol or symbol not in self.active_symbols:
                 return
-                
-            # 更新市場數據
-            market_data = MarketData(
-                trading_pair_id=self._get_trading_pair_id(symbol),
-                timestamp=datetime.fromtimestamp(data['E'] / 1000),
-                open_price=float(data['o']),
-                high_price=float(data['h']),
-                low_price=float(data['l']),
-                close_price=float(data['c']),
-                volume=float(data['v']),
-                quote_volume=float(data['q']),
-                number_of_trades=int(data['n'])
-            )
             
-            self.db.add(market_data)
-            await self.db.commit()
+            open_price = float(data['o'])
+            close_price = float(data['c'])
+            
+            # 更新市場數據
+            self.write_buffers.add(MarketData, {
+                'exchange_id': self.collector.exchange_id,
+                'trading_pair_id': self._get_trading_pair_id(symbol),
+                'timestamp': datetime.fromtimestamp(data['E'] / 1000),
+                'price': close_price,
+                'side': 'buy' if close_price >= open_price else 'sell',
+                'open_price': open_price,
+                'high_price': float(data['h']),
+                'low_price': float(data['l']),
+                'close_price': close_price,
+                'volume': float(data['v']),
+                'quote_volume': float(data['q']),
+                'number_of_trades': int(data['n'])
+            })
             
         except Exception as e:
             logger.error(f"Error processing ticker message: {e}")
-            await self.db.rollback()
 
 # backend/app/data_collectors/binance/tasks.py (continued)
 
-    async def _handle_depth_message(self, data: Dict):
+    async def _handle_depth_message(self, data: Dict, symbol: Optional[str] = None):
         """處理深度消息"""
         try:
-            symbol = data.get('s')  # 交易對符號
+            symbol = data.get('s') or symbol  # 交易對符號
             if not symbol or symbol not in self.active_symbols:
                 return
-                
-            # 創建訂單簿記錄
-            order_book = OrderBook(
-                trading_pair_id=self._get_trading_pair_id(symbol),
-                timestamp=datetime.fromtimestamp(data['E'] / 1000),
-                bids=data['b'],  # 買單列表
-                asks=data['a'],  # 賣單列表
-                last_update_id=data['u']  # 最後更新ID
+            
+            # 部分深度流使用 bids/asks/lastUpdateId，增量深度流使用 b/a/u
+            event_time = data.get('E')
+            timestamp = (
+                datetime.fromtimestamp(event_time / 1000)
+                if event_time else datetime.now()
             )
             
-            self.db.add(order_book)
-            await self.db.commit()
+            # 創建訂單簿記錄，檔位按 ORDER_BOOK_STORAGE 編碼
+            info = symbol_registry.get(symbol)
+            self.write_buffers.add(OrderBook, {
+                'exchange_id': self.collector.exchange_id,
+                'trading_pair_id': self._get_trading_pair_id(symbol),
+                'timestamp': timestamp,
+                'last_update_id': data.get('u', data.get('lastUpdateId')),  # 最後更新ID
+                **storage_columns(
+                    data.get('b', data.get('bids')),  # 買單列表
+                    data.get('a', data.get('asks')),  # 賣單列表
+                    info.tick_size if info else None,
+                    info.step_size if info else None
+                )
+            })
             
         except Exception as e:
             logger.error(f"Error processing depth message: {e}")
-            await self.db.rollback()
     
     async def _run_health_check(self):
         """運行健康檢查"""
@@ -229,7 +386,7 @@ class DataCollectionTasks:
             
             # 檢查數據延遲
             metrics = self.websocket.get_health_metrics()
-            if metrics['connection_status']['last_message_age'] > timedelta(minutes=1):
+            if metrics['connection_status']['last_message_age_seconds'] > timedelta(minutes=1).total_seconds():
                 logger.warning("Data delay detected, checking connection...")
                 await self.websocket.reconnect()
             
@@ -240,7 +397,32 @@ class DataCollectionTasks:
             # 檢查消息處理率
             if metrics['messages_per_second'] < 0.1:  # 每秒消息少於0.1條
                 logger.warning(f"Low message rate: {metrics['messages_per_second']:.2f} msgs/sec")
+
+            # 檢查消息隊列的延遲與丟棄情況
+            queue_metrics = metrics.get('ingest_queue') or {}
+            if queue_metrics:
+                if queue_metrics['current_lag'] > settings.INGEST_QUEUE_LAG_WARNING:
+                    logger.warning(
+                        f"Ingestion queue lagging: {queue_metrics['current_lag']:.2f}s "
+                        f"({queue_metrics['size']} messages queued)"
+                    )
+                dropped = queue_metrics['dropped'] - self.last_queue_dropped
+                if dropped > 0:
+                    logger.warning(
+                        f"Ingestion queue dropped {dropped} messages since last check "
+                        f"({queue_metrics['conflated']} conflated in total)"
+                    )
+                self.last_queue_dropped = queue_metrics['dropped']
             
+            # 檢查寫入緩衝區
+            for table, buffer_metrics in self.write_buffers.get_metrics().items():
+                if buffer_metrics['rows_dropped'] > 0:
+                    logger.warning(
+                        f"Write buffer {table} dropped {buffer_metrics['rows_dropped']} rows "
+                        f"(queue depth {buffer_metrics['queue_depth']}, "
+                        f"last flush {buffer_metrics['last_flush_latency']:.3f}s)"
+                    )
+
             # 檢查數據庫連接
             try:
                 self.db.execute("SELECT 1")
@@ -263,21 +445,11 @@ class DataCollectionTasks:
             logger.error(f"Error reconnecting to database: {e}")
     
     def _get_trading_pair_id(self, symbol: str) -> int:
-        """獲取交易對ID"""
-        try:
-            trading_pair = self.db.query(TradingPair).filter_by(
-                symbol=symbol,
-                is_active=1
-            ).first()
-            
-            if not trading_pair:
-                raise ValueError(f"Trading pair not found: {symbol}")
-                
-            return trading_pair.id
-            
-        except Exception as e:
-            logger.error(f"Error getting trading pair ID for {symbol}: {e}")
-            raise
+        """從註冊表獲取交易對ID"""
+        pair_id = symbol_registry.get_id(symbol)
+        if pair_id is None:
+            raise ValueError(f"Trading pair not found: {symbol}")
+        return pair_id
 
     @staticmethod
     async def run_quick_test(symbols: List[str] = None):
@@ -293,8 +465,8 @@ class DataCollectionTasks:
             await tasks.collector.collect_trading_pairs()
             
             # 測試市場數據收集
-            market_data = await tasks.collector.collect_market_data(symbols)
-            logger.info(f"Collected {len(market_data)} market data records")
+            market_data_count = await tasks.collector.collect_market_data(symbols)
+            logger.info(f"Collected {market_data_count} market data records")
             
             # 測試訂單簿收集
             order_books = await tasks.collector.collect_order_books(symbols)
@@ -314,6 +486,7 @@ class DataCollectionTasks:
         except Exception as e:
             logger.error(f"Error during quick test: {e}")
         finally:
+            await tasks.client.close()
             tasks.db.close()
     
     async def get_collection_status(self) -> Dict:
@@ -325,6 +498,19 @@ class DataCollectionTasks:
                 'websocket': self.websocket.get_subscription_status(),
                 'health_metrics': self.websocket.get_health_metrics(),
                 'last_health_check': self.last_health_check.isoformat(),
+                'write_buffers': self.write_buffers.get_metrics(),
+                'http_pool': self.client.get_pool_stats(),
+                'symbol_registry': symbol_registry.get_status(),
+                'ticker_table': self.ticker_table.get_metrics() if self.ticker_table else None,
+                'kline_stream': self.kline_stream.get_metrics() if self.kline_stream else None,
+                'trade_bars': self.bar_aggregator.get_metrics() if self.bar_aggregator else None,
+                'recorder': self.recorder.get_metrics() if self.recorder else None,
+                'partitions': self.partition_manager.get_metrics() if self.partition_manager else None,
+                'order_book_cycles': {
+                    **self.order_book_cycle_stats,
+                    'avg_duration': self.order_book_cycle_stats['total_duration']
+                        / max(self.order_book_cycle_stats['cycles'], 1)
+                },
                 'database_connected': True
             }
             
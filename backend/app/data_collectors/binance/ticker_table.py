@@ -0,0 +1,173 @@
+# backend/app/data_collectors/binance/ticker_table.py
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.models.market import MarketData
+from app.services.symbol_registry import symbol_registry
+from app.utils.bulk_copy import bulk_insert_columns
+from .collector import MARKET_DATA_COLUMNS
+
+
+class LatestTickerTable:
+    """全市場行情流（!miniTicker@arr / !ticker@arr）的最新行情表
+
+    流每秒推送有變化的交易對，這裡只保留每個交易對的最新值，
+    並按固定的合併間隔將有變化的交易對批次寫入 market_data。
+    """
+
+    def __init__(
+        self,
+        exchange_id: int,
+        session_factory: Callable[[], Session],
+        persist_interval: Optional[float] = None,
+        symbols: Optional[Set[str]] = None
+    ):
+        self.exchange_id = exchange_id
+        self.session_factory = session_factory
+        self.persist_interval = persist_interval or settings.MARKET_TICKER_PERSIST_INTERVAL
+        self.symbols = symbols  # 為空時保留所有交易對
+
+        self.latest: Dict[str, Dict] = {}
+        self.dirty: Set[str] = set()
+        self.running = False
+        self.metrics = {
+            'messages': 0,
+            'updates': 0,
+            'rows_persisted': 0,
+            'persist_count': 0,
+            'persist_errors': 0,
+            'last_persist_latency': 0.0,
+            'last_event_time': None
+        }
+
+    async def handle_message(self, data: List[Dict]):
+        """處理行情陣列消息"""
+        self.metrics['messages'] += 1
+        for ticker in data:
+            symbol = ticker['s']
+            if self.symbols and symbol not in self.symbols:
+                continue
+            self.latest[symbol] = ticker
+            self.dirty.add(symbol)
+            self.metrics['updates'] += 1
+        if data:
+            self.metrics['last_event_time'] = data[-1].get('E')
+
+    def get(self, symbol: str) -> Optional[Dict]:
+        """獲取交易對的最新行情"""
+        return self.latest.get(symbol)
+
+    async def run_persistence(self):
+        """按合併間隔持久化，直到停止"""
+        self.running = True
+        while self.running:
+            await asyncio.sleep(self.persist_interval)
+            try:
+                await self.persist()
+            except Exception as e:
+                logger.error(f"Error persisting ticker table: {e}")
+
+    async def persist(self) -> int:
+        """將上次持久化後有變化的交易對寫入 market_data"""
+        if not self.dirty:
+            return 0
+
+        symbols, self.dirty = self.dirty, set()
+        columns = self._to_columns([self.latest[symbol] for symbol in symbols])
+        row_count = len(columns['trading_pair_id'])
+        if not row_count:
+            return 0
+
+        start_time = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._write, columns)
+        except Exception:
+            self.metrics['persist_errors'] += 1
+            # 未寫入的交易對留待下次重試
+            self.dirty |= symbols
+            raise
+
+        self.metrics['rows_persisted'] += row_count
+        self.metrics['persist_count'] += 1
+        self.metrics['last_persist_latency'] = time.perf_counter() - start_time
+        return row_count
+
+    def _write(self, columns: Dict[str, List]):
+        db = self.session_factory()
+        try:
+            bulk_insert_columns(db, MarketData.__table__, columns)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _to_columns(self, tickers: List[Dict]) -> Dict[str, List]:
+        """將行情流欄位轉換為 market_data 欄位陣列"""
+        columns: Dict[str, List] = {name: [] for name in MARKET_DATA_COLUMNS}
+        now = datetime.utcnow()
+
+        for ticker in tickers:
+            pair_id = symbol_registry.get_id(ticker['s'])
+            if not pair_id:
+                continue
+
+            open_price = float(ticker['o'])
+            close_price = float(ticker['c'])
+
+            columns['exchange_id'].append(self.exchange_id)
+            columns['trading_pair_id'].append(pair_id)
+            columns['timestamp'].append(datetime.fromtimestamp(ticker['E'] / 1000))
+            columns['price'].append(close_price)
+            columns['side'].append('buy' if close_price >= open_price else 'sell')
+            columns['open_price'].append(open_price)
+            columns['high_price'].append(float(ticker['h']))
+            columns['low_price'].append(float(ticker['l']))
+            columns['close_price'].append(close_price)
+            columns['volume'].append(float(ticker['v']))
+            columns['quote_volume'].append(float(ticker['q']))
+            # miniTicker 不含以下欄位
+            columns['number_of_trades'].append(int(ticker['n']) if 'n' in ticker else None)
+            columns['price_change'].append(float(ticker['p']) if 'p' in ticker else close_price - open_price)
+            columns['price_change_percent'].append(
+                float(ticker['P']) if 'P' in ticker
+                else (close_price / open_price - 1) * 100 if open_price else None
+            )
+            columns['taker_buy_base_volume'].append(None)
+            columns['taker_buy_quote_volume'].append(None)
+            columns['weighted_average_price'].append(float(ticker['w']) if 'w' in ticker else None)
+            columns['created_at'].append(now)
+            columns['updated_at'].append(now)
+
+        return columns
+
+    async def close(self):
+        """停止並寫入剩餘的更新"""
+        self.running = False
+        try:
+            await self.persist()
+        except Exception as e:
+            logger.error(f"Error persisting ticker table on close: {e}")
+
+    def get_metrics(self) -> Dict:
+        """獲取行情表指標"""
+        last_event_time = self.metrics['last_event_time']
+        return {
+            'symbols': len(self.latest),
+            'pending_updates': len(self.dirty),
+            'messages': self.metrics['messages'],
+            'updates': self.metrics['updates'],
+            'rows_persisted': self.metrics['rows_persisted'],
+            'persist_count': self.metrics['persist_count'],
+            'persist_errors': self.metrics['persist_errors'],
+            'last_persist_latency': self.metrics['last_persist_latency'],
+            'data_age_seconds': time.time() - last_event_time / 1000 if last_event_time else None
+        }
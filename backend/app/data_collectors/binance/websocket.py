@@ -1,16 +1,44 @@
 import json
 import asyncio
-from typing import Dict, List, Callable, Optional
+from typing import Dict, List, Callable, Optional, Tuple
 import websockets
 from datetime import datetime, timedelta
+from app.core.config import settings
 from app.core.logging import logger
+from .messages import get_json_decoder, message_type_for_stream
+from .ingest_queue import IngestionQueue
+from .recorder import MarketDataRecorder
+
+def _typed_callback(callback: Callable, parse: Callable) -> Callable:
+    """將原始 payload 轉為型別化消息後再交給回調"""
+    async def wrapper(payload: Dict):
+        return await callback(parse(payload))
+    return wrapper
 
 class BinanceWebSocket:
-    def __init__(self):
-        self.base_url = "wss://stream.binance.com:9443/ws"
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        name: str = "default",
+        use_queue: bool = True,
+        recorder: Optional[MarketDataRecorder] = None
+    ):
+        # 使用組合流端點，消息格式為 {"stream": ..., "data": ...}
+        self.base_url = base_url or settings.BINANCE_WS_BASE_URL
+        self.name = name
         self.websocket: Optional[websockets.WebSocketClientProtocol] = None
         self.subscriptions: Dict[str, List[Callable]] = {}
+        # 預先計算的分派表：流名稱 -> 回調元組
+        self.dispatch_table: Dict[str, Tuple[Callable, ...]] = {}
+        self.decoder = get_json_decoder(settings.BINANCE_WS_JSON_DECODER)
+        # 讀取與處理之間的有界隊列，避免慢回調阻塞 recv()
+        self.ingest_queue: Optional[IngestionQueue] = IngestionQueue() if use_queue else None
+        self.consumer_task: Optional[asyncio.Task] = None
+        # 錄製原始消息，供離線重放
+        self.recorder = recorder
         self.running = True
+        self.request_id = 0
+        self.last_control_message_time = 0.0
         self.health_metrics = {
             'start_time': datetime.now(),
             'messages_received': 0,
@@ -28,7 +56,7 @@ class BinanceWebSocket:
                 ping_timeout=20,
                 close_timeout=10
             )
-            logger.info("Connected to Binance WebSocket")
+            logger.info(f"Connected to Binance WebSocket ({self.name})")
             self.health_metrics['last_connect_time'] = datetime.now()
             
         except Exception as e:
@@ -36,6 +64,22 @@ class BinanceWebSocket:
             self.health_metrics['errors_count'] += 1
             raise
     
+    async def _send_control_message(self, method: str, params: List[str]):
+        """發送控制消息，遵守每秒消息數限制"""
+        min_interval = 1.0 / settings.BINANCE_WS_MAX_MESSAGES_PER_SECOND
+        loop = asyncio.get_running_loop()
+        wait_time = self.last_control_message_time + min_interval - loop.time()
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+        
+        self.request_id += 1
+        await self.websocket.send(json.dumps({
+            "method": method,
+            "params": params,
+            "id": self.request_id
+        }))
+        self.last_control_message_time = loop.time()
+    
     async def subscribe(self, streams: List[str]):
         """訂閱多個數據流"""
         if not self.websocket:
@@ -45,15 +89,12 @@ class BinanceWebSocket:
             # 如果是單個字符串，轉換為列表
             if isinstance(streams, str):
                 streams = [streams]
-                
-            subscribe_message = {
-                "method": "SUBSCRIBE",
-                "params": streams,
-                "id": len(self.subscriptions)
-            }
             
-            await self.websocket.send(json.dumps(subscribe_message))
-            logger.info(f"Subscribed to streams: {streams}")
+            # 分批發送，避免單條消息過大
+            batch_size = settings.BINANCE_WS_STREAMS_PER_SUBSCRIBE
+            for i in range(0, len(streams), batch_size):
+                await self._send_control_message("SUBSCRIBE", streams[i:i + batch_size])
+            logger.info(f"Subscribed to {len(streams)} streams on {self.name}")
             
             # 初始化訂閱回調列表
             for stream in streams:
@@ -65,16 +106,68 @@ class BinanceWebSocket:
             self.health_metrics['errors_count'] += 1
             raise
     
-    async def add_callback(self, stream: str, callback: Callable):
-        """為特定數據流添加回調函數"""
+    async def add_callback(self, stream: str, callback: Callable, typed: bool = False):
+        """為特定數據流添加回調函數，typed=True 時回調收到型別化消息"""
+        if typed:
+            message_type = message_type_for_stream(stream)
+            if message_type is not None:
+                callback = _typed_callback(callback, message_type.from_payload)
+        
         if stream not in self.subscriptions:
             self.subscriptions[stream] = []
         self.subscriptions[stream].append(callback)
+        self._rebuild_dispatch_table()
+    
+    def _rebuild_dispatch_table(self):
+        """重建分派表，熱路徑只需一次字典查找"""
+        self.dispatch_table = {
+            stream: tuple(callbacks)
+            for stream, callbacks in self.subscriptions.items()
+            if callbacks
+        }
+    
+    async def process_frame(self, message):
+        """解碼並分派單條消息"""
+        data = self.decoder.loads(message)
+        if self.recorder is not None:
+            self.recorder.record(data.get('stream'), message)
+        
+        handlers = self.dispatch_table.get(data.get('stream'))
+        if handlers is None:
+            # 處理心跳消息；訂閱確認與未註冊的流直接忽略（重放時沒有連接）
+            if 'ping' in data and self.websocket is not None:
+                await self.websocket.send(json.dumps({"pong": data['ping']}))
+            return
+        
+        if self.ingest_queue is not None:
+            await self.ingest_queue.put(data['stream'], data['data'])
+        else:
+            await self.dispatch(data['stream'], data['data'])
+    
+    async def dispatch(self, stream: str, payload):
+        """將消息交給該流的所有回調"""
+        for callback in self.dispatch_table.get(stream, ()):
+            try:
+                await callback(payload)
+            except Exception as e:
+                logger.error(f"Error in callback for stream {stream}: {e}")
+                self.health_metrics['errors_count'] += 1
+    
+    async def _consume_queue(self):
+        """從隊列取出消息並分派，隊列關閉後處理完剩餘消息即結束"""
+        while True:
+            item = await self.ingest_queue.get()
+            if item is None:
+                return
+            await self.dispatch(*item)
     
     async def start_listening(self):
         """開始監聽數據流"""
         if not self.websocket:
             await self.connect()
+        
+        if self.ingest_queue is not None and (self.consumer_task is None or self.consumer_task.done()):
+            self.consumer_task = asyncio.create_task(self._consume_queue())
             
         try:
             while self.running:
@@ -83,26 +176,7 @@ class BinanceWebSocket:
                     self.health_metrics['messages_received'] += 1
                     self.health_metrics['last_message_time'] = datetime.now()
                     
-                    data = json.loads(message)
-                    
-                    # 處理訂閱確認消息
-                    if 'result' in data:
-                        continue
-                    
-                    # 處理心跳消息
-                    if 'ping' in data:
-                        await self.websocket.send(json.dumps({"pong": data['ping']}))
-                        continue
-                    
-                    # 處理數據消息
-                    stream = data.get('stream')
-                    if stream and stream in self.subscriptions:
-                        for callback in self.subscriptions[stream]:
-                            try:
-                                await callback(data['data'])
-                            except Exception as e:
-                                logger.error(f"Error in callback for stream {stream}: {e}")
-                                self.health_metrics['errors_count'] += 1
+                    await self.process_frame(message)
                     
                 except websockets.ConnectionClosed:
                     logger.warning("WebSocket connection closed, attempting to reconnect...")
@@ -119,6 +193,12 @@ class BinanceWebSocket:
         """重新連接並重新訂閱"""
         try:
             self.health_metrics['reconnect_count'] += 1
+            if self.websocket:
+                try:
+                    await self.websocket.close()
+                except Exception:
+                    pass
+                self.websocket = None
             await self.connect()
             
             # 重新訂閱所有活動的數據流
@@ -138,17 +218,12 @@ class BinanceWebSocket:
             if isinstance(streams, str):
                 streams = [streams]
                 
-            unsubscribe_message = {
-                "method": "UNSUBSCRIBE",
-                "params": streams,
-                "id": len(self.subscriptions) + 1
-            }
-            
-            await self.websocket.send(json.dumps(unsubscribe_message))
+            await self._send_control_message("UNSUBSCRIBE", streams)
             
             # 移除訂閱回調
             for stream in streams:
                 self.subscriptions.pop(stream, None)
+            self._rebuild_dispatch_table()
                 
         except Exception as e:
             logger.error(f"Error unsubscribing from streams: {e}")
@@ -158,6 +233,19 @@ class BinanceWebSocket:
     async def close(self):
         """關閉 WebSocket 連接"""
         self.running = False
+        if self.consumer_task:
+            # 讓消費者處理完當前與剩餘的消息，逾時才取消
+            consumer_task, self.consumer_task = self.consumer_task, None
+            await self.ingest_queue.close()
+            try:
+                await asyncio.wait_for(consumer_task, timeout=settings.INGEST_QUEUE_DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(
+                    f"Ingestion queue on {self.name} not drained within "
+                    f"{settings.INGEST_QUEUE_DRAIN_TIMEOUT}s, {len(self.ingest_queue)} messages discarded"
+                )
+            except Exception as e:
+                logger.error(f"Error draining ingestion queue: {e}")
         if self.websocket:
             try:
                 await self.websocket.close()
@@ -166,6 +254,7 @@ class BinanceWebSocket:
             finally:
                 self.websocket = None
                 self.subscriptions.clear()
+                self.dispatch_table = {}
 
     def get_subscription_status(self) -> Dict:
         """獲取訂閱狀態"""
@@ -191,10 +280,17 @@ class BinanceWebSocket:
             'connection_status': {
                 'connected': self.websocket is not None and not self.websocket.closed,
                 'last_message_age': str(current_time - (self.health_metrics['last_message_time'] or current_time)),
+                'last_message_age_seconds': self._calculate_last_message_age(),
                 'reconnect_count': self.health_metrics['reconnect_count']
-            }
+            },
+            'ingest_queue': self.ingest_queue.get_metrics() if self.ingest_queue is not None else {}
         }
     
+    def _calculate_last_message_age(self) -> float:
+        """計算距離最後一條消息的秒數"""
+        last_message_time = self.health_metrics['last_message_time'] or self.health_metrics['start_time']
+        return (datetime.now() - last_message_time).total_seconds()
+    
     def _calculate_message_rate(self) -> float:
         """計算消息接收率"""
         uptime = (datetime.now() - self.health_metrics['start_time']).total_seconds()
@@ -0,0 +1,261 @@
+# backend/app/data_collectors/binance/write_buffer.py
+
+import asyncio
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Any
+from sqlalchemy import insert, Table
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import logger
+
+
+class WriteBehindBuffer:
+    """單表異步寫入緩衝區
+
+    WebSocket 回調只把資料列放進記憶體，由背景任務在達到批次大小
+    或超過刷新間隔時，以一次多列 INSERT 寫入資料庫。同一表的資料列
+    欄位可能不同（如成交與行情），寫入時按欄位組合分組。連續寫入失敗
+    的批次移入死信文件，不會無限期地阻塞緩衝區。
+    """
+
+    def __init__(
+        self,
+        table: Table,
+        session_factory: Callable[[], Session],
+        max_batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_pending_rows: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        dead_letter_directory: Optional[str] = None
+    ):
+        self.table = table
+        self.session_factory = session_factory
+        self.max_batch_size = max_batch_size or settings.WRITE_BUFFER_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.WRITE_BUFFER_FLUSH_INTERVAL
+        self.max_pending_rows = max_pending_rows or settings.WRITE_BUFFER_MAX_PENDING_ROWS
+        self.max_retries = max_retries or settings.WRITE_BUFFER_MAX_RETRIES
+        self.dead_letter_directory = (
+            settings.WRITE_BUFFER_DEAD_LETTER_DIRECTORY if dead_letter_directory is None else dead_letter_directory
+        )
+        self.consecutive_failures = 0
+
+        self.pending: List[Dict[str, Any]] = []
+        self.running = False
+        self._flush_event = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+
+        self.metrics = {
+            'rows_enqueued': 0,
+            'rows_flushed': 0,
+            'rows_dropped': 0,
+            'rows_dead_lettered': 0,
+            'flush_count': 0,
+            'flush_errors': 0,
+            'last_flush_latency': 0.0,
+            'max_flush_latency': 0.0,
+            'total_flush_latency': 0.0,
+            'last_flush_time': None
+        }
+
+    def add(self, row: Dict[str, Any]) -> bool:
+        """加入一筆待寫入資料，緩衝區已滿時丟棄並計數"""
+        if len(self.pending) >= self.max_pending_rows:
+            self.metrics['rows_dropped'] += 1
+            return False
+
+        self.pending.append(row)
+        self.metrics['rows_enqueued'] += 1
+
+        # 達到批次大小時立即喚醒刷新任務
+        if len(self.pending) >= self.max_batch_size:
+            self._flush_event.set()
+        return True
+
+    async def start(self):
+        """啟動背景刷新任務"""
+        if self._flush_task and not self._flush_task.done():
+            return
+        self.running = True
+        self._flush_task = asyncio.create_task(self._run_flush_loop())
+
+    async def _run_flush_loop(self):
+        """依批次大小或時間期限刷新"""
+        while self.running:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error in write buffer flush loop for {self.table.name}: {e}")
+
+    async def flush(self) -> int:
+        """將目前緩衝的資料寫入資料庫"""
+        async with self._flush_lock:
+            flushed = 0
+            while self.pending:
+                batch = self.pending[:self.max_batch_size]
+                del self.pending[:self.max_batch_size]
+
+                start_time = time.perf_counter()
+                try:
+                    await asyncio.to_thread(self._write_batch, batch)
+                except Exception as e:
+                    self.metrics['flush_errors'] += 1
+                    self.consecutive_failures += 1
+                    logger.error(
+                        f"Error flushing {len(batch)} rows to {self.table.name} "
+                        f"(attempt {self.consecutive_failures}/{self.max_retries}): {e}"
+                    )
+                    if self.consecutive_failures >= self.max_retries:
+                        # 反覆失敗的批次不再放回，避免阻塞後續資料
+                        self._dead_letter(batch, e)
+                        self.consecutive_failures = 0
+                    else:
+                        self._requeue(batch)
+                    break
+
+                self.consecutive_failures = 0
+                latency = time.perf_counter() - start_time
+                self._record_flush(len(batch), latency)
+                flushed += len(batch)
+
+            return flushed
+
+    def _write_batch(self, batch: List[Dict[str, Any]]):
+        """每種欄位組合一次 executemany（SQLAlchemy 會合併為多列 VALUES），同一事務提交
+
+        executemany 以第一列的欄位編譯語句，欄位不同的資料列必須分開執行，
+        否則後續資料列多出的欄位會被忽略，缺少的欄位則會報錯。
+        """
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for row in batch:
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+
+        db = self.session_factory()
+        try:
+            for rows in groups.values():
+                db.execute(insert(self.table), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _requeue(self, batch: List[Dict[str, Any]]):
+        """寫入失敗時放回緩衝區前端，超出容量的部分計為丟棄"""
+        capacity = max(self.max_pending_rows - len(self.pending), 0)
+        kept = batch[:capacity]
+        self.pending[:0] = kept
+        self.metrics['rows_dropped'] += len(batch) - len(kept)
+
+    def _dead_letter(self, batch: List[Dict[str, Any]], error: Exception):
+        """將無法寫入的批次追加到死信 JSONL 文件，未設定目錄時丟棄"""
+        self.metrics['rows_dead_lettered'] += len(batch)
+        if not self.dead_letter_directory:
+            logger.error(f"Dropped {len(batch)} rows for {self.table.name} after {self.max_retries} failed attempts")
+            return
+
+        path = Path(self.dead_letter_directory) / f"{self.table.name}-{datetime.now():%Y%m%d}.jsonl"
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with path.open('a', encoding='utf-8') as f:
+                for row in batch:
+                    f.write(json.dumps({'error': str(error), 'row': row}, default=str) + '\n')
+            logger.error(f"Moved {len(batch)} rows for {self.table.name} to dead letter file {path}")
+        except Exception as e:
+            logger.error(f"Error writing dead letter file {path}, dropped {len(batch)} rows: {e}")
+
+    def _record_flush(self, row_count: int, latency: float):
+        """更新刷新統計"""
+        self.metrics['rows_flushed'] += row_count
+        self.metrics['flush_count'] += 1
+        self.metrics['last_flush_latency'] = latency
+        self.metrics['max_flush_latency'] = max(self.metrics['max_flush_latency'], latency)
+        self.metrics['total_flush_latency'] += latency
+        self.metrics['last_flush_time'] = time.time()
+
+    async def close(self):
+        """停止背景任務並刷新剩餘資料"""
+        self.running = False
+        self._flush_event.set()
+        if self._flush_task:
+            try:
+                await self._flush_task
+            except Exception as e:
+                logger.error(f"Error stopping write buffer for {self.table.name}: {e}")
+            self._flush_task = None
+        await self.flush()
+
+    def get_metrics(self) -> Dict:
+        """獲取緩衝區指標"""
+        flush_count = self.metrics['flush_count']
+        return {
+            'table': self.table.name,
+            'queue_depth': len(self.pending),
+            'rows_enqueued': self.metrics['rows_enqueued'],
+            'rows_flushed': self.metrics['rows_flushed'],
+            'rows_dropped': self.metrics['rows_dropped'],
+            'rows_dead_lettered': self.metrics['rows_dead_lettered'],
+            'flush_count': flush_count,
+            'flush_errors': self.metrics['flush_errors'],
+            'last_flush_latency': self.metrics['last_flush_latency'],
+            'max_flush_latency': self.metrics['max_flush_latency'],
+            'avg_flush_latency': self.metrics['total_flush_latency'] / max(flush_count, 1),
+            'last_flush_time': self.metrics['last_flush_time']
+        }
+
+
+class WriteBufferManager:
+    """管理每張資料表各自的寫入緩衝區"""
+
+    def __init__(self, session_factory: Callable[[], Session]):
+        self.session_factory = session_factory
+        self.buffers: Dict[str, WriteBehindBuffer] = {}
+
+    def get_buffer(self, model) -> WriteBehindBuffer:
+        """獲取（必要時建立）模型對應的緩衝區"""
+        table = model.__table__
+        buffer = self.buffers.get(table.name)
+        if buffer is None:
+            buffer = WriteBehindBuffer(table, self.session_factory)
+            self.buffers[table.name] = buffer
+        return buffer
+
+    def add(self, model, row: Dict[str, Any]) -> bool:
+        """將資料列加入對應資料表的緩衝區"""
+        return self.get_buffer(model).add(row)
+
+    async def start(self, *models):
+        """為指定模型建立並啟動緩衝區"""
+        for model in models:
+            await self.get_buffer(model).start()
+
+    async def flush(self) -> int:
+        """刷新所有緩衝區"""
+        flushed = 0
+        for buffer in list(self.buffers.values()):
+            flushed += await buffer.flush()
+        return flushed
+
+    async def close(self):
+        """停止所有緩衝區並寫入剩餘資料"""
+        for buffer in list(self.buffers.values()):
+            await buffer.close()
+        logger.info("Write buffers flushed and closed")
+
+    def get_metrics(self) -> Dict[str, Dict]:
+        """獲取所有緩衝區指標"""
+        return {
+            name: buffer.get_metrics()
+            for name, buffer in self.buffers.items()
+        }
@@ -116,6 +116,7 @@ def health_check() -> Dict:
 from app.core.shutdown import graceful_shutdown
 from app.core.database import SessionLocal, engine
 from app.models.market import init_models  # 導入模型初始化函數
+from app.services.symbol_registry import symbol_registry
 
 async def init_database():
     """初始化數據庫"""
@@ -127,6 +128,16 @@ async def init_database():
         logger.error(f"Error initializing database: {e}")
         raise
 
+async def load_symbol_registry():
+    """載入交易對註冊表"""
+    db = SessionLocal()
+    try:
+        symbol_registry.load(db)
+    except Exception as e:
+        logger.error(f"Error loading symbol registry: {e}")
+    finally:
+        db.close()
+
 async def cleanup_database():
     """清理數據庫連接"""
     try:
@@ -157,6 +168,9 @@ async def startup_event():
         # 初始化數據庫
         await init_database()
         
+        # 載入交易對註冊表
+        await load_symbol_registry()
+        
         # 註冊清理處理器
         graceful_shutdown.add_shutdown_handler(cleanup_database)
         graceful_shutdown.add_shutdown_handler(cleanup_monitors)
@@ -2,7 +2,7 @@
 
 from datetime import datetime
 from typing import List, Optional
-from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, JSON, Boolean, Index
+from sqlalchemy import Column, Integer, BigInteger, Float, String, Text, DateTime, ForeignKey, JSON, Boolean, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.models.market import Base
@@ -11,9 +11,10 @@ class HistoricalMetrics(Base):
     """歷史技術指標數據表"""
     __tablename__ = 'historical_metrics'
     
-    id = Column(Integer, primary_key=True)
+    # 按 timestamp 範圍分區，主鍵須包含分區鍵
+    id = Column(Integer, primary_key=True, autoincrement=True)
     trading_pair_id = Column(Integer, ForeignKey('trading_pairs.id'), nullable=False)
-    timestamp = Column(DateTime(timezone=True), nullable=False)
+    timestamp = Column(DateTime(timezone=True), primary_key=True, nullable=False)
     timeframe = Column(String(10), nullable=False)  # 1m, 5m, 1h, 1d 等
     
     # 價格指標
@@ -56,10 +57,13 @@ class HistoricalMetrics(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
-    # 索引
+    # 索引；同一交易對、週期與時間只有一筆，供 upsert 使用
     __table_args__ = (
         Index('idx_historical_metrics_pair_time', 
               trading_pair_id, timestamp, timeframe),
+        UniqueConstraint('trading_pair_id', 'timeframe', 'timestamp',
+                         name='uq_historical_metrics_pair_timeframe_time'),
+        {'postgresql_partition_by': 'RANGE (timestamp)'}
     )
 
 class MarketAnalysis(Base):
@@ -99,4 +103,29 @@ class MarketAnalysis(Base):
     __table_args__ = (
         Index('idx_market_analysis_pair_time',
               trading_pair_id, timestamp, timeframe),
-    )
\ No newline at end of file
+    )
+
+class BackfillJob(Base):
+    """歷史K線回填任務，每提交一頁即更新檢查點"""
+    __tablename__ = 'backfill_jobs'
+
+    id = Column(Integer, primary_key=True)
+    symbol = Column(String(20), nullable=False)
+    timeframe = Column(String(10), nullable=False)
+
+    # 抓取範圍與缺口均為K線開盤時間（epoch 毫秒）
+    start_ms = Column(BigInteger, nullable=False)
+    end_ms = Column(BigInteger, nullable=False)
+    gaps = Column(JSON, nullable=False)  # [[start_ms, end_ms], ...]
+    cursor_ms = Column(BigInteger)  # 下一根待保存K線的開盤時間
+
+    status = Column(String(20), nullable=False, default='pending')  # pending/running/completed/failed
+    pages_done = Column(Integer, nullable=False, default=0)
+    bars_saved = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        Index('idx_backfill_jobs_status', status, symbol, timeframe),
+    )
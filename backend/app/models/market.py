@@ -2,10 +2,15 @@ from datetime import datetime
 from sqlalchemy import (
     Column, Integer, String, Float, DateTime, ForeignKey, 
     Enum, JSON, Boolean, LargeBinary,BigInteger,  # 添加 BigInteger 導入
+    UniqueConstraint, Index,
 )
 from sqlalchemy.orm import relationship, validates  # 添加 validates 導入
 from sqlalchemy.sql import func
 from sqlalchemy.ext.declarative import declarative_base
+from typing import Dict, List, Tuple
+import numpy as np
+
+from app.utils import orderbook_codec
 
 Base = declarative_base()
 
@@ -42,16 +47,22 @@ class TradingPair(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # 同一交易所的交易對唯一，供批次 upsert 使用
+    __table_args__ = (
+        UniqueConstraint('exchange_id', 'symbol', name='uq_trading_pairs_exchange_symbol'),
+    )
+    
     # 關聯會在所有類定義完後設置
 
 class MarketData(Base):
     """市場數據表"""
     __tablename__ = 'market_data'
     
-    id = Column(Integer, primary_key=True)
+    # 按 timestamp 範圍分區，主鍵須包含分區鍵
+    id = Column(Integer, primary_key=True, autoincrement=True)
     exchange_id = Column(Integer, ForeignKey('exchanges.id'))
     trading_pair_id = Column(Integer, ForeignKey('trading_pairs.id'))
-    timestamp = Column(DateTime, nullable=False, index=True)
+    timestamp = Column(DateTime, primary_key=True, nullable=False, index=True)
     
     # 新增欄位
     price = Column(Float, nullable=False, index=True)  # 新增索引提高查詢性能
@@ -79,6 +90,8 @@ class MarketData(Base):
     exchange = relationship("Exchange", back_populates="market_data")
     trading_pair = relationship("TradingPair", back_populates="market_data")
 
+    __table_args__ = {'postgresql_partition_by': 'RANGE (timestamp)'}
+
     @validates('side')
     def validate_side(self, key, side):
         """驗證交易方向"""
@@ -95,18 +108,38 @@ class MarketData(Base):
             return 0.0
         return price
 
-class OrderBook(Base):
+class OrderBookLevelsMixin:
+    """檔位存於 bids/asks (JSON) 或 book_data (orderbook_codec 編碼)，讀取時統一轉換"""
+
+    def get_levels(self) -> Dict[str, List[List[str]]]:
+        """{'bids': [[price, quantity], ...], 'asks': [...]}，與 JSON 欄位格式相同"""
+        if self.book_data:
+            return orderbook_codec.decode_levels(self.book_data)
+        return {'bids': self.bids or [], 'asks': self.asks or []}
+
+    def get_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(bids, asks)，各為 shape (n, 2) 的 float64 陣列"""
+        if self.book_data:
+            return orderbook_codec.decode(self.book_data)
+        return (
+            np.asarray(self.bids or [], dtype=np.float64).reshape(-1, 2),
+            np.asarray(self.asks or [], dtype=np.float64).reshape(-1, 2)
+        )
+
+class OrderBook(OrderBookLevelsMixin, Base):
     """訂單簿數據表"""
     __tablename__ = 'order_books'
     
-    id = Column(Integer, primary_key=True)
+    # 按 timestamp 範圍分區，主鍵須包含分區鍵
+    id = Column(Integer, primary_key=True, autoincrement=True)
     exchange_id = Column(Integer, ForeignKey('exchanges.id'))
     trading_pair_id = Column(Integer, ForeignKey('trading_pairs.id'))
-    timestamp = Column(DateTime, nullable=False, index=True)
+    timestamp = Column(DateTime, primary_key=True, nullable=False, index=True)
     
-    # 訂單簿數據以JSON格式存儲
-    bids = Column(JSON)  # [[price, quantity], ...]
-    asks = Column(JSON)  # [[price, quantity], ...]
+    # 訂單簿數據以JSON格式存儲，ORDER_BOOK_STORAGE=binary 時改存於 book_data
+    bids = Column(JSON(none_as_null=True))  # [[price, quantity], ...]
+    asks = Column(JSON(none_as_null=True))  # [[price, quantity], ...]
+    book_data = Column(LargeBinary)  # orderbook_codec 編碼的檔位
     
     # 將 last_update_id 改為 BigInteger
     last_update_id = Column(BigInteger)  # 最後更新ID
@@ -116,7 +149,9 @@ class OrderBook(Base):
     exchange = relationship("Exchange")
     trading_pair = relationship("TradingPair")
 
-class OrderBookDepth(Base):
+    __table_args__ = {'postgresql_partition_by': 'RANGE (timestamp)'}
+
+class OrderBookDepth(OrderBookLevelsMixin, Base):
     """完整訂單簿深度數據"""
     __tablename__ = 'order_book_depths'
     
@@ -125,8 +160,9 @@ class OrderBookDepth(Base):
     trading_pair_id = Column(Integer, ForeignKey('trading_pairs.id'))
     timestamp = Column(DateTime, nullable=False, index=True)
     
-    bids = Column(JSON)
-    asks = Column(JSON)
+    bids = Column(JSON(none_as_null=True))
+    asks = Column(JSON(none_as_null=True))
+    book_data = Column(LargeBinary)  # orderbook_codec 編碼的檔位
     
     bid_volume = Column(Float)
     ask_volume = Column(Float)
@@ -175,6 +211,47 @@ class LargeTradeRecord(Base):
     exchange = relationship("Exchange")
     trading_pair = relationship("TradingPair", back_populates="large_trades")
 
+class TradeBar(Base):
+    """由逐筆成交聚合的K線（時間、筆數、成交量、成交額K線）"""
+    __tablename__ = 'trade_bars'
+    
+    id = Column(BigInteger, primary_key=True)
+    exchange_id = Column(Integer, ForeignKey('exchanges.id'), nullable=False)
+    trading_pair_id = Column(Integer, ForeignKey('trading_pairs.id'), nullable=False)
+    
+    bar_type = Column(String(10), nullable=False)  # time/tick/volume/dollar
+    bar_size = Column(String(20), nullable=False)  # '1s', '1m', '1000' 等
+    open_time = Column(DateTime(timezone=True), nullable=False, index=True)
+    close_time = Column(DateTime(timezone=True), nullable=False)
+    
+    open_price = Column(Float, nullable=False)
+    high_price = Column(Float, nullable=False)
+    low_price = Column(Float, nullable=False)
+    close_price = Column(Float, nullable=False)
+    volume = Column(Float, nullable=False)
+    quote_volume = Column(Float, nullable=False)
+    number_of_trades = Column(Integer, nullable=False)
+    taker_buy_base_volume = Column(Float)
+    taker_buy_quote_volume = Column(Float)
+    vwap = Column(Float)
+    
+    first_trade_id = Column(BigInteger, nullable=False)
+    last_trade_id = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # 關聯
+    exchange = relationship("Exchange")
+    trading_pair = relationship("TradingPair")
+    
+    # 每根K線由第一筆成交唯一確定，重放時不會重複寫入
+    __table_args__ = (
+        UniqueConstraint(
+            'trading_pair_id', 'bar_type', 'bar_size', 'first_trade_id',
+            name='uq_trade_bars_pair_spec_first_trade'
+        ),
+        Index('ix_trade_bars_pair_spec_time', 'trading_pair_id', 'bar_type', 'bar_size', 'open_time'),
+    )
+
 # 在所有類定義完後設置 TradingPair 的關聯
 TradingPair.exchange = relationship("Exchange", back_populates="trading_pairs")
 TradingPair.market_data = relationship("MarketData", back_populates="trading_pair")
@@ -224,6 +301,11 @@ class KlineData(Base):
     exchange = relationship("Exchange", back_populates="kline_data")
     trading_pair = relationship("TradingPair", back_populates="kline_data")
     
+    # 同一交易對、週期與開盤時間只有一根K線，供 upsert 使用
+    __table_args__ = (
+        UniqueConstraint('trading_pair_id', 'timestamp', 'interval', name='unique_kline_data'),
+    )
+    
     # 數據驗證方法
     @validates('interval')
     def validate_interval(self, key, interval):
@@ -295,4 +377,16 @@ configure_mappers()
 
 def init_models(engine):
     """初始化所有模型"""
-    Base.metadata.create_all(engine)
\ No newline at end of file
+    Base.metadata.create_all(engine)
+
+    # create_all 建立的分區表沒有任何分區，寫入前須先建立；
+    # 未啟用分區維護時只建立預設分區，所有數據寫入預設分區
+    from app.core.config import settings
+    if engine.dialect.name == 'postgresql':
+        from sqlalchemy.orm import sessionmaker
+        from app.services.partition_manager import PartitionManager
+        manager = PartitionManager(sessionmaker(bind=engine))
+        if settings.PARTITIONING_ENABLED:
+            manager.ensure_all()
+        else:
+            manager.ensure_defaults()
\ No newline at end of file
@@ -62,13 +62,14 @@ class DepthMonitor:
             latest_depth = await self._get_latest_depth(symbol)
             
             # 計算買賣比例
-            bid_volume = sum(float(bid[1]) for bid in latest_depth.bids)
-            ask_volume = sum(float(ask[1]) for ask in latest_depth.asks)
+            bids, asks = latest_depth.get_arrays()
+            bid_volume = float(bids[:, 1].sum())
+            ask_volume = float(asks[:, 1].sum())
             bid_ask_ratio = bid_volume / ask_volume if ask_volume > 0 else 0
             
             # 計算深度覆蓋率
             expected_levels = settings.DEPTH_LEVELS
-            actual_levels = len(latest_depth.bids) + len(latest_depth.asks)
+            actual_levels = len(bids) + len(asks)
             depth_coverage = actual_levels / (2 * expected_levels)
             
             # 獲取WebSocket指標
@@ -2,118 +2,225 @@
 
 import zlib
 import json
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
 import asyncio
-from sqlalchemy import select, func
-from sqlalchemy.orm import Session
+from sqlalchemy import Text, cast, delete, or_, select, text
+from sqlalchemy.orm import Session, sessionmaker
 
 from app.core.logging import logger
-from app.models.market import OrderBookDepth
+from app.models.market import OrderBookDepth, TradingPair
 from app.core.config import settings
+from app.services.partition_manager import PartitionManager
+from app.utils import orderbook_codec
+
+# (id, bids JSON 文本, asks JSON 文本, book_data)
+DepthRow = Tuple[int, Optional[str], Optional[str], Optional[bytes]]
+
+ARCHIVE_SQL = """
+    UPDATE order_book_depths AS d
+    SET compressed_data = v.data, is_archived = TRUE, bids = NULL, asks = NULL, book_data = NULL
+    FROM unnest(CAST(:ids AS integer[]), CAST(:payloads AS bytea[])) AS v(id, data)
+    WHERE d.id = v.id
+"""
+
+
+def compress_depth_rows(rows: Sequence[DepthRow], level: int) -> List[Tuple[int, bytes]]:
+    """在工作進程中解析、編碼並壓縮一批深度數據
+
+    檔位以 orderbook_codec 編碼後壓縮；無法編碼的資料列保留為壓縮的 JSON。
+    """
+    compressed = []
+    for row_id, bids, asks, book_data in rows:
+        if book_data is None:
+            bids = json.loads(bids) if bids else None
+            asks = json.loads(asks) if asks else None
+            try:
+                book_data = orderbook_codec.encode(bids, asks)
+            except ValueError:
+                book_data = json.dumps({'bids': bids, 'asks': asks}).encode()
+        compressed.append((row_id, zlib.compress(book_data, level)))
+    return compressed
+
+
+def decompress_levels(compressed_data: bytes) -> Dict:
+    """解壓歸檔的檔位，兼容舊版壓縮的 JSON"""
+    payload = zlib.decompress(compressed_data)
+    if orderbook_codec.is_encoded(payload):
+        return orderbook_codec.decode_levels(payload)
+    return json.loads(payload.decode())
+
 
 class DepthArchiver:
-    def __init__(self, db: Session):
+    """深度數據的壓縮歸檔與清理
+
+    以伺服器端游標分批讀取待歸檔的資料列，交由進程池壓縮，每批以一條
+    UPDATE ... FROM unnest() 寫回，記憶體只保留有限的幾批。清理時整個
+    分區過期則直接刪除分區，其餘以一條範圍 DELETE 完成。
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        session_factory: Optional[Callable[[], Session]] = None,
+        batch_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        compression_level: Optional[int] = None
+    ):
         self.db = db
-        self.compression_level = 6  # zlib壓縮級別 (0-9)
-    
+        # 讀取游標與寫入各用一個連接，游標不受每批提交影響
+        self.session_factory = session_factory or sessionmaker(bind=db.get_bind())
+        self.batch_size = batch_size or settings.DEPTH_ARCHIVE_BATCH_SIZE
+        self.workers = workers or settings.DEPTH_ARCHIVE_WORKERS
+        self.compression_level = (
+            settings.DEPTH_ARCHIVE_COMPRESSION_LEVEL if compression_level is None else compression_level
+        )
+        self.metrics = {
+            'rows_archived': 0,
+            'bytes_archived': 0,
+            'rows_deleted': 0,
+            'partitions_dropped': 0,
+            'last_archive_rate': 0.0,
+            'last_run': None
+        }
+
     def compress_depth_data(self, data: Dict) -> bytes:
         """壓縮深度數據"""
-        json_str = json.dumps(data)
-        return zlib.compress(json_str.encode(), self.compression_level)
-    
+        return compress_depth_rows(
+            [(0, json.dumps(data.get('bids')), json.dumps(data.get('asks')), None)],
+            self.compression_level
+        )[0][1]
+
     def decompress_depth_data(self, compressed_data: bytes) -> Dict:
         """解壓深度數據"""
-        json_str = zlib.decompress(compressed_data).decode()
-        return json.loads(json_str)
-    
-    async def archive_old_data(self, days_old: int = 7):
+        return decompress_levels(compressed_data)
+
+    async def archive_old_data(self, days_old: Optional[int] = None) -> int:
         """歸檔舊的深度數據"""
+        days_old = days_old or settings.DEPTH_ARCHIVE_AFTER_DAYS
+        return await asyncio.to_thread(self.archive, datetime.now() - timedelta(days=days_old))
+
+    def archive(self, cutoff: datetime) -> int:
+        """壓縮 cutoff 之前尚未歸檔的資料列，返回歸檔列數"""
+        started = time.monotonic()
+        reader = self.session_factory()
+        writer = self.session_factory()
+        executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        pending: Deque[Future] = deque()
+        archived = 0
+
         try:
-            cutoff_date = datetime.now() - timedelta(days=days_old)
-            
-            # 查找需要歸檔的數據
-            query = select(OrderBookDepth).filter(
-                OrderBookDepth.timestamp < cutoff_date,
-                OrderBookDepth.is_archived == False  # 假設添加了is_archived欄位
+            query = select(
+                OrderBookDepth.id,
+                # JSON 以文本取出，由工作進程解析
+                cast(OrderBookDepth.bids, Text),
+                cast(OrderBookDepth.asks, Text),
+                OrderBookDepth.book_data
+            ).where(
+                OrderBookDepth.timestamp < cutoff,
+                OrderBookDepth.is_archived.isnot(True),
+                or_(
+                    OrderBookDepth.bids.isnot(None),
+                    OrderBookDepth.asks.isnot(None),
+                    OrderBookDepth.book_data.isnot(None)
+                )
             )
-            
-            results = await self.db.execute(query)
-            depth_records = results.scalars().all()
-            
-            archived_count = 0
-            for record in depth_records:
-                # 壓縮數據
-                depth_data = {
-                    'bids': record.bids,
-                    'asks': record.asks,
-                    'timestamp': record.timestamp.isoformat(),
-                    'last_update_id': record.last_update_id
-                }
-                
-                compressed_data = self.compress_depth_data(depth_data)
-                
-                # 更新記錄
-                record.compressed_data = compressed_data
-                record.is_archived = True
-                record.bids = None  # 清除原始數據
-                record.asks = None
-                
-                archived_count += 1
-                
-                # 每100條記錄提交一次
-                if archived_count % 100 == 0:
-                    await self.db.commit()
-            
-            # 最後提交
-            if archived_count % 100 != 0:
-                await self.db.commit()
-            
-            logger.info(f"Archived {archived_count} depth records")
-            
-            return archived_count
-            
+            result = reader.execute(query.execution_options(yield_per=self.batch_size))
+
+            for batch in result.partitions():
+                rows = [tuple(row) for row in batch]
+                if executor is None:
+                    archived += self._write_batch(writer, compress_depth_rows(rows, self.compression_level))
+                    continue
+
+                pending.append(executor.submit(compress_depth_rows, rows, self.compression_level))
+                # 最多保留兩倍進程數的批次，讀取不會超前寫入太多
+                while len(pending) >= self.workers * 2:
+                    archived += self._write_batch(writer, pending.popleft().result())
+
+            while pending:
+                archived += self._write_batch(writer, pending.popleft().result())
+
         except Exception as e:
             logger.error(f"Error archiving depth data: {e}")
-            await self.db.rollback()
+            writer.rollback()
             raise
-    
-    async def cleanup_archived_data(self, days_to_keep: int = 90):
+        finally:
+            for future in pending:
+                future.cancel()
+            if executor is not None:
+                executor.shutdown(wait=True)
+            reader.close()
+            writer.close()
+
+        elapsed = time.monotonic() - started
+        self.metrics['last_archive_rate'] = archived / elapsed if elapsed > 0 else 0.0
+        self.metrics['last_run'] = datetime.now().isoformat()
+        logger.info(
+            f"Archived {archived} depth records in {elapsed:.1f}s "
+            f"({self.metrics['last_archive_rate']:,.0f} rows/s)"
+        )
+        return archived
+
+    def _write_batch(self, db: Session, compressed: List[Tuple[int, bytes]]) -> int:
+        """一條語句寫回一批壓縮結果並提交"""
+        if not compressed:
+            return 0
+        ids, payloads = zip(*compressed)
+        db.execute(text(ARCHIVE_SQL), {'ids': list(ids), 'payloads': list(payloads)})
+        db.commit()
+
+        self.metrics['rows_archived'] += len(ids)
+        self.metrics['bytes_archived'] += sum(len(payload) for payload in payloads)
+        return len(ids)
+
+    async def cleanup_archived_data(self, days_to_keep: Optional[int] = None) -> int:
         """清理已歸檔的舊數據"""
+        days_to_keep = days_to_keep or settings.DEPTH_ARCHIVE_RETENTION_DAYS
+        return await asyncio.to_thread(self.cleanup, datetime.now() - timedelta(days=days_to_keep))
+
+    def cleanup(self, cutoff: datetime) -> int:
+        """刪除 cutoff 之前已歸檔的資料列，返回刪除列數（不含整個刪除的分區）
+
+        表已按 timestamp 分區時，完全早於 cutoff 的分區直接刪除，
+        此時分區內尚未歸檔的資料列也一併刪除。
+        """
+        table = OrderBookDepth.__tablename__
+        db = self.session_factory()
         try:
-            cutoff_date = datetime.now() - timedelta(days=days_to_keep)
-            
-            # 刪除超過保留期限的歸檔數據
-            query = select(OrderBookDepth).filter(
-                OrderBookDepth.timestamp < cutoff_date,
-                OrderBookDepth.is_archived == True
+            dropped = []
+            if db.get_bind().dialect.name == 'postgresql' and PartitionManager.is_partitioned(db, table):
+                manager = PartitionManager(
+                    self.session_factory, tables={table: 'day'}, retention_days={}, drop_expired=True
+                )
+                dropped = manager.expire_partitions(db, table, cutoff)
+
+            deleted = db.execute(
+                delete(OrderBookDepth.__table__).where(
+                    OrderBookDepth.timestamp < cutoff,
+                    OrderBookDepth.is_archived.is_(True)
+                )
+            ).rowcount
+            db.commit()
+
+            self.metrics['rows_deleted'] += deleted
+            self.metrics['partitions_dropped'] += len(dropped)
+            logger.info(
+                f"Cleaned up {deleted} archived depth records"
+                + (f" and dropped partitions {dropped}" if dropped else "")
             )
-            
-            results = await self.db.execute(query)
-            old_records = results.scalars().all()
-            
-            deleted_count = 0
-            for record in old_records:
-                self.db.delete(record)
-                deleted_count += 1
-                
-                # 每100條記錄提交一次
-                if deleted_count % 100 == 0:
-                    await self.db.commit()
-            
-            # 最後提交
-            if deleted_count % 100 != 0:
-                await self.db.commit()
-            
-            logger.info(f"Cleaned up {deleted_count} archived depth records")
-            
-            return deleted_count
-            
+            return deleted
+
         except Exception as e:
             logger.error(f"Error cleaning up archived data: {e}")
-            await self.db.rollback()
+            db.rollback()
             raise
-    
+        finally:
+            db.close()
+
     async def get_archived_data(
         self,
         symbol: str,
@@ -121,41 +228,56 @@ class DepthArchiver:
         end_time: datetime
     ) -> List[Dict]:
         """獲取歸檔數據"""
+        return await asyncio.to_thread(self._get_archived_data, symbol, start_time, end_time)
+
+    def _get_archived_data(self, symbol: str, start_time: datetime, end_time: datetime) -> List[Dict]:
         try:
-            query = select(OrderBookDepth).filter(
-                OrderBookDepth.trading_pair.has(symbol=symbol),
-                OrderBookDepth.timestamp.between(start_time, end_time),
-                OrderBookDepth.is_archived == True
+            query = (
+                select(
+                    OrderBookDepth.timestamp,
+                    OrderBookDepth.last_update_id,
+                    OrderBookDepth.compressed_data
+                )
+                .join(TradingPair, TradingPair.id == OrderBookDepth.trading_pair_id)
+                .where(
+                    TradingPair.symbol == symbol,
+                    OrderBookDepth.timestamp.between(start_time, end_time),
+                    OrderBookDepth.is_archived.is_(True),
+                    OrderBookDepth.compressed_data.isnot(None)
+                )
+                .order_by(OrderBookDepth.timestamp)
             )
-            
-            results = await self.db.execute(query)
-            archived_records = results.scalars().all()
-            
+
             decompressed_data = []
-            for record in archived_records:
-                if record.compressed_data:
-                    depth_data = self.decompress_depth_data(record.compressed_data)
-                    decompressed_data.append(depth_data)
-            
+            for row in self.db.execute(query):
+                levels = decompress_levels(row.compressed_data)
+                decompressed_data.append({
+                    'bids': levels.get('bids'),
+                    'asks': levels.get('asks'),
+                    'timestamp': row.timestamp.isoformat(),
+                    'last_update_id': row.last_update_id
+                })
             return decompressed_data
-            
+
         except Exception as e:
             logger.error(f"Error retrieving archived data: {e}")
             raise
-    
+
+    def get_metrics(self) -> Dict:
+        """獲取歸檔指標"""
+        return dict(self.metrics)
+
     async def run_maintenance(self):
         """運行維護任務"""
         while True:
             try:
-                # 歸檔7天前的數據
-                await self.archive_old_data(days_old=7)
-                
-                # 清理90天前的歸檔數據
-                await self.cleanup_archived_data(days_to_keep=90)
-                
+                # 歸檔舊數據並清理超過保留期限的歸檔數據
+                await self.archive_old_data()
+                await self.cleanup_archived_data()
+
                 # 每天運行一次
                 await asyncio.sleep(86400)
-                
+
             except Exception as e:
                 logger.error(f"Error in maintenance task: {e}")
-                await asyncio.sleep(3600)  # 出錯後等待1小時後重試
\ No newline at end of file
+                await asyncio.sleep(3600)  # 出錯後等待1小時後重試
@@ -0,0 +1,447 @@
+# backend/app/services/historical/archive_importer.py
+
+import io
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from dateutil import tz
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.services.historical.backfill_planner import warmup_bars
+from app.services.historical.cold_store import mark_stale_months
+from app.utils.bulk_copy import copy_frame
+
+# https://github.com/binance/binance-public-data 的文件名，如
+# BTCUSDT-1m-2024-01.zip、BTCUSDT-aggTrades-2024-01-15.zip
+ARCHIVE_NAME = re.compile(
+    r'^(?P<symbol>[A-Z0-9]+)-(?P<kind>aggTrades|\d+[smhdwM])-(?P<period>\d{4}-\d{2}(?:-\d{2})?)\.(?:zip|csv)$'
+)
+
+KLINE_COLUMNS = [
+    'open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time',
+    'quote_volume', 'trades', 'taker_buy_base', 'taker_buy_quote', 'ignore'
+]
+AGG_TRADE_COLUMNS = [
+    'agg_trade_id', 'price', 'quantity', 'first_trade_id', 'last_trade_id',
+    'transact_time', 'is_buyer_maker', 'is_best_match'
+]
+AGG_TRADE_USECOLS = ['price', 'quantity', 'transact_time', 'is_buyer_maker']
+
+# 2025 年起現貨文件的時間戳改為微秒
+MICROSECOND_THRESHOLD = 10 ** 14
+
+ARCHIVE_SOURCE = 'binance_archive'
+
+# 與 HistoricalDataCollector._stage_metrics 寫入的欄位一致
+METRIC_COLUMNS = [
+    'volatility', 'ma7', 'ma25', 'ma99', 'rsi', 'bb_upper', 'bb_middle', 'bb_lower',
+    'bb_width', 'returns', 'log_returns', 'realized_volatility', 'price_momentum',
+    'volume_momentum'
+]
+
+
+@dataclass
+class ArchiveFile:
+    """一個 Binance 公開數據文件"""
+    path: Path
+    symbol: str
+    kind: str  # klines / aggTrades
+    interval: Optional[str]
+    period: str
+
+    @classmethod
+    def parse(cls, path: Path) -> Optional['ArchiveFile']:
+        match = ARCHIVE_NAME.match(path.name)
+        if not match:
+            return None
+        kind = match.group('kind')
+        return cls(
+            path=path,
+            symbol=match.group('symbol'),
+            kind='aggTrades' if kind == 'aggTrades' else 'klines',
+            interval=None if kind == 'aggTrades' else kind,
+            period=match.group('period')
+        )
+
+
+@dataclass
+class ImportTask:
+    """同一交易對與數據類型的文件，按時間順序在同一進程中導入"""
+    symbol: str
+    kind: str
+    interval: Optional[str]
+    exchange_id: int
+    trading_pair_id: int
+    files: List[str] = field(default_factory=list)
+    chunk_rows: int = 200000
+    metrics: bool = False
+
+    @property
+    def name(self) -> str:
+        return f"{self.symbol} {self.interval or self.kind}"
+
+
+def discover_archives(paths: Iterable[str], symbols: Optional[List[str]] = None) -> List[ArchiveFile]:
+    """展開文件與目錄，返回可識別的壓縮檔或 CSV"""
+    found = []
+    for path in map(Path, paths):
+        candidates = sorted(path.rglob('*')) if path.is_dir() else [path]
+        for candidate in candidates:
+            archive = ArchiveFile.parse(candidate)
+            if archive is None:
+                continue
+            if symbols and archive.symbol not in symbols:
+                continue
+            found.append(archive)
+    return found
+
+
+@contextmanager
+def open_archive(path: Path) -> Iterator[io.BufferedIOBase]:
+    """打開 zip 內的唯一 CSV，或直接打開 CSV"""
+    if path.suffix == '.zip':
+        with zipfile.ZipFile(path) as archive:
+            member = next(name for name in archive.namelist() if name.endswith('.csv'))
+            with archive.open(member) as f:
+                yield f
+    else:
+        with open(path, 'rb') as f:
+            yield f
+
+
+def read_chunks(
+    path: Path,
+    columns: List[str],
+    usecols: List[str],
+    chunk_rows: int
+) -> Iterator[pd.DataFrame]:
+    """分塊解析 CSV，較新的文件帶有表頭"""
+    with open_archive(path) as f:
+        has_header = not f.peek(1)[:1].isdigit()
+        yield from pd.read_csv(
+            f,
+            header=None,
+            names=columns,
+            usecols=usecols,
+            skiprows=1 if has_header else 0,
+            chunksize=chunk_rows
+        )
+
+
+def epoch_to_utc(values: pd.Series) -> pd.Series:
+    """毫秒或微秒時間戳轉為 UTC 時間"""
+    unit = 'us' if len(values) and values.iloc[0] >= MICROSECOND_THRESHOLD else 'ms'
+    return pd.to_datetime(values, unit=unit, utc=True)
+
+
+def epoch_to_local(values: pd.Series) -> pd.Series:
+    """轉為本地時間且不帶時區，與實時收集的 datetime.fromtimestamp 一致"""
+    return epoch_to_utc(values).dt.tz_convert(tz.tzlocal()).dt.tz_localize(None)
+
+
+def klines_frame(chunk: pd.DataFrame, task: ImportTask) -> pd.DataFrame:
+    """K線 CSV 轉為 kline_data 欄位"""
+    volume = chunk['volume'].astype(float)
+    quote_volume = chunk['quote_volume'].astype(float)
+    return pd.DataFrame({
+        'exchange_id': task.exchange_id,
+        'trading_pair_id': task.trading_pair_id,
+        'timestamp': epoch_to_local(chunk['open_time']),
+        'interval': task.interval,
+        'open_price': chunk['open'].astype(float),
+        'high_price': chunk['high'].astype(float),
+        'low_price': chunk['low'].astype(float),
+        'close_price': chunk['close'].astype(float),
+        'volume': volume,
+        'quote_volume': quote_volume,
+        'number_of_trades': chunk['trades'].astype(np.int64),
+        'taker_buy_base_volume': chunk['taker_buy_base'].astype(float),
+        'taker_buy_quote_volume': chunk['taker_buy_quote'].astype(float),
+        'vwap': (quote_volume / volume).where(volume > 0),
+        'source': ARCHIVE_SOURCE,
+        'is_complete': True
+    })
+
+
+def trades_frame(chunk: pd.DataFrame, task: ImportTask) -> pd.DataFrame:
+    """aggTrades CSV 轉為 market_data 成交記錄，與實時 @trade 寫入的欄位一致"""
+    price = chunk['price'].astype(float)
+    quantity = chunk['quantity'].astype(float)
+    is_buyer_maker = chunk['is_buyer_maker'].astype(str).str.lower() == 'true'
+    now = datetime.now()
+    return pd.DataFrame({
+        'exchange_id': task.exchange_id,
+        'trading_pair_id': task.trading_pair_id,
+        'timestamp': epoch_to_local(chunk['transact_time']),
+        'price': price,
+        'close_price': price,
+        'volume': quantity,
+        'quote_volume': price * quantity,
+        # 買方為掛單方時，主動成交方為賣方
+        'side': np.where(is_buyer_maker, 'sell', 'buy'),
+        'created_at': now,
+        'updated_at': now
+    })
+
+
+def metrics_frame(klines: pd.DataFrame, task: ImportTask, calculate: Callable) -> pd.DataFrame:
+    """以 kline_data 欄位計算 historical_metrics 列"""
+    df = pd.DataFrame({
+        'timestamp': klines['timestamp'],
+        'open': klines['open_price'],
+        'high': klines['high_price'],
+        'low': klines['low_price'],
+        'close': klines['close_price'],
+        'volume': klines['volume']
+    })
+    metrics = calculate(df, task.interval)
+    return pd.DataFrame({
+        'trading_pair_id': task.trading_pair_id,
+        'timestamp': metrics.index,
+        'timeframe': task.interval,
+        'open_price': metrics['open'].values,
+        'high_price': metrics['high'].values,
+        'low_price': metrics['low'].values,
+        'close_price': metrics['close'].values,
+        'volume': metrics['volume'].values,
+        **{column: metrics[column].replace([np.inf, -np.inf], np.nan).values for column in METRIC_COLUMNS},
+        'is_complete': True
+    })
+
+
+# 暫存表只包含導入的欄位；每個文件一個事務，提交時刪除
+STAGE_SQL = "CREATE TEMP TABLE {stage} ON COMMIT DROP AS SELECT {columns} FROM {table} WITH NO DATA"
+
+MERGE_SQL = {
+    # kline_data 與 historical_metrics 有唯一鍵，直接略過衝突
+    'kline_data': """
+        INSERT INTO kline_data ({columns})
+        SELECT {columns} FROM {stage}
+        ON CONFLICT (trading_pair_id, timestamp, interval) DO NOTHING
+    """,
+    'historical_metrics': """
+        INSERT INTO historical_metrics ({columns})
+        SELECT {columns} FROM {stage}
+        ON CONFLICT ON CONSTRAINT uq_historical_metrics_pair_timeframe_time DO NOTHING
+    """,
+    # aggTrades 與實時 @trade 的逐筆記錄無法對應；已有逐筆成交的分鐘整段略過
+    # （@ticker 列帶有 open_price，逐筆成交沒有）
+    'market_data': """
+        INSERT INTO market_data ({columns})
+        SELECT {columns} FROM {stage} s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM market_data m
+            WHERE m.trading_pair_id = s.trading_pair_id
+            AND m.timestamp >= date_trunc('minute', s.timestamp)
+            AND m.timestamp < date_trunc('minute', s.timestamp) + INTERVAL '1 minute'
+            AND m.open_price IS NULL
+        )
+    """
+}
+
+
+class StagedTable:
+    """以 COPY 寫入暫存表，再一次性合併到目標表並去重"""
+
+    def __init__(self, db: Session, table: str):
+        self.db = db
+        self.table = table
+        self.stage = f"stage_{table}"
+        self.columns: Optional[List[str]] = None
+        self.rows = 0
+
+    def copy(self, frame: pd.DataFrame):
+        if self.columns is None:
+            self.columns = list(frame.columns)
+            self.db.execute(text(STAGE_SQL.format(
+                stage=self.stage, columns=self._column_list(), table=self.table
+            )))
+        self.rows += copy_frame(self.db, self.stage, frame)
+
+    def merge(self) -> int:
+        """合併到目標表，返回實際新增的列數"""
+        if self.columns is None:
+            return 0
+        result = self.db.execute(text(MERGE_SQL[self.table].format(
+            columns=self._column_list(), stage=self.stage
+        )))
+        return result.rowcount
+
+    def _column_list(self) -> str:
+        return ', '.join(f'"{name}"' for name in self.columns)
+
+
+def _init_worker():
+    # fork 出的進程不可共用父進程的連接
+    from app.core.database import engine
+    engine.dispose(close=False)
+
+
+def import_task(task: ImportTask) -> Dict:
+    """在工作進程中依序導入一組文件"""
+    from app.core.database import SessionLocal
+    from app.data_collectors.binance.historical_collector import HistoricalDataCollector
+
+    stats = {'task': task.name, 'files': 0, 'rows_read': 0, 'rows_inserted': 0, 'errors': []}
+    db = SessionLocal()
+    calculate = None
+    if task.kind == 'klines' and task.metrics:
+        collector = HistoricalDataCollector(db)
+        calculate = collector._calculate_metrics
+
+    # 跨文件保留計算指標所需的前置K線
+    tail: Optional[pd.DataFrame] = None
+    try:
+        for path in task.files:
+            try:
+                read, inserted, tail = _import_file(db, task, Path(path), calculate, tail)
+                db.commit()
+                stats['files'] += 1
+                stats['rows_read'] += read
+                stats['rows_inserted'] += inserted
+            except Exception as e:
+                db.rollback()
+                tail = None
+                stats['errors'].append(f"{Path(path).name}: {e}")
+    finally:
+        db.close()
+    return stats
+
+
+def _import_file(
+    db: Session,
+    task: ImportTask,
+    path: Path,
+    calculate: Optional[Callable],
+    tail: Optional[pd.DataFrame]
+) -> Tuple[int, int, Optional[pd.DataFrame]]:
+    rows_read = 0
+    if task.kind == 'aggTrades':
+        trades = StagedTable(db, 'market_data')
+        for chunk in read_chunks(path, AGG_TRADE_COLUMNS, AGG_TRADE_USECOLS, task.chunk_rows):
+            rows_read += len(chunk)
+            trades.copy(trades_frame(chunk, task))
+        return rows_read, trades.merge(), None
+
+    klines = StagedTable(db, 'kline_data')
+    metrics = StagedTable(db, 'historical_metrics') if calculate else None
+    warmup = warmup_bars(task.interval)
+    first = last = None
+    for chunk in read_chunks(path, KLINE_COLUMNS, KLINE_COLUMNS[:-1], task.chunk_rows):
+        rows_read += len(chunk)
+        frame = klines_frame(chunk, task)
+        if not frame.empty:
+            first = frame['timestamp'].iloc[0] if first is None else first
+            last = frame['timestamp'].iloc[-1]
+        klines.copy(frame)
+        if metrics is not None:
+            window = frame if tail is None else pd.concat([tail, frame], ignore_index=True)
+            rows = metrics_frame(window, task, calculate)
+            # 前置K線只用於計算，不重複寫入
+            metrics.copy(rows.iloc[len(window) - len(frame):])
+            tail = window.iloc[-warmup:]
+
+    inserted = klines.merge()
+    metrics_inserted = metrics.merge() if metrics is not None else 0
+
+    # 寫入已導出的月份時，冷存儲中的文件需重新導出
+    if inserted:
+        mark_stale_months('klines', task.symbol, task.interval, first, last)
+    if metrics_inserted:
+        mark_stale_months('metrics', task.symbol, task.interval, first, last)
+    return rows_read, inserted, tail
+
+
+class ArchiveImporter:
+    """將 Binance 公開數據的 K線 / aggTrades 文件導入數據庫
+
+    每組（交易對、數據類型）文件在進程池中的一個進程內按時間順序處理，
+    CSV 分塊解析後以 COPY 寫入暫存表，每個文件合併一次並與已有數據去重。
+    """
+
+    def __init__(
+        self,
+        exchange_id: int,
+        resolve_id: Callable[[str], Optional[int]],
+        workers: Optional[int] = None,
+        chunk_rows: Optional[int] = None,
+        metrics: bool = False
+    ):
+        self.exchange_id = exchange_id
+        self.resolve_id = resolve_id
+        self.workers = workers or settings.ARCHIVE_IMPORT_WORKERS
+        self.chunk_rows = chunk_rows or settings.ARCHIVE_IMPORT_CHUNK_ROWS
+        self.metrics_enabled = metrics
+        self.metrics = {
+            'tasks': 0,
+            'files': 0,
+            'rows_read': 0,
+            'rows_inserted': 0,
+            'errors': 0,
+            'duration': 0.0
+        }
+
+    def plan(self, archives: List[ArchiveFile]) -> List[ImportTask]:
+        """按交易對與數據類型分組，組內按時間排序"""
+        groups: Dict[Tuple[str, str, Optional[str]], List[ArchiveFile]] = {}
+        for archive in archives:
+            groups.setdefault((archive.symbol, archive.kind, archive.interval), []).append(archive)
+
+        tasks = []
+        for (symbol, kind, interval), files in sorted(groups.items(), key=lambda item: str(item[0])):
+            trading_pair_id = self.resolve_id(symbol)
+            if not trading_pair_id:
+                logger.warning(f"Skipping {len(files)} archives for unknown trading pair {symbol}")
+                continue
+            if interval is not None:
+                try:
+                    settings.get_timeframe_seconds(interval)
+                except ValueError:
+                    logger.warning(f"Skipping {len(files)} archives with unsupported interval {symbol} {interval}")
+                    continue
+            tasks.append(ImportTask(
+                symbol=symbol,
+                kind=kind,
+                interval=interval,
+                exchange_id=self.exchange_id,
+                trading_pair_id=trading_pair_id,
+                files=[str(f.path) for f in sorted(files, key=lambda f: f.period)],
+                chunk_rows=self.chunk_rows,
+                metrics=self.metrics_enabled
+            ))
+        return tasks
+
+    def run(self, tasks: List[ImportTask], on_task_done: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """以進程池並行導入"""
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker) as executor:
+            futures = [executor.submit(import_task, task) for task in tasks]
+            for future in as_completed(futures):
+                stats = future.result()
+                self.metrics['tasks'] += 1
+                self.metrics['files'] += stats['files']
+                self.metrics['rows_read'] += stats['rows_read']
+                self.metrics['rows_inserted'] += stats['rows_inserted']
+                self.metrics['errors'] += len(stats['errors'])
+                for error in stats['errors']:
+                    logger.error(f"Archive import failed for {error}")
+                if on_task_done is not None:
+                    on_task_done(stats)
+        self.metrics['duration'] = time.perf_counter() - started
+        return self.get_metrics()
+
+    def get_metrics(self) -> Dict:
+        """獲取導入指標"""
+        return dict(self.metrics)
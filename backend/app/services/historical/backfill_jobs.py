@@ -0,0 +1,268 @@
+# backend/app/services/historical/backfill_jobs.py
+
+import asyncio
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.models.historical import BackfillJob
+from app.services.historical.backfill_planner import (
+    FetchWindow,
+    from_ms,
+    timeframe_ms,
+    warmup_bars
+)
+
+# 可繼續執行的任務狀態；running 表示上次執行被中斷
+RESUMABLE_STATUSES = ('pending', 'running', 'failed')
+
+
+class BackfillJobRunner:
+    """以檢查點方式執行回填任務
+
+    每個任務按頁順序抓取，頁內K線與任務檢查點在同一事務中提交，
+    中斷後從 cursor_ms 繼續。記憶體中只保留預取的幾頁及計算指標
+    所需的前置K線，與回填範圍大小無關。
+    """
+
+    def __init__(
+        self,
+        collector,
+        session_factory: Callable[[], Session],
+        max_parallel_jobs: Optional[int] = None,
+        prefetch_pages: Optional[int] = None
+    ):
+        # collector 為 AsyncHistoricalDataCollector，提供分頁抓取與指標計算
+        self.collector = collector
+        self.session_factory = session_factory
+        self.max_parallel_jobs = max_parallel_jobs or settings.BACKFILL_MAX_PARALLEL_JOBS
+        self.prefetch_pages = prefetch_pages or settings.BACKFILL_PREFETCH_PAGES
+        self.metrics = {
+            'jobs_completed': 0,
+            'jobs_failed': 0,
+            'pages_committed': 0,
+            'bars_saved': 0
+        }
+
+    def create_jobs(self, windows: Iterable[FetchWindow]) -> List[int]:
+        """將規劃的抓取範圍保存為任務"""
+        db = self.session_factory()
+        try:
+            jobs = [
+                BackfillJob(
+                    symbol=window.symbol,
+                    timeframe=window.timeframe,
+                    start_ms=window.start_ms,
+                    end_ms=window.end_ms,
+                    gaps=[[gap.start_ms, gap.end_ms] for gap in window.gaps],
+                    cursor_ms=window.start_ms,
+                    status='pending',
+                    pages_done=0,
+                    bars_saved=0
+                )
+                for window in windows
+            ]
+            db.add_all(jobs)
+            db.commit()
+            return [job.id for job in jobs]
+        finally:
+            db.close()
+
+    def unfinished_jobs(
+        self,
+        symbols: Optional[List[str]] = None,
+        timeframes: Optional[List[str]] = None
+    ) -> List[BackfillJob]:
+        """列出尚未完成的任務"""
+        db = self.session_factory()
+        try:
+            query = select(BackfillJob).where(BackfillJob.status.in_(RESUMABLE_STATUSES))
+            if symbols:
+                query = query.where(BackfillJob.symbol.in_(symbols))
+            if timeframes:
+                query = query.where(BackfillJob.timeframe.in_(timeframes))
+            return list(db.execute(query.order_by(BackfillJob.id)).scalars().all())
+        finally:
+            db.close()
+
+    async def run(
+        self,
+        job_ids: List[int],
+        on_job_done: Optional[Callable[[int], None]] = None
+    ) -> Dict:
+        """執行多個任務，同時執行的任務數受 max_parallel_jobs 限制"""
+        semaphore = asyncio.Semaphore(self.max_parallel_jobs)
+
+        async def run_one(job_id: int):
+            async with semaphore:
+                try:
+                    return await self.run_job(job_id)
+                finally:
+                    if on_job_done is not None:
+                        on_job_done(job_id)
+
+        results = await asyncio.gather(*[run_one(job_id) for job_id in job_ids], return_exceptions=True)
+        for job_id, result in zip(job_ids, results):
+            if isinstance(result, Exception):
+                logger.error(f"Backfill job {job_id} failed: {result}")
+        return self.get_metrics()
+
+    async def run_job(self, job_id: int) -> int:
+        """從檢查點繼續執行單個任務，返回本次保存的K線數量"""
+        job = await asyncio.to_thread(self._load_job, job_id)
+        if job is None or job.status == 'completed':
+            return 0
+
+        trading_pair_id = self.collector._get_trading_pair_id(job.symbol)
+        if not trading_pair_id:
+            await asyncio.to_thread(self._finish, job_id, 'failed', f"Trading pair not found: {job.symbol}")
+            raise ValueError(f"Trading pair not found: {job.symbol}")
+
+        step = timeframe_ms(job.timeframe)
+        cursor = job.cursor_ms if job.cursor_ms is not None else job.start_ms
+        if cursor > job.end_ms:
+            await asyncio.to_thread(self._finish, job_id, 'completed')
+            return 0
+
+        # 從檢查點往前多抓指標前置K線，這些K線只用於計算、不保存
+        fetch_from = max(job.start_ms, cursor - warmup_bars(job.timeframe) * step)
+        pages = self.collector._plan_pages(
+            job.timeframe,
+            datetime.fromtimestamp(fetch_from / 1000),
+            datetime.fromtimestamp((job.end_ms + step) / 1000)
+        )
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.prefetch_pages)
+        producer = asyncio.create_task(self._produce(job.symbol, job.timeframe, pages, queue))
+
+        logger.info(
+            f"Running backfill job {job_id} {job.symbol} {job.timeframe} "
+            f"from {from_ms(cursor)} ({len(pages)} pages)"
+        )
+
+        tail: List[Dict] = []
+        saved = 0
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                page_end_ms, klines = item
+                save_ranges = self._save_ranges(job.gaps, cursor, page_end_ms)
+                # 檢查點之前的前置頁不推進檢查點
+                next_cursor = max(cursor, page_end_ms + 1)
+
+                bars = await asyncio.to_thread(
+                    self._commit_page,
+                    job_id, trading_pair_id, job.timeframe, tail + klines, save_ranges, next_cursor
+                )
+                cursor = next_cursor
+                saved += bars
+                self.metrics['pages_committed'] += 1
+                self.metrics['bars_saved'] += bars
+                tail = (tail + klines)[-warmup_bars(job.timeframe):]
+
+            await producer
+            await asyncio.to_thread(self._finish, job_id, 'completed')
+            self.metrics['jobs_completed'] += 1
+            logger.info(f"Backfill job {job_id} {job.symbol} {job.timeframe} completed, {saved} bars saved")
+            return saved
+
+        except asyncio.CancelledError:
+            # 保持 running 狀態與最後的檢查點，下次從該處繼續
+            producer.cancel()
+            raise
+        except Exception as e:
+            producer.cancel()
+            self.metrics['jobs_failed'] += 1
+            await asyncio.to_thread(self._finish, job_id, 'failed', str(e))
+            raise
+
+    async def _produce(
+        self,
+        symbol: str,
+        timeframe: str,
+        pages: List[Tuple[int, int]],
+        queue: asyncio.Queue
+    ):
+        """按順序抓取各頁；隊列已滿時暫停，限制預取的頁數"""
+        try:
+            for page_start, page_end in pages:
+                klines = await self.collector._fetch_page(symbol, timeframe, page_start, page_end)
+                await queue.put((page_end, klines))
+        except Exception as e:
+            # 交給消費端拋出，避免其一直等待
+            await queue.put(e)
+            return
+        await queue.put(None)
+
+    @staticmethod
+    def _save_ranges(gaps: List[List[int]], cursor: int, page_end_ms: int) -> List[Tuple[datetime, datetime]]:
+        """缺口與 [cursor, page_end] 的交集"""
+        ranges = []
+        for gap_start, gap_end in gaps:
+            start = max(gap_start, cursor)
+            end = min(gap_end, page_end_ms)
+            if start <= end:
+                ranges.append((from_ms(start), from_ms(end)))
+        return ranges
+
+    def _load_job(self, job_id: int) -> Optional[BackfillJob]:
+        db = self.session_factory()
+        try:
+            job = db.get(BackfillJob, job_id)
+            if job is not None and job.status != 'completed':
+                job.status = 'running'
+                job.error = None
+                db.commit()
+                db.refresh(job)
+                db.expunge(job)
+            return job
+        finally:
+            db.close()
+
+    def _commit_page(
+        self,
+        job_id: int,
+        trading_pair_id: int,
+        timeframe: str,
+        klines: List[Dict],
+        save_ranges: List[Tuple[datetime, datetime]],
+        next_cursor: int
+    ) -> int:
+        """保存一頁K線並推進檢查點，兩者在同一事務中提交"""
+        db = self.session_factory()
+        try:
+            job = db.get(BackfillJob, job_id)
+            bars = 0
+            if klines and save_ranges:
+                bars = self.collector._stage_metrics(db, trading_pair_id, timeframe, klines, save_ranges)
+            job.cursor_ms = next_cursor
+            job.pages_done += 1
+            job.bars_saved += bars
+            db.commit()
+            return bars
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _finish(self, job_id: int, status: str, error: Optional[str] = None):
+        db = self.session_factory()
+        try:
+            job = db.get(BackfillJob, job_id)
+            job.status = status
+            job.error = error
+            db.commit()
+        finally:
+            db.close()
+
+    def get_metrics(self) -> Dict:
+        """獲取回填指標"""
+        return dict(self.metrics)
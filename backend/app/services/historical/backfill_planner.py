@@ -0,0 +1,223 @@
+# backend/app/services/historical/backfill_planner.py
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.services.symbol_registry import symbol_registry
+
+# 週線於週一 00:00 UTC 開盤，而 epoch 起點是週四
+WEEK_OFFSET_MS = 4 * 86400 * 1000
+
+# historical_metrics 中最長的指標窗口（ma99）
+MAX_INDICATOR_WINDOW = 99
+
+
+def timeframe_ms(timeframe: str) -> int:
+    return settings.get_timeframe_seconds(timeframe) * 1000
+
+
+def align_down(ms: int, timeframe: str) -> int:
+    """對齊到所在K線的開盤時間"""
+    step = timeframe_ms(timeframe)
+    offset = WEEK_OFFSET_MS if timeframe.endswith('w') else 0
+    return ms - (ms - offset) % step
+
+
+def to_ms(dt: datetime) -> int:
+    return int(dt.timestamp() * 1000)
+
+
+def from_ms(ms: int) -> datetime:
+    # 與 HistoricalDataCollector._parse_klines 的時間表示一致
+    return datetime.fromtimestamp(ms / 1000)
+
+
+def warmup_bars(timeframe: str) -> int:
+    """重新計算指標所需的前置K線數"""
+    return max(MAX_INDICATOR_WINDOW, settings.VOLATILITY_WINDOWS.get(timeframe, 20)) + 1
+
+
+@dataclass
+class GapSpan:
+    """缺失的連續K線，start/end 為首末兩根K線的開盤時間"""
+    symbol: str
+    timeframe: str
+    start_ms: int
+    end_ms: int
+
+    @property
+    def bars(self) -> int:
+        return (self.end_ms - self.start_ms) // timeframe_ms(self.timeframe) + 1
+
+    @property
+    def start(self) -> datetime:
+        return from_ms(self.start_ms)
+
+    @property
+    def end(self) -> datetime:
+        return from_ms(self.end_ms)
+
+    def __str__(self):
+        return f"{self.symbol} {self.timeframe} {self.start} → {self.end} ({self.bars} bars)"
+
+
+@dataclass
+class FetchWindow:
+    """一次連續抓取的範圍，涵蓋一個或多個缺口及其指標前置K線"""
+    symbol: str
+    timeframe: str
+    start_ms: int
+    end_ms: int
+    gaps: List[GapSpan] = field(default_factory=list)
+
+    @property
+    def requests(self) -> int:
+        bars = (self.end_ms - self.start_ms) // timeframe_ms(self.timeframe) + 1
+        return -(-bars // settings.BINANCE_MAX_LIMIT)
+
+    @property
+    def save_ranges(self) -> List[Tuple[datetime, datetime]]:
+        """只保存缺口內的K線"""
+        return [(gap.start, gap.end) for gap in self.gaps]
+
+
+class BackfillPlanner:
+    """找出 historical_metrics 中確切缺失的K線區間
+
+    以 lead() 窗口函數比較相鄰兩根K線的間距找出內部缺口，
+    再補上範圍首尾的缺口；只抓取這些區間，而不是整段重新下載。
+    交易對上市前或交易所停機的區間本就沒有K線，每次規劃仍會出現，
+    但每個只花費一次請求。
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        symbol_registry.ensure_loaded(db)
+
+    def find_gaps(
+        self,
+        symbol: str,
+        timeframe: str,
+        start_time: datetime,
+        end_time: Optional[datetime] = None
+    ) -> List[GapSpan]:
+        """找出單個交易對與週期在範圍內缺失的K線"""
+        trading_pair_id = symbol_registry.get_id(symbol)
+        if not trading_pair_id:
+            logger.warning(f"Trading pair not found: {symbol}")
+            return []
+
+        step = timeframe_ms(timeframe)
+        first_ms = align_down(to_ms(start_time) + step - 1, timeframe)
+        # 只規劃已收盤的K線
+        last_ms = align_down(to_ms(end_time or datetime.now()), timeframe) - step
+        if last_ms < first_ms:
+            return []
+
+        params = {
+            'pair_id': trading_pair_id,
+            'timeframe': timeframe,
+            'start_time': from_ms(first_ms),
+            'end_time': from_ms(last_ms),
+            'step': step / 1000
+        }
+        bounds = self.db.execute(text("""
+            SELECT MIN(timestamp) AS first_bar, MAX(timestamp) AS last_bar
+            FROM historical_metrics
+            WHERE trading_pair_id = :pair_id
+            AND timeframe = :timeframe
+            AND timestamp BETWEEN :start_time AND :end_time
+        """), params).fetchone()
+
+        if bounds is None or bounds.first_bar is None:
+            return [GapSpan(symbol, timeframe, first_ms, last_ms)]
+
+        gaps = []
+        first_bar_ms = to_ms(bounds.first_bar)
+        last_bar_ms = to_ms(bounds.last_bar)
+        if first_bar_ms > first_ms:
+            gaps.append(GapSpan(symbol, timeframe, first_ms, first_bar_ms - step))
+
+        rows = self.db.execute(text("""
+            SELECT timestamp, next_timestamp
+            FROM (
+                SELECT
+                    timestamp,
+                    LEAD(timestamp) OVER (ORDER BY timestamp) AS next_timestamp
+                FROM historical_metrics
+                WHERE trading_pair_id = :pair_id
+                AND timeframe = :timeframe
+                AND timestamp BETWEEN :start_time AND :end_time
+            ) bars
+            WHERE next_timestamp - timestamp > make_interval(secs => :step)
+            ORDER BY timestamp
+        """), params).fetchall()
+        for row in rows:
+            gaps.append(GapSpan(
+                symbol, timeframe,
+                to_ms(row.timestamp) + step,
+                to_ms(row.next_timestamp) - step
+            ))
+
+        if last_bar_ms < last_ms:
+            gaps.append(GapSpan(symbol, timeframe, last_bar_ms + step, last_ms))
+        return gaps
+
+    def plan(
+        self,
+        symbols: List[str],
+        timeframes: Optional[List[str]] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        days: Optional[int] = None
+    ) -> List[FetchWindow]:
+        """規劃所有交易對與週期的抓取範圍"""
+        timeframes = timeframes or settings.HISTORICAL_DATA_TIMEFRAMES
+        end_time = end_time or datetime.now()
+        if start_time is None:
+            start_time = datetime.fromtimestamp(
+                end_time.timestamp() - (days or settings.HISTORICAL_INITIAL_DAYS) * 86400
+            )
+
+        windows = []
+        for symbol in symbols:
+            for timeframe in timeframes:
+                gaps = self.find_gaps(symbol, timeframe, start_time, end_time)
+                windows.extend(self.merge_gaps(gaps))
+        return windows
+
+    @staticmethod
+    def merge_gaps(gaps: List[GapSpan]) -> List[FetchWindow]:
+        """加上指標前置K線後，將一頁內相鄰的缺口合併為同一次抓取"""
+        windows: List[FetchWindow] = []
+        for gap in sorted(gaps, key=lambda g: g.start_ms):
+            step = timeframe_ms(gap.timeframe)
+            fetch_start = gap.start_ms - warmup_bars(gap.timeframe) * step
+            current = windows[-1] if windows else None
+            if (
+                current is not None
+                and current.timeframe == gap.timeframe
+                and current.symbol == gap.symbol
+                and fetch_start <= current.end_ms + settings.BINANCE_MAX_LIMIT * step
+            ):
+                current.end_ms = gap.end_ms
+                current.gaps.append(gap)
+            else:
+                windows.append(FetchWindow(gap.symbol, gap.timeframe, fetch_start, gap.end_ms, [gap]))
+        return windows
+
+    @staticmethod
+    def summarize(windows: List[FetchWindow]) -> Dict:
+        """規劃摘要"""
+        return {
+            'windows': len(windows),
+            'gaps': sum(len(window.gaps) for window in windows),
+            'missing_bars': sum(gap.bars for window in windows for gap in window.gaps),
+            'requests': sum(window.requests for window in windows)
+        }
@@ -0,0 +1,346 @@
+# backend/app/services/historical/cold_store.py
+
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from dateutil import tz
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.models.historical import HistoricalMetrics
+from app.models.market import KlineData
+from app.services.symbol_registry import symbol_registry
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    from pyarrow import fs
+except ImportError:  # 可選依賴
+    pa = None
+
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+
+@dataclass
+class ColdDataset:
+    """可導出到冷存儲的表，欄位類型以 Arrow 別名表示"""
+    model: type
+    timeframe_column: str
+    columns: Dict[str, str]
+
+
+PRICE_TYPES = {
+    'open_price': 'float64',
+    'high_price': 'float64',
+    'low_price': 'float64',
+    'close_price': 'float64',
+    'volume': 'float64'
+}
+
+DATASETS = {
+    'metrics': ColdDataset(HistoricalMetrics, 'timeframe', {
+        **PRICE_TYPES,
+        **{name: 'float64' for name in [
+            'volatility', 'volatility_short', 'volatility_medium', 'volatility_long',
+            'ma7', 'ma25', 'ma99', 'rsi', 'bb_upper', 'bb_middle', 'bb_lower', 'bb_width',
+            'returns', 'log_returns', 'realized_volatility', 'price_momentum', 'volume_momentum'
+        ]}
+    }),
+    'klines': ColdDataset(KlineData, 'interval', {
+        **PRICE_TYPES,
+        'quote_volume': 'float64',
+        'number_of_trades': 'int64',
+        'taker_buy_base_volume': 'float64',
+        'taker_buy_quote_volume': 'float64',
+        'vwap': 'float64'
+    })
+}
+
+
+def cold_store_available() -> bool:
+    return pa is not None
+
+
+def month_start(dt: datetime) -> datetime:
+    """所在月份的起始時間（UTC）"""
+    if dt.tzinfo is None:
+        dt = dt.astimezone()
+    dt = dt.astimezone(timezone.utc)
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(start: datetime) -> datetime:
+    # 月初加 32 天必定落在下個月
+    return month_start(start + timedelta(days=32))
+
+
+def iter_months(start: datetime, end: datetime) -> List[datetime]:
+    """[start, end] 涵蓋的所有月份"""
+    months = []
+    current = month_start(start)
+    while current <= end:
+        months.append(current)
+        current = next_month(current)
+    return months
+
+
+def _utc(dt: Optional[datetime]) -> Optional[datetime]:
+    # 無時區的時間視為本地時間
+    return dt.astimezone(timezone.utc) if dt is not None else None
+
+
+def to_utc_index(values) -> pd.DatetimeIndex:
+    """批量轉為 UTC，規則與 _utc 相同：無時區的時間視為本地時間"""
+    index = pd.DatetimeIndex(pd.to_datetime(list(values)))
+    if index.tz is None:
+        # 夏令時重疊時段取第一次出現，與 datetime.astimezone 的 fold=0 一致
+        index = index.tz_localize(tz.tzlocal(), ambiguous=True, nonexistent='shift_forward')
+    return index.tz_convert('UTC')
+
+
+def uncovered_ranges(
+    months: List[datetime],
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None
+) -> List[Tuple[Optional[datetime], Optional[datetime]]]:
+    """[start_time, end_time] 中不屬於 months 的區間（含開頭與中間的缺口），None 表示不設限"""
+    start_time, end_time = _utc(start_time), _utc(end_time)
+    ranges = []
+    cursor = start_time
+    for month in sorted(months):
+        end = next_month(month)
+        if end_time is not None and month > end_time:
+            break
+        if start_time is not None and end <= start_time:
+            continue
+        if cursor is None or cursor < month:
+            ranges.append((cursor, month))
+        cursor = end if cursor is None else max(cursor, end)
+    if cursor is None or end_time is None or cursor <= end_time:
+        ranges.append((cursor, end_time))
+    return ranges
+
+
+class ColdStore:
+    """按 交易對/週期/月份 存放的列式歷史數據
+
+    每個月份一個文件，路徑即為分區，讀取時只打開查詢範圍內的月份；
+    文件內按 timestamp 排序，parquet 可依 row group 統計跳過不在範圍內的
+    數據，arrow (IPC) 不壓縮，經記憶體映射後直接引用頁面緩存。
+    只讀取所需的欄位。
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        format: Optional[str] = None,
+        compression: Optional[str] = None,
+        row_group_size: Optional[int] = None
+    ):
+        if pa is None:
+            raise ImportError("pyarrow is required for the cold store")
+        self.directory = Path(directory or settings.COLD_STORE_DIRECTORY)
+        self.format = format or settings.COLD_STORE_FORMAT
+        if self.format not in FORMATS:
+            raise ValueError(f"Invalid cold store format: {self.format}")
+        self.compression = compression or settings.COLD_STORE_COMPRESSION
+        self.row_group_size = row_group_size or settings.COLD_STORE_ROW_GROUP_SIZE
+        self.filesystem = fs.LocalFileSystem(use_mmap=True)
+        self.metrics = {
+            'months_written': 0,
+            'rows_written': 0,
+            'files_read': 0,
+            'rows_read': 0,
+            'months_marked_stale': 0
+        }
+
+    def path(self, dataset: str, symbol: str, timeframe: str, month: datetime) -> Path:
+        return self.directory / dataset / symbol / timeframe / f"{month:%Y-%m}{FORMATS[self.format]}"
+
+    def stale_path(self, dataset: str, symbol: str, timeframe: str, month: datetime) -> Path:
+        return self.path(dataset, symbol, timeframe, month).with_suffix('.stale')
+
+    def months(self, dataset: str, symbol: str, timeframe: str, include_stale: bool = False) -> List[datetime]:
+        """已導出的月份，預設不含已標記為過期的月份"""
+        folder = self.directory / dataset / symbol / timeframe
+        if not folder.is_dir():
+            return []
+        months = []
+        for path in folder.glob(f"*{FORMATS[self.format]}"):
+            try:
+                month = datetime.strptime(path.stem, '%Y-%m').replace(tzinfo=timezone.utc)
+            except ValueError:
+                continue
+            if include_stale or not path.with_suffix('.stale').exists():
+                months.append(month)
+        return sorted(months)
+
+    def mark_stale(self, dataset: str, symbol: str, timeframe: str, start: datetime, end: datetime) -> List[datetime]:
+        """將 [start, end] 內已導出的月份標記為過期
+
+        過期月份在重新導出前改從數據庫讀取，export_cold_store.py 會重新導出。
+        """
+        first, last = month_start(start), _utc(end)
+        marked = []
+        for month in self.months(dataset, symbol, timeframe):
+            if first <= month <= last:
+                self.stale_path(dataset, symbol, timeframe, month).touch()
+                marked.append(month)
+        if marked:
+            self.metrics['months_marked_stale'] += len(marked)
+            logger.info(
+                f"Marked {len(marked)} cold store months stale for {dataset} {symbol} {timeframe}: "
+                f"{', '.join(f'{m:%Y-%m}' for m in marked)}"
+            )
+        return marked
+
+    def schema(self, dataset: str) -> 'pa.Schema':
+        spec = DATASETS[dataset]
+        return pa.schema(
+            [pa.field('timestamp', pa.timestamp('us', tz='UTC'), nullable=False)]
+            + [pa.field(name, pa.type_for_alias(alias)) for name, alias in spec.columns.items()]
+        )
+
+    def export_month(self, db: Session, dataset: str, symbol: str, timeframe: str, month: datetime) -> int:
+        """將一個月份從數據庫導出為一個文件，返回列數，無數據時不建立文件"""
+        spec = DATASETS[dataset]
+        symbol_registry.ensure_loaded(db)
+        trading_pair_id = symbol_registry.get_id(symbol, active_only=False)
+        if trading_pair_id is None:
+            raise ValueError(f"Unknown symbol: {symbol}")
+
+        start = month_start(month)
+        model = spec.model
+        query = (
+            select(model.timestamp, *[getattr(model, name) for name in spec.columns])
+            .where(
+                model.trading_pair_id == trading_pair_id,
+                getattr(model, spec.timeframe_column) == timeframe,
+                model.timestamp >= start,
+                model.timestamp < next_month(start)
+            )
+            .order_by(model.timestamp)
+        )
+        rows = db.execute(query).all()
+        stale_path = self.stale_path(dataset, symbol, timeframe, start)
+        if not rows:
+            # 數據庫中已無該月份時保留原文件
+            stale_path.unlink(missing_ok=True)
+            return 0
+
+        schema = self.schema(dataset)
+        columns = list(zip(*rows))
+        columns[0] = to_utc_index(columns[0])
+        table = pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+            schema=schema
+        )
+        self._write(self.path(dataset, symbol, timeframe, start), table)
+        stale_path.unlink(missing_ok=True)
+
+        self.metrics['months_written'] += 1
+        self.metrics['rows_written'] += table.num_rows
+        return table.num_rows
+
+    def _write(self, path: Path, table: 'pa.Table'):
+        """寫入臨時文件後替換，讀取方不會看到寫了一半的文件"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        if self.format == 'parquet':
+            pq.write_table(
+                table, tmp_path,
+                row_group_size=self.row_group_size,
+                compression=self.compression,
+                write_statistics=['timestamp']
+            )
+        else:
+            with pa.OSFile(str(tmp_path), 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table, max_chunksize=self.row_group_size)
+        os.replace(tmp_path, path)
+
+    def read(
+        self,
+        dataset: str,
+        symbol: str,
+        timeframe: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        columns: Optional[List[str]] = None,
+        months: Optional[List[datetime]] = None
+    ) -> 'pa.Table':
+        """讀取 [start_time, end_time] 內的數據，按時間排序，可只讀取指定的月份"""
+        schema = self.schema(dataset)
+        columns = ['timestamp'] + [c for c in (columns or schema.names) if c != 'timestamp']
+
+        months = self.months(dataset, symbol, timeframe) if months is None else sorted(months)
+        if start_time is not None:
+            months = [m for m in months if m >= month_start(start_time)]
+        if end_time is not None:
+            months = [m for m in months if m <= end_time.astimezone(timezone.utc)]
+        if not months:
+            return schema.empty_table().select(columns)
+
+        condition = None
+        if start_time is not None:
+            condition = ds.field('timestamp') >= pa.scalar(start_time.astimezone(timezone.utc), schema.field('timestamp').type)
+        if end_time is not None:
+            upper = ds.field('timestamp') <= pa.scalar(end_time.astimezone(timezone.utc), schema.field('timestamp').type)
+            condition = upper if condition is None else condition & upper
+
+        files = [str(self.path(dataset, symbol, timeframe, month)) for month in months]
+        source = ds.dataset(
+            files,
+            schema=schema,
+            format='parquet' if self.format == 'parquet' else 'ipc',
+            filesystem=self.filesystem
+        )
+        # 月份文件已按時間排序，按文件順序讀出即為時間順序
+        table = source.to_table(columns=columns, filter=condition)
+
+        self.metrics['files_read'] += len(files)
+        self.metrics['rows_read'] += table.num_rows
+        return table
+
+    def read_frame(
+        self,
+        dataset: str,
+        symbol: str,
+        timeframe: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        columns: Optional[List[str]] = None,
+        months: Optional[List[datetime]] = None
+    ) -> pd.DataFrame:
+        """以 timestamp 為索引的 DataFrame"""
+        table = self.read(dataset, symbol, timeframe, start_time, end_time, columns, months)
+        return table.to_pandas().set_index('timestamp')
+
+    def get_metrics(self) -> Dict:
+        """獲取冷存儲指標"""
+        return dict(self.metrics)
+
+
+def default_cold_store() -> Optional[ColdStore]:
+    """按配置建立冷存儲，未啟用或未安裝 pyarrow 時返回 None"""
+    if not settings.COLD_STORE_ENABLED:
+        return None
+    if not cold_store_available():
+        logger.debug("pyarrow is not installed, reading historical data from the database only")
+        return None
+    return ColdStore()
+
+
+def mark_stale_months(dataset: str, symbol: str, timeframe: str, start: datetime, end: datetime) -> List[datetime]:
+    """回填寫入數據庫後調用，將冷存儲中受影響的月份標記為過期；未啟用冷存儲時不做任何事"""
+    store = default_cold_store()
+    if store is None:
+        return []
+    return store.mark_stale(dataset, symbol, timeframe, start, end)
@@ -8,11 +8,24 @@ from sqlalchemy.orm import Session
 from sqlalchemy import select, and_
 from app.core.logging import logger
 from app.models.historical import HistoricalMetrics
-from app.models.market import TradingPair
+from app.services.symbol_registry import symbol_registry
+from app.services.historical.cold_store import (
+    ColdStore, default_cold_store, to_utc_index, uncovered_ranges
+)
+
+PRICE_FIELDS = {
+    'open_price': 'open',
+    'high_price': 'high',
+    'low_price': 'low',
+    'close_price': 'close',
+    'volume': 'volume'
+}
 
 class HistoricalDataService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, cold_store: Optional[ColdStore] = None):
         self.db = db
+        # 已導出月份從列式冷存儲讀取，其餘從數據庫讀取
+        self.cold_store = cold_store or default_cold_store()
         # 為不同時間週期定義年化因子
         self.annualization_factors = {
             '1m': 525600,  # 365 * 24 * 60
@@ -46,17 +59,12 @@ class HistoricalDataService:
         """分析波動率特徵"""
         try:
             # 獲取歷史數據
-            metrics = self._get_historical_data(
-                symbol, timeframe, start_time, end_time
-            )
+            df = self._load_dataframe(symbol, timeframe, start_time, end_time)
 
-            if not metrics or len(metrics) < 2:
+            if len(df) < 2:
                 logger.warning(f"Insufficient data for {symbol} {timeframe}")
                 return {}
 
-            # 轉換為DataFrame
-            df = self._prepare_dataframe(metrics)
-            
             # 計算波動率
             df = self._calculate_volatility(df, timeframe)
             
@@ -82,14 +90,14 @@ class HistoricalDataService:
         """獲取歷史數據"""
         try:
             # 獲取交易對
-            trading_pair = self._get_trading_pair(symbol)
-            if not trading_pair:
+            trading_pair_id = self._get_trading_pair_id(symbol)
+            if not trading_pair_id:
                 return []
 
             # 構建查詢
             query = select(HistoricalMetrics).where(
                 and_(
-                    HistoricalMetrics.trading_pair_id == trading_pair.id,
+                    HistoricalMetrics.trading_pair_id == trading_pair_id,
                     HistoricalMetrics.timeframe == timeframe
                 )
             )
@@ -111,36 +119,83 @@ class HistoricalDataService:
             logger.error(f"Error getting historical data: {e}")
             return []
 
-    def _prepare_dataframe(self, metrics: List[HistoricalMetrics]) -> pd.DataFrame:
-        """準備數據框架"""
+    def _load_dataframe(
+        self,
+        symbol: str,
+        timeframe: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> pd.DataFrame:
+        """獲取 OHLCV 數據框架，冷存儲未涵蓋的部分（開頭、缺口與最近月份）從數據庫補齊"""
         try:
-            # 創建初始 DataFrame
-            df = pd.DataFrame([{
-                'timestamp': m.timestamp.astimezone(timezone.utc),  # 轉換為 UTC
-                'open': m.open_price,
-                'high': m.high_price,
-                'low': m.low_price,
-                'close': m.close_price,
-                'volume': m.volume
-            } for m in metrics])
-            
-            if df.empty:
+            frames = []
+            db_ranges = [(start_time, end_time)]
+            if self.cold_store is not None:
+                try:
+                    months = self.cold_store.months('metrics', symbol, timeframe)
+                    cold = self.cold_store.read_frame(
+                        'metrics', symbol, timeframe, start_time, end_time,
+                        columns=list(PRICE_FIELDS), months=months
+                    )
+                    db_ranges = uncovered_ranges(months, start_time, end_time)
+                except Exception as e:
+                    logger.error(f"Error reading cold store for {symbol} {timeframe}: {e}")
+                    cold = pd.DataFrame()
+                if not cold.empty:
+                    frames.append(cold)
+
+            for range_start, range_end in db_ranges:
+                frames.append(self._query_price_frame(symbol, timeframe, range_start, range_end))
+            frames = [f for f in frames if not f.empty]
+            if not frames:
                 return pd.DataFrame()
-            
-            # 設置時間索引
-            df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True)
-            df.set_index('timestamp', inplace=True)
-            
+
+            df = pd.concat(frames).rename(columns=PRICE_FIELDS)
+
             # 清理數據
             df = df[~df.index.duplicated(keep='first')]  # 移除重複的時間戳
             df.sort_index(inplace=True)  # 按時間排序
-            
+
             return df
-            
+
         except Exception as e:
             logger.error(f"Error preparing DataFrame: {e}")
             return pd.DataFrame()
 
+    def _query_price_frame(
+        self,
+        symbol: str,
+        timeframe: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> pd.DataFrame:
+        """只查詢 OHLCV 欄位，不建立 ORM 對象"""
+        trading_pair_id = self._get_trading_pair_id(symbol)
+        if not trading_pair_id:
+            return pd.DataFrame()
+
+        query = select(
+            HistoricalMetrics.timestamp,
+            *[getattr(HistoricalMetrics, name) for name in PRICE_FIELDS]
+        ).where(
+            and_(
+                HistoricalMetrics.trading_pair_id == trading_pair_id,
+                HistoricalMetrics.timeframe == timeframe
+            )
+        )
+        if start_time:
+            query = query.where(HistoricalMetrics.timestamp >= start_time.astimezone(timezone.utc))
+        if end_time:
+            query = query.where(HistoricalMetrics.timestamp <= end_time.astimezone(timezone.utc))
+
+        rows = self.db.execute(query.order_by(HistoricalMetrics.timestamp.asc())).all()
+        if not rows:
+            return pd.DataFrame()
+
+        df = pd.DataFrame(rows, columns=['timestamp', *PRICE_FIELDS])
+        df['timestamp'] = to_utc_index(df['timestamp'])
+        return df.set_index('timestamp')
+
     def _calculate_volatility(self, df: pd.DataFrame, timeframe: str) -> pd.DataFrame:
         """計算波動率"""
         try:
@@ -237,14 +292,10 @@ class HistoricalDataService:
             return {}
 
 
-    def _get_trading_pair(self, symbol: str) -> Optional[TradingPair]:
-        """獲取交易對信息"""
-        return self.db.query(TradingPair).filter(
-            and_(
-                TradingPair.symbol == symbol,
-                TradingPair.is_active == 1
-            )
-        ).first()
+    def _get_trading_pair_id(self, symbol: str) -> Optional[int]:
+        """從註冊表獲取交易對ID"""
+        symbol_registry.ensure_loaded(self.db)
+        return symbol_registry.get_id(symbol)
 
     def _determine_volatility_regime(
         self,
@@ -0,0 +1,284 @@
+# backend/app/services/partition_manager.py
+
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import logger
+
+PARTITION_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def to_utc(dt: datetime) -> datetime:
+    """轉為 UTC，無時區的時間視為本地時間"""
+    return dt.astimezone(timezone.utc)
+
+
+def partition_start(granularity: str, dt: datetime) -> datetime:
+    """所在分區的起始時間（UTC）"""
+    dt = to_utc(dt)
+    if granularity == 'day':
+        return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == 'month':
+        return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Invalid partition granularity: {granularity}")
+
+
+def next_partition_start(granularity: str, start: datetime) -> datetime:
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    # 月初加 32 天必定落在下個月
+    return partition_start('month', start + timedelta(days=32))
+
+
+def partition_name(table: str, granularity: str, start: datetime) -> str:
+    """如 market_data_y2024m01d15、historical_metrics_y2024m01"""
+    name = f"{table}_y{start:%Y}m{start:%m}"
+    return f"{name}d{start:%d}" if granularity == 'day' else name
+
+
+def bound_literal(dt: datetime) -> str:
+    """分區範圍的字面值，明確標示為 UTC"""
+    return f"{to_utc(dt):%Y-%m-%d %H:%M:%S}+00"
+
+
+def _parse_bound(value: str) -> datetime:
+    # pg_get_expr 輸出的時區為 +00 形式
+    if re.search(r'[+-]\d\d$', value):
+        value += ':00'
+    bound = datetime.fromisoformat(value)
+    # 無時區欄位的範圍以 UTC 寫入
+    if bound.tzinfo is None:
+        return bound.replace(tzinfo=timezone.utc)
+    return bound.astimezone(timezone.utc)
+
+
+@dataclass
+class PartitionInfo:
+    """一個分區及其 UTC 範圍，預設分區沒有範圍"""
+    name: str
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+
+    @property
+    def is_default(self) -> bool:
+        return self.start is None
+
+
+class PartitionManager:
+    """管理按 timestamp 範圍分區的表
+
+    預先建立未來的分區，並在超過保留期限時分離或刪除整個分區，
+    以 DDL 取代逐筆刪除。表尚未轉為分區表時跳過。
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        tables: Optional[Dict[str, str]] = None,
+        retention_days: Optional[Dict[str, int]] = None,
+        premake_days: Optional[int] = None,
+        drop_expired: Optional[bool] = None
+    ):
+        self.session_factory = session_factory
+        self.tables = tables or settings.PARTITION_TABLES
+        self.retention_days = settings.PARTITION_RETENTION_DAYS if retention_days is None else retention_days
+        self.premake_days = premake_days or settings.PARTITION_PREMAKE_DAYS
+        self.drop_expired = settings.PARTITION_DROP_EXPIRED if drop_expired is None else drop_expired
+        self.metrics = {
+            'partitions_created': 0,
+            'partitions_detached': 0,
+            'partitions_dropped': 0,
+            'rows_moved': 0,
+            'errors': 0,
+            'last_run': None
+        }
+
+    @staticmethod
+    def is_partitioned(db: Session, table: str) -> bool:
+        return db.execute(text("""
+            SELECT 1
+            FROM pg_partitioned_table pt
+            JOIN pg_class c ON c.oid = pt.partrelid
+            WHERE c.relname = :table
+        """), {'table': table}).first() is not None
+
+    @staticmethod
+    def list_partitions(db: Session, table: str) -> List[PartitionInfo]:
+        """列出分區，按起始時間排序，預設分區在最後"""
+        rows = db.execute(text("""
+            SELECT child.relname AS name, pg_get_expr(child.relpartbound, child.oid) AS bound
+            FROM pg_inherits i
+            JOIN pg_class parent ON parent.oid = i.inhparent
+            JOIN pg_class child ON child.oid = i.inhrelid
+            WHERE parent.relname = :table
+        """), {'table': table}).fetchall()
+
+        partitions = []
+        for row in rows:
+            match = PARTITION_BOUND.search(row.bound)
+            if match:
+                partitions.append(PartitionInfo(row.name, _parse_bound(match.group(1)), _parse_bound(match.group(2))))
+            else:
+                partitions.append(PartitionInfo(row.name))
+        latest = datetime.max.replace(tzinfo=timezone.utc)
+        return sorted(partitions, key=lambda p: (p.is_default, p.start or latest))
+
+    @staticmethod
+    def ensure_default(db: Session, table: str, existing: Optional[List[PartitionInfo]] = None) -> Optional[str]:
+        """建立預設分區，已存在時返回 None"""
+        if existing is None:
+            existing = PartitionManager.list_partitions(db, table)
+        if any(p.is_default for p in existing):
+            return None
+        # 承接超出已建分區範圍的寫入，避免維護延遲時寫入失敗
+        db.execute(text(f'CREATE TABLE IF NOT EXISTS "{table}_default" PARTITION OF "{table}" DEFAULT'))
+        return f"{table}_default"
+
+    def ensure_partitions(
+        self,
+        db: Session,
+        table: str,
+        start: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> List[str]:
+        """建立預設分區及 [start, until] 範圍內缺少的分區"""
+        granularity = self.tables[table]
+        now = datetime.now(timezone.utc)
+        current = partition_start(granularity, start or now)
+        until = to_utc(until) if until else now + timedelta(days=self.premake_days)
+
+        existing = self.list_partitions(db, table)
+        covered = {p.start for p in existing if not p.is_default}
+        created = []
+
+        default = self.ensure_default(db, table, existing)
+        if default:
+            created.append(default)
+        else:
+            default = next(p.name for p in existing if p.is_default)
+
+        while current <= until:
+            end = next_partition_start(granularity, current)
+            if current not in covered:
+                name = partition_name(table, granularity, current)
+                try:
+                    with db.begin_nested():
+                        self.metrics['rows_moved'] += self._create_partition(db, table, default, name, current, end)
+                    created.append(name)
+                except Exception as e:
+                    self.metrics['errors'] += 1
+                    logger.error(f"Error creating partition {name}: {e}")
+            current = end
+
+        self.metrics['partitions_created'] += len(created)
+        return created
+
+    @staticmethod
+    def _create_partition(db: Session, table: str, default: str, name: str, start: datetime, end: datetime) -> int:
+        """建立一個範圍分區，返回從預設分區搬入的列數"""
+        bounds = f"FROM ('{bound_literal(start)}') TO ('{bound_literal(end)}')"
+        in_range = f"\"timestamp\" >= '{bound_literal(start)}' AND \"timestamp\" < '{bound_literal(end)}'"
+        if db.execute(text(f'SELECT 1 FROM "{default}" WHERE {in_range} LIMIT 1')).first() is None:
+            db.execute(text(f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" FOR VALUES {bounds}'))
+            return 0
+
+        # 預設分區已有該範圍的數據時無法直接建立分區：
+        # 先分離預設分區，建立分區並搬入數據後再掛回；期間父表被鎖定，寫入會等待
+        db.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{default}"'))
+        db.execute(text(f'CREATE TABLE "{name}" PARTITION OF "{table}" FOR VALUES {bounds}'))
+        moved = db.execute(text(f'INSERT INTO "{name}" SELECT * FROM "{default}" WHERE {in_range}')).rowcount
+        db.execute(text(f'DELETE FROM "{default}" WHERE {in_range}'))
+        db.execute(text(f'ALTER TABLE "{table}" ATTACH PARTITION "{default}" DEFAULT'))
+        logger.info(f"Moved {moved} rows from {default} into new partition {name}")
+        return moved
+
+    def expire_partitions(self, db: Session, table: str, cutoff: datetime) -> List[str]:
+        """分離（並可刪除）完全早於 cutoff 的分區"""
+        cutoff = to_utc(cutoff)
+        expired = []
+        for partition in self.list_partitions(db, table):
+            if partition.is_default or partition.end > cutoff:
+                continue
+            db.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{partition.name}"'))
+            self.metrics['partitions_detached'] += 1
+            if self.drop_expired:
+                db.execute(text(f'DROP TABLE "{partition.name}"'))
+                self.metrics['partitions_dropped'] += 1
+            expired.append(partition.name)
+        return expired
+
+    def ensure_all(self) -> Dict[str, List[str]]:
+        """為所有分區表建立預設分區及當前、未來的分區，不處理過期分區"""
+        results = {}
+        for table in self.tables:
+            db = self.session_factory()
+            try:
+                if self.is_partitioned(db, table):
+                    results[table] = self.ensure_partitions(db, table)
+                    db.commit()
+            except Exception as e:
+                db.rollback()
+                self.metrics['errors'] += 1
+                logger.error(f"Error creating partitions for {table}: {e}")
+            finally:
+                db.close()
+        return results
+
+    def ensure_defaults(self) -> List[str]:
+        """只為分區表建立預設分區；未啟用分區維護時，分區表仍須有預設分區才能寫入"""
+        created = []
+        for table in self.tables:
+            db = self.session_factory()
+            try:
+                if self.is_partitioned(db, table):
+                    default = self.ensure_default(db, table)
+                    db.commit()
+                    if default:
+                        created.append(default)
+            except Exception as e:
+                db.rollback()
+                self.metrics['errors'] += 1
+                logger.error(f"Error creating default partition for {table}: {e}")
+            finally:
+                db.close()
+        return created
+
+    def maintain(self) -> Dict[str, Dict[str, List[str]]]:
+        """對所有分區表建立未來分區並處理過期分區"""
+        results = {}
+        for table in self.tables:
+            db = self.session_factory()
+            try:
+                if not self.is_partitioned(db, table):
+                    logger.warning(f"Table {table} is not partitioned, skipping partition maintenance")
+                    continue
+
+                created = self.ensure_partitions(db, table)
+                expired = []
+                if table in self.retention_days:
+                    cutoff = datetime.now(timezone.utc) - timedelta(days=self.retention_days[table])
+                    expired = self.expire_partitions(db, table, cutoff)
+                db.commit()
+
+                results[table] = {'created': created, 'expired': expired}
+                if created or expired:
+                    logger.info(f"Partitions for {table}: created {created}, expired {expired}")
+            except Exception as e:
+                db.rollback()
+                self.metrics['errors'] += 1
+                logger.error(f"Error maintaining partitions for {table}: {e}")
+            finally:
+                db.close()
+
+        self.metrics['last_run'] = datetime.now().isoformat()
+        return results
+
+    def get_metrics(self) -> Dict:
+        """獲取分區維護指標"""
+        return dict(self.metrics)
@@ -0,0 +1,161 @@
+# backend/app/services/symbol_registry.py
+
+import threading
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.logging import logger
+from app.models.market import TradingPair
+
+
+@dataclass
+class SymbolInfo:
+    """交易對的靜態信息"""
+    symbol: str
+    trading_pair_id: int
+    exchange_id: int
+    base_currency: str
+    quote_currency: str
+    is_active: bool = True
+    tick_size: Optional[float] = None
+    step_size: Optional[float] = None
+    min_qty: Optional[float] = None
+    min_notional: Optional[float] = None
+
+
+class SymbolRegistry:
+    """進程內共用的交易對註冊表
+
+    啟動時從 trading_pairs 載入一次，之後由 collect_trading_pairs 刷新；
+    熱路徑上的 symbol → id 查詢只讀取記憶體，不訪問數據庫。
+    """
+
+    def __init__(self):
+        self._symbols: Dict[str, SymbolInfo] = {}
+        self._by_id: Dict[int, SymbolInfo] = {}
+        self._lock = threading.Lock()
+        self.loaded_at: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._symbols
+
+    def load(self, db: Session, exchange_id: Optional[int] = None) -> int:
+        """從數據庫載入所有交易對，保留已知的交易規則"""
+        query = db.query(TradingPair)
+        if exchange_id is not None:
+            query = query.filter(TradingPair.exchange_id == exchange_id)
+
+        with self._lock:
+            symbols: Dict[str, SymbolInfo] = {}
+            for pair in query.all():
+                previous = self._symbols.get(pair.symbol)
+                info = SymbolInfo(
+                    symbol=pair.symbol,
+                    trading_pair_id=pair.id,
+                    exchange_id=pair.exchange_id,
+                    base_currency=pair.base_currency,
+                    quote_currency=pair.quote_currency,
+                    is_active=bool(pair.is_active)
+                )
+                if previous is not None:
+                    info = replace(
+                        info,
+                        tick_size=previous.tick_size,
+                        step_size=previous.step_size,
+                        min_qty=previous.min_qty,
+                        min_notional=previous.min_notional
+                    )
+                # 同一 symbol 有多筆時優先使用活躍的記錄
+                existing = symbols.get(pair.symbol)
+                if existing is None or (info.is_active and not existing.is_active):
+                    symbols[pair.symbol] = info
+
+            self._swap(symbols)
+
+        logger.info(f"Symbol registry loaded {len(self._symbols)} trading pairs")
+        return len(self._symbols)
+
+    def ensure_loaded(self, db: Session):
+        """尚未載入時從數據庫載入"""
+        if self.loaded_at is None:
+            self.load(db)
+
+    def update_from_exchange_info(self, exchange_info: Dict):
+        """從 exchangeInfo 更新價格與數量規則"""
+        with self._lock:
+            symbols = dict(self._symbols)
+            for symbol_info in exchange_info.get('symbols', []):
+                info = symbols.get(symbol_info['symbol'])
+                if info is None:
+                    continue
+
+                filters = {f['filterType']: f for f in symbol_info.get('filters', [])}
+                price_filter = filters.get('PRICE_FILTER', {})
+                lot_size = filters.get('LOT_SIZE', {})
+                notional = filters.get('NOTIONAL') or filters.get('MIN_NOTIONAL') or {}
+
+                symbols[info.symbol] = replace(
+                    info,
+                    tick_size=_to_float(price_filter.get('tickSize')),
+                    step_size=_to_float(lot_size.get('stepSize')),
+                    min_qty=_to_float(lot_size.get('minQty')),
+                    min_notional=_to_float(notional.get('minNotional'))
+                )
+            self._swap(symbols)
+
+    def register(self, info: SymbolInfo):
+        """新增或覆蓋單個交易對"""
+        with self._lock:
+            symbols = dict(self._symbols)
+            symbols[info.symbol] = info
+            self._swap(symbols)
+
+    def _swap(self, symbols: Dict[str, SymbolInfo]):
+        # 整體替換字典，讀取方無需加鎖
+        self._symbols = symbols
+        self._by_id = {info.trading_pair_id: info for info in symbols.values()}
+        self.loaded_at = datetime.now()
+
+    def get(self, symbol: str) -> Optional[SymbolInfo]:
+        """獲取交易對信息"""
+        return self._symbols.get(symbol)
+
+    def get_id(self, symbol: str, active_only: bool = True) -> Optional[int]:
+        """獲取交易對ID"""
+        info = self._symbols.get(symbol)
+        if info is None or (active_only and not info.is_active):
+            return None
+        return info.trading_pair_id
+
+    def get_by_id(self, trading_pair_id: int) -> Optional[SymbolInfo]:
+        """依ID獲取交易對信息"""
+        return self._by_id.get(trading_pair_id)
+
+    def symbols(self, active_only: bool = True) -> List[str]:
+        """列出已註冊的交易對"""
+        return [
+            symbol for symbol, info in self._symbols.items()
+            if info.is_active or not active_only
+        ]
+
+    def get_status(self) -> Dict:
+        """獲取註冊表狀態"""
+        return {
+            'total': len(self._symbols),
+            'active': sum(1 for info in self._symbols.values() if info.is_active),
+            'loaded_at': self.loaded_at.isoformat() if self.loaded_at else None
+        }
+
+
+def _to_float(value: Optional[str]) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+# 全局註冊表實例
+symbol_registry = SymbolRegistry()
@@ -147,14 +147,16 @@ class LargeTradeMonitor:
         return result.scalar_one_or_none()
     
     def _get_recent_trades(self, symbol: str, minutes: int = 5) -> List[MarketData]:
-        """獲取最近的交易數據"""
+        """獲取最近的逐筆成交，需 TradingDataCollector 寫入原始成交（見 LARGE_TRADE_MONITOR_ENABLED）"""
         query = (
             select(MarketData)
             .join(MarketData.trading_pair)
             .where(
                 and_(
                     TradingPair.symbol == symbol,
-                    MarketData.timestamp >= datetime.now() - timedelta(minutes=minutes)
+                    MarketData.timestamp >= datetime.now() - timedelta(minutes=minutes),
+                    # @ticker 列的 volume 是 24 小時成交量，只有逐筆成交沒有 open_price
+                    MarketData.open_price.is_(None)
                 )
             )
             .order_by(MarketData.timestamp.desc())
@@ -177,8 +179,9 @@ class LargeTradeMonitor:
                 return 0.0
             
             # 獲取當前中間價格
-            best_bid = float(depth.bids[0][0]) if depth.bids else 0
-            best_ask = float(depth.asks[0][0]) if depth.asks else 0
+            bids, asks = depth.get_arrays()
+            best_bid = float(bids[0, 0]) if len(bids) else 0
+            best_ask = float(asks[0, 0]) if len(asks) else 0
             mid_price = (best_bid + best_ask) / 2
             
             if mid_price == 0:
@@ -0,0 +1,435 @@
+# backend/app/simulator/market.py
+
+import math
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+SECONDS_PER_YEAR = 365 * 24 * 3600
+QUOTE_ASSETS = ('USDT', 'FDUSD', 'USDC', 'BUSD', 'BTC', 'ETH', 'BNB')
+KLINE_INTERVALS = ['1s', '1m', '3m', '5m', '15m', '30m', '1h', '2h', '4h', '6h', '8h', '12h', '1d']
+DEFAULT_PRICES = {'BTCUSDT': 60000.0, 'ETHUSDT': 3000.0, 'BNBUSDT': 550.0, 'SOLUSDT': 150.0}
+
+
+def interval_ms(interval: str) -> int:
+    """K線週期的毫秒數"""
+    if interval.endswith('s'):
+        return int(interval[:-1]) * 1000
+    return settings.get_timeframe_seconds(interval) * 1000
+
+
+@dataclass
+class SimulatorConfig:
+    """模擬行情參數；rate_multiplier 同時放大成交頻率與推送節奏"""
+    symbols: List[str] = field(default_factory=lambda: ['BTCUSDT', 'ETHUSDT', 'BNBUSDT'])
+    volatility: float = 0.8             # 年化波動率
+    drift: float = 0.0                  # 年化漂移
+    tick_interval: float = 0.1          # 生產環境 @depth@100ms 的節奏（秒）
+    rate_multiplier: float = 1.0        # 相對生產環境的消息頻率倍數
+    trades_per_second: float = 20.0     # 每個交易對每秒的平均成交數（倍數前）
+    depth_levels: int = 1000            # 每側檔位數
+    depth_changes_per_tick: int = 20    # 每步隨機變動的檔位數
+    weight_limit: int = 6000            # 每分鐘請求權重上限
+    ban_after: int = 5                  # 收到 429 後仍繼續請求多少次即返回 418
+    ban_seconds: int = 120
+    seed: Optional[int] = None
+
+    @property
+    def step_seconds(self) -> float:
+        return self.tick_interval / self.rate_multiplier
+
+
+@dataclass
+class DepthDiff:
+    """尚未推送的增量深度"""
+    first_update_id: int = 0
+    bids: Dict[int, float] = field(default_factory=dict)
+    asks: Dict[int, float] = field(default_factory=dict)
+
+
+class SimulatedSymbol:
+    """單個交易對的模擬行情：GBM 價格路徑、逐筆成交、訂單簿與K線"""
+
+    def __init__(self, symbol: str, price: float, config: SimulatorConfig, rng: np.random.Generator):
+        self.symbol = symbol
+        self.quote_asset = next((q for q in QUOTE_ASSETS if symbol.endswith(q)), symbol[-4:])
+        self.base_asset = symbol[:-len(self.quote_asset)]
+        self.config = config
+        self.rng = rng
+
+        self.price = price
+        self.price_decimals = max(2, 6 - int(math.floor(math.log10(price))))
+        self.tick_size = 10 ** -self.price_decimals
+        self.step_size = 0.00001
+        self.update_id = 1
+        self.trade_id = 0
+
+        # 訂單簿以價格檔位序號為鍵
+        self.bids: Dict[int, float] = {}
+        self.asks: Dict[int, float] = {}
+        self.best_bid = self.best_ask = 0
+        self.diffs: Dict[int, DepthDiff] = {}
+        self._rebuild_book()
+
+        now = int(time.time() * 1000)
+        self.started_at = now
+        self.stats = {
+            'open': price, 'high': price, 'low': price, 'volume': 0.0, 'quote_volume': 0.0,
+            'count': 0, 'first_id': 1, 'last_qty': 0.0
+        }
+        self.bars: Dict[str, Dict] = {interval: self._new_bar(interval, now) for interval in KLINE_INTERVALS}
+        self.closed_bars: Dict[str, Deque[Dict]] = {interval: deque(maxlen=1000) for interval in KLINE_INTERVALS}
+        self.just_closed: List[Dict] = []  # 本步收盤的K線
+
+    # 訂單簿
+
+    def _price(self, index: int) -> str:
+        return f"{index * self.tick_size:.{self.price_decimals}f}"
+
+    def _quantities(self, count: int) -> List[float]:
+        return np.round(self.rng.lognormal(0.0, 1.0, count), 5).tolist()
+
+    def _best_indices(self) -> Tuple[int, int]:
+        mid = int(round(self.price / self.tick_size))
+        return mid - 1, mid + 1
+
+    def _rebuild_book(self):
+        levels = self.config.depth_levels
+        self.best_bid, self.best_ask = self._best_indices()
+        self.bids = dict(zip(range(self.best_bid, self.best_bid - levels, -1), self._quantities(levels)))
+        self.asks = dict(zip(range(self.best_ask, self.best_ask + levels), self._quantities(levels)))
+
+    def _shift_side(self, book: Dict[int, float], changes: Dict[int, float], old_range, new_range):
+        """價格移動後移除超出範圍的檔位並補上新檔位"""
+        (old_low, old_high), (new_low, new_high) = old_range, new_range
+        if (old_low, old_high) == (new_low, new_high):
+            return
+        # 只處理兩端移出與新露出的檔位
+        for removed in (range(old_low, min(old_high, new_low - 1) + 1), range(max(old_low, new_high + 1), old_high + 1)):
+            for index in removed:
+                book.pop(index, None)
+                changes[index] = 0.0
+        for added in (range(new_low, min(new_high, old_low - 1) + 1), range(max(new_low, old_high + 1), new_high + 1)):
+            for index, quantity in zip(added, self._quantities(len(added))):
+                book[index] = changes[index] = quantity
+
+    def _update_book(self) -> Tuple[Dict[int, float], Dict[int, float]]:
+        levels = self.config.depth_levels
+        bid_changes: Dict[int, float] = {}
+        ask_changes: Dict[int, float] = {}
+        best_bid, best_ask = self._best_indices()
+
+        if abs(best_bid - self.best_bid) >= levels:
+            bid_changes.update({index: 0.0 for index in self.bids})
+            ask_changes.update({index: 0.0 for index in self.asks})
+            self._rebuild_book()
+            bid_changes.update(self.bids)
+            ask_changes.update(self.asks)
+        else:
+            self._shift_side(
+                self.bids, bid_changes,
+                (self.best_bid - levels + 1, self.best_bid), (best_bid - levels + 1, best_bid)
+            )
+            self._shift_side(
+                self.asks, ask_changes,
+                (self.best_ask, self.best_ask + levels - 1), (best_ask, best_ask + levels - 1)
+            )
+            self.best_bid, self.best_ask = best_bid, best_ask
+
+        # 隨機改變部分檔位的數量，靠近盤口的檔位變動更頻繁
+        for book, changes, best, sign in (
+            (self.bids, bid_changes, self.best_bid, -1),
+            (self.asks, ask_changes, self.best_ask, 1)
+        ):
+            count = self.config.depth_changes_per_tick
+            offsets = np.minimum(self.rng.geometric(0.05, count) - 1, levels - 1).tolist()
+            for offset, quantity in zip(offsets, self._quantities(count)):
+                index = best + sign * offset
+                book[index] = changes[index] = quantity
+
+        return bid_changes, ask_changes
+
+    def _record_diff(self, bid_changes: Dict[int, float], ask_changes: Dict[int, float]):
+        if not bid_changes and not ask_changes:
+            return
+        self.update_id += 1
+        for diff in self.diffs.values():
+            if not diff.first_update_id:
+                diff.first_update_id = self.update_id
+            diff.bids.update(bid_changes)
+            diff.asks.update(ask_changes)
+
+    def depth_snapshot(self, limit: int = 100) -> Dict:
+        """REST /api/v3/depth 格式的快照"""
+        return {
+            'lastUpdateId': self.update_id,
+            'bids': [[self._price(i), f"{self.bids[i]:.5f}"] for i in sorted(self.bids, reverse=True)[:limit]],
+            'asks': [[self._price(i), f"{self.asks[i]:.5f}"] for i in sorted(self.asks)[:limit]]
+        }
+
+    def take_depth_diff(self, cadence: int, now: int) -> Optional[Dict]:
+        """取出某個推送節奏累積的增量深度（depthUpdate 事件）"""
+        diff = self.diffs.setdefault(cadence, DepthDiff())
+        if not diff.first_update_id:
+            return None
+        self.diffs[cadence] = DepthDiff()
+        return {
+            'e': 'depthUpdate', 'E': now, 's': self.symbol,
+            'U': diff.first_update_id, 'u': self.update_id,
+            'b': [[self._price(i), f"{q:.5f}"] for i, q in sorted(diff.bids.items(), reverse=True)],
+            'a': [[self._price(i), f"{q:.5f}"] for i, q in sorted(diff.asks.items())]
+        }
+
+    # 價格與成交
+
+    def step(self, dt: float, now: int) -> List[Dict]:
+        """推進一步：更新價格、產生成交並更新訂單簿與K線，返回成交事件"""
+        dt_years = dt / SECONDS_PER_YEAR
+        sigma = self.config.volatility
+        shock = self.rng.standard_normal()
+        self.price *= math.exp((self.config.drift - 0.5 * sigma ** 2) * dt_years + sigma * math.sqrt(dt_years) * shock)
+
+        self._record_diff(*self._update_book())
+        self._roll_bars(now)
+
+        rate = self.config.trades_per_second * self.config.rate_multiplier * dt
+        trades = []
+        for _ in range(int(self.rng.poisson(rate))):
+            is_buyer_maker = bool(self.rng.random() < 0.5)
+            index = self.best_bid if is_buyer_maker else self.best_ask
+            price = index * self.tick_size
+            quantity = round(float(self.rng.lognormal(-3.0, 1.0)), 5) or self.step_size
+            self.trade_id += 1
+            trades.append({
+                'e': 'trade', 'E': now, 's': self.symbol, 't': self.trade_id,
+                'p': self._price(index), 'q': f"{quantity:.5f}", 'T': now,
+                'm': is_buyer_maker, 'M': True
+            })
+            self._apply_trade(price, quantity, is_buyer_maker)
+        return trades
+
+    def _apply_trade(self, price: float, quantity: float, is_buyer_maker: bool):
+        stats = self.stats
+        stats['high'] = max(stats['high'], price)
+        stats['low'] = min(stats['low'], price)
+        stats['volume'] += quantity
+        stats['quote_volume'] += price * quantity
+        stats['count'] += 1
+        stats['last_qty'] = quantity
+
+        for bar in self.bars.values():
+            if not bar['n']:
+                bar['o'] = bar['h'] = bar['l'] = price
+                bar['f'] = self.trade_id
+            bar['h'] = max(bar['h'], price)
+            bar['l'] = min(bar['l'], price)
+            bar['c'] = price
+            bar['v'] += quantity
+            bar['q'] += price * quantity
+            bar['n'] += 1
+            bar['L'] = self.trade_id
+            if not is_buyer_maker:
+                bar['V'] += quantity
+                bar['Q'] += price * quantity
+
+    # K線
+
+    def _new_bar(self, interval: str, now: int) -> Dict:
+        length = interval_ms(interval)
+        open_time = now - now % length
+        price = self.price
+        return {
+            't': open_time, 'T': open_time + length - 1, 'i': interval,
+            'o': price, 'h': price, 'l': price, 'c': price,
+            'v': 0.0, 'q': 0.0, 'n': 0, 'V': 0.0, 'Q': 0.0, 'f': -1, 'L': -1
+        }
+
+    def _roll_bars(self, now: int):
+        self.just_closed = []
+        for interval, bar in self.bars.items():
+            if now > bar['T']:
+                self.closed_bars[interval].append(bar)
+                self.just_closed.append(bar)
+                self.bars[interval] = self._new_bar(interval, now)
+
+    def kline_event(self, bar: Dict, closed: bool, now: int) -> Dict:
+        """@kline_<interval> 事件"""
+        fmt = f".{self.price_decimals}f"
+        return {
+            'e': 'kline', 'E': now, 's': self.symbol,
+            'k': {
+                't': bar['t'], 'T': bar['T'], 's': self.symbol, 'i': bar['i'],
+                'f': bar['f'], 'L': bar['L'],
+                'o': format(bar['o'], fmt), 'c': format(bar['c'], fmt),
+                'h': format(bar['h'], fmt), 'l': format(bar['l'], fmt),
+                'v': f"{bar['v']:.5f}", 'n': bar['n'], 'x': closed,
+                'q': f"{bar['q']:.8f}", 'V': f"{bar['V']:.5f}", 'Q': f"{bar['Q']:.8f}", 'B': '0'
+            }
+        }
+
+    def _bar_to_rest(self, bar: Dict) -> List:
+        fmt = f".{self.price_decimals}f"
+        return [
+            bar['t'], format(bar['o'], fmt), format(bar['h'], fmt), format(bar['l'], fmt),
+            format(bar['c'], fmt), f"{bar['v']:.5f}", bar['T'], f"{bar['q']:.8f}",
+            bar['n'], f"{bar['V']:.5f}", f"{bar['Q']:.8f}", '0'
+        ]
+
+    def _synthetic_bar(self, interval: str, open_time: int, length: int) -> List:
+        """模擬器啟動前的K線：由 (symbol, interval, open_time) 決定，重複請求結果一致"""
+        rng = np.random.default_rng(zlib.crc32(f"{self.symbol}:{interval}:{open_time}".encode()))
+        sigma = self.config.volatility * math.sqrt(length / 1000 / SECONDS_PER_YEAR)
+        open_price = self.stats['open'] * math.exp(0.02 * rng.standard_normal())
+        close_price = open_price * math.exp(sigma * rng.standard_normal())
+        high = max(open_price, close_price) * math.exp(abs(sigma * rng.standard_normal()) / 2)
+        low = min(open_price, close_price) * math.exp(-abs(sigma * rng.standard_normal()) / 2)
+        volume = float(rng.lognormal(0.0, 1.0)) * length / 60000
+        taker = volume * float(rng.uniform(0.3, 0.7))
+        vwap = (open_price + close_price + high + low) / 4
+        return self._bar_to_rest({
+            't': open_time, 'T': open_time + length - 1,
+            'o': open_price, 'h': high, 'l': low, 'c': close_price,
+            'v': volume, 'q': volume * vwap, 'n': int(rng.integers(1, 1000)),
+            'V': taker, 'Q': taker * vwap
+        })
+
+    def klines(
+        self,
+        interval: str,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+        limit: int = 500
+    ) -> List[List]:
+        """REST /api/v3/klines 格式的K線"""
+        length = interval_ms(interval)
+        current = self.bars[interval]
+        if start_time is not None:
+            first = start_time + (-start_time) % length
+        else:
+            last = min(end_time if end_time is not None else current['t'], current['t'])
+            last -= last % length
+            first = last - (limit - 1) * length
+
+        recorded = {bar['t']: bar for bar in self.closed_bars[interval]}
+        recorded[current['t']] = current
+        result = []
+        open_time = first
+        while len(result) < limit and open_time <= current['t']:
+            if end_time is not None and open_time > end_time:
+                break
+            bar = recorded.get(open_time)
+            result.append(
+                self._bar_to_rest(bar) if bar is not None
+                else self._synthetic_bar(interval, open_time, length)
+            )
+            open_time += length
+        return result
+
+    # 行情
+
+    def ticker_24hr(self, now: int) -> Dict:
+        """REST /api/v3/ticker/24hr 格式的行情"""
+        stats = self.stats
+        fmt = f".{self.price_decimals}f"
+        last = self.price
+        change = last - stats['open']
+        return {
+            'symbol': self.symbol,
+            'priceChange': format(change, fmt),
+            'priceChangePercent': f"{change / stats['open'] * 100:.3f}",
+            'weightedAvgPrice': format(stats['quote_volume'] / stats['volume'] if stats['volume'] else last, fmt),
+            'prevClosePrice': format(stats['open'], fmt),
+            'lastPrice': format(last, fmt),
+            'lastQty': f"{stats['last_qty']:.5f}",
+            'bidPrice': self._price(self.best_bid),
+            'bidQty': f"{self.bids.get(self.best_bid, 0.0):.5f}",
+            'askPrice': self._price(self.best_ask),
+            'askQty': f"{self.asks.get(self.best_ask, 0.0):.5f}",
+            'openPrice': format(stats['open'], fmt),
+            'highPrice': format(stats['high'], fmt),
+            'lowPrice': format(stats['low'], fmt),
+            'volume': f"{stats['volume']:.5f}",
+            'quoteVolume': f"{stats['quote_volume']:.8f}",
+            'openTime': max(self.started_at, now - 86400000),
+            'closeTime': now,
+            'firstId': stats['first_id'],
+            'lastId': self.trade_id,
+            'count': stats['count']
+        }
+
+    def ticker_event(self, now: int) -> Dict:
+        """@ticker 事件"""
+        ticker = self.ticker_24hr(now)
+        return {
+            'e': '24hrTicker', 'E': now, 's': self.symbol,
+            'p': ticker['priceChange'], 'P': ticker['priceChangePercent'], 'w': ticker['weightedAvgPrice'],
+            'x': ticker['prevClosePrice'], 'c': ticker['lastPrice'], 'Q': ticker['lastQty'],
+            'b': ticker['bidPrice'], 'B': ticker['bidQty'], 'a': ticker['askPrice'], 'A': ticker['askQty'],
+            'o': ticker['openPrice'], 'h': ticker['highPrice'], 'l': ticker['lowPrice'],
+            'v': ticker['volume'], 'q': ticker['quoteVolume'],
+            'O': ticker['openTime'], 'C': ticker['closeTime'],
+            'F': ticker['firstId'], 'L': ticker['lastId'], 'n': ticker['count']
+        }
+
+    def mini_ticker_event(self, now: int) -> Dict:
+        """@miniTicker 事件"""
+        ticker = self.ticker_24hr(now)
+        return {
+            'e': '24hrMiniTicker', 'E': now, 's': self.symbol,
+            'c': ticker['lastPrice'], 'o': ticker['openPrice'],
+            'h': ticker['highPrice'], 'l': ticker['lowPrice'],
+            'v': ticker['volume'], 'q': ticker['quoteVolume']
+        }
+
+    def symbol_info(self) -> Dict:
+        """exchangeInfo 中的交易對信息"""
+        return {
+            'symbol': self.symbol,
+            'status': 'TRADING',
+            'baseAsset': self.base_asset,
+            'quoteAsset': self.quote_asset,
+            'filters': [
+                {'filterType': 'PRICE_FILTER', 'tickSize': f"{self.tick_size:.{self.price_decimals}f}"},
+                {'filterType': 'LOT_SIZE', 'stepSize': f"{self.step_size:.5f}", 'minQty': f"{self.step_size:.5f}"},
+                {'filterType': 'NOTIONAL', 'minNotional': '5.00000000'}
+            ]
+        }
+
+
+class SimulatedMarket:
+    """所有模擬交易對"""
+
+    def __init__(self, config: SimulatorConfig):
+        self.config = config
+        rng = np.random.default_rng(config.seed)
+        self.symbols: Dict[str, SimulatedSymbol] = {
+            symbol: SimulatedSymbol(symbol, DEFAULT_PRICES.get(symbol, 100.0), config, rng)
+            for symbol in config.symbols
+        }
+
+    def get(self, symbol: str) -> Optional[SimulatedSymbol]:
+        return self.symbols.get(symbol.upper())
+
+    def step(self, now: int) -> Dict[str, List[Dict]]:
+        """推進所有交易對一步，返回各交易對的成交事件"""
+        dt = self.config.step_seconds
+        return {symbol: state.step(dt, now) for symbol, state in self.symbols.items()}
+
+    def exchange_info(self) -> Dict:
+        return {
+            'timezone': 'UTC',
+            'serverTime': int(time.time() * 1000),
+            'rateLimits': [
+                {
+                    'rateLimitType': 'REQUEST_WEIGHT', 'interval': 'MINUTE',
+                    'intervalNum': 1, 'limit': self.config.weight_limit
+                }
+            ],
+            'symbols': [state.symbol_info() for state in self.symbols.values()]
+        }
@@ -0,0 +1,400 @@
+# backend/app/simulator/server.py
+
+import asyncio
+import json
+import re
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
+
+from app.core.logging import logger
+from app.data_collectors.binance.rate_limiter import get_endpoint_weight
+from .market import KLINE_INTERVALS, SimulatedMarket, SimulatorConfig
+
+# 以 0.1 秒的基礎節奏計算的推送週期（步數）
+FAST_CADENCE = 1    # @depth@100ms、@depth<N>@100ms
+SLOW_CADENCE = 10   # @depth、@depth<N>、@ticker、@kline_<interval> 等每秒推送的流
+
+STREAM_PATTERN = re.compile(
+    r'^(?P<symbol>[a-z0-9]+)@(?:'
+    r'(?P<trade>trade)'
+    r'|kline_(?P<interval>\w+)'
+    r'|depth(?P<levels>5|10|20)?(?P<fast>@100ms)?'
+    r'|(?P<ticker>ticker|miniTicker)'
+    r')$'
+)
+CONNECTION_QUEUE_SIZE = 10000
+
+
+def parse_stream(stream: str) -> Optional[Tuple[str, str, Optional[str], int]]:
+    """解析流名稱，返回 (類型, 交易對, 參數, 推送週期)"""
+    if stream in ('!ticker@arr', '!miniTicker@arr'):
+        return ('all_ticker' if stream == '!ticker@arr' else 'all_mini_ticker', '', None, SLOW_CADENCE)
+
+    match = STREAM_PATTERN.match(stream)
+    if match is None:
+        return None
+    symbol = match['symbol'].upper()
+    if match['trade']:
+        return ('trade', symbol, None, FAST_CADENCE)
+    if match['interval']:
+        if match['interval'] not in KLINE_INTERVALS:
+            return None
+        return ('kline', symbol, match['interval'], SLOW_CADENCE)
+    if match['ticker']:
+        return (match['ticker'], symbol, None, SLOW_CADENCE)
+    cadence = FAST_CADENCE if match['fast'] else SLOW_CADENCE
+    if match['levels']:
+        return ('partial_depth', symbol, match['levels'], cadence)
+    return ('depth', symbol, None, cadence)
+
+
+class WeightLimiter:
+    """按 IP 與整分鐘窗口計算請求權重，行為與 Binance 相同：
+
+    超過上限返回 429 與 Retry-After；收到 429 後仍持續請求則返回 418 並封禁。
+    """
+
+    def __init__(self, config: SimulatorConfig):
+        self.config = config
+        self.windows: Dict[str, Tuple[int, int]] = {}
+        self.violations: Dict[str, int] = {}
+        self.banned_until: Dict[str, float] = {}
+        self.metrics = {'requests': 0, 'rate_limited': 0, 'banned': 0}
+
+    def check(self, ip: str, weight: int) -> Tuple[int, Dict[str, str]]:
+        """返回 (狀態碼, 響應頭)，狀態碼 200 表示放行"""
+        now = time.time()
+        window = int(now // 60)
+        self.metrics['requests'] += 1
+
+        if now < self.banned_until.get(ip, 0.0):
+            self.metrics['banned'] += 1
+            return 418, {'Retry-After': str(int(self.banned_until[ip] - now) + 1)}
+
+        start, used = self.windows.get(ip, (window, 0))
+        if start != window:
+            used = 0
+            self.violations.pop(ip, None)
+
+        if used + weight > self.config.weight_limit:
+            self.windows[ip] = (window, used)
+            self.violations[ip] = self.violations.get(ip, 0) + 1
+            if self.violations[ip] > self.config.ban_after:
+                self.banned_until[ip] = now + self.config.ban_seconds
+                self.metrics['banned'] += 1
+                return 418, {'Retry-After': str(self.config.ban_seconds)}
+            self.metrics['rate_limited'] += 1
+            return 429, {
+                'Retry-After': str(60 - int(now % 60)),
+                'X-MBX-USED-WEIGHT-1M': str(used)
+            }
+
+        used += weight
+        self.windows[ip] = (window, used)
+        return 200, {'X-MBX-USED-WEIGHT': str(used), 'X-MBX-USED-WEIGHT-1M': str(used)}
+
+
+class SimulatorServer:
+    """推進模擬行情並推送給 WebSocket 訂閱者"""
+
+    def __init__(self, config: SimulatorConfig):
+        self.config = config
+        self.market = SimulatedMarket(config)
+        self.limiter = WeightLimiter(config)
+        self.connections: Dict[int, Tuple[asyncio.Queue, Set[str]]] = {}
+        self.subscribers: Dict[str, Set[int]] = {}
+        self.parsed: Dict[str, Tuple[str, str, Optional[str], int]] = {}
+        self.engine_task: Optional[asyncio.Task] = None
+        self.step_count = 0
+        self.metrics = {
+            'steps': 0,
+            'overruns': 0,
+            'frames_sent': 0,
+            'trades': 0,
+            'slow_consumers_closed': 0,
+            'started_at': time.time()
+        }
+
+    # 訂閱管理
+
+    def subscribe(self, connection_id: int, streams: List[str]) -> List[str]:
+        queue, subscribed = self.connections[connection_id]
+        invalid = []
+        for stream in streams:
+            parsed = parse_stream(stream)
+            if parsed is None or (parsed[1] and self.market.get(parsed[1]) is None):
+                invalid.append(stream)
+                continue
+            self.parsed[stream] = parsed
+            subscribed.add(stream)
+            self.subscribers.setdefault(stream, set()).add(connection_id)
+        return invalid
+
+    def unsubscribe(self, connection_id: int, streams: List[str]):
+        subscribed = self.connections[connection_id][1]
+        for stream in streams:
+            subscribed.discard(stream)
+            subscribers = self.subscribers.get(stream)
+            if subscribers is not None:
+                subscribers.discard(connection_id)
+                if not subscribers:
+                    del self.subscribers[stream]
+
+    def register(self, connection_id: int) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=CONNECTION_QUEUE_SIZE)
+        self.connections[connection_id] = (queue, set())
+        return queue
+
+    def unregister(self, connection_id: int):
+        if connection_id in self.connections:
+            self.unsubscribe(connection_id, list(self.connections[connection_id][1]))
+            del self.connections[connection_id]
+
+    # 行情推進
+
+    async def run(self):
+        """按固定節奏推進行情並推送"""
+        interval = self.config.step_seconds
+        loop = asyncio.get_running_loop()
+        next_step = loop.time()
+        while True:
+            try:
+                self._step()
+            except Exception as e:
+                logger.error(f"Simulator step failed: {e}")
+
+            next_step += interval
+            delay = next_step - loop.time()
+            if delay < 0:
+                # 落後時不追趕，避免突發
+                self.metrics['overruns'] += 1
+                next_step = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    def _step(self):
+        now = int(time.time() * 1000)
+        trades = self.market.step(now)
+        self.step_count += 1
+        self.metrics['steps'] += 1
+        self.metrics['trades'] += sum(len(events) for events in trades.values())
+
+        for stream, connection_ids in list(self.subscribers.items()):
+            kind, symbol, argument, cadence = self.parsed[stream]
+            if kind != 'trade' and kind != 'kline' and self.step_count % cadence:
+                continue
+            for payload in self._payloads(kind, symbol, argument, cadence, now, trades):
+                frame = json.dumps({'stream': stream, 'data': payload})
+                for connection_id in list(connection_ids):
+                    self._send(connection_id, frame)
+
+    def _payloads(self, kind, symbol, argument, cadence, now, trades) -> List:
+        if kind == 'all_ticker':
+            return [[state.ticker_event(now) for state in self.market.symbols.values()]]
+        if kind == 'all_mini_ticker':
+            return [[state.mini_ticker_event(now) for state in self.market.symbols.values()]]
+
+        state = self.market.get(symbol)
+        if kind == 'trade':
+            return trades.get(symbol, [])
+        if kind == 'kline':
+            payloads = [
+                state.kline_event(bar, True, now)
+                for bar in state.just_closed if bar['i'] == argument
+            ]
+            if self.step_count % cadence == 0:
+                payloads.append(state.kline_event(state.bars[argument], False, now))
+            return payloads
+        if kind == 'ticker':
+            return [state.ticker_event(now)]
+        if kind == 'miniTicker':
+            return [state.mini_ticker_event(now)]
+        if kind == 'partial_depth':
+            return [state.depth_snapshot(int(argument))]
+        diff = state.take_depth_diff(cadence, now)
+        return [diff] if diff is not None else []
+
+    def _send(self, connection_id: int, frame: str):
+        connection = self.connections.get(connection_id)
+        if connection is None:
+            return
+        queue = connection[0]
+        try:
+            queue.put_nowait(frame)
+            self.metrics['frames_sent'] += 1
+        except asyncio.QueueFull:
+            # 與 Binance 相同，斷開跟不上推送的連接
+            self.metrics['slow_consumers_closed'] += 1
+            logger.warning(f"Closing slow WebSocket consumer {connection_id}")
+            self.unregister(connection_id)
+            # 清空隊列後通知寫入任務關閉連接
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+    def get_status(self) -> Dict:
+        uptime = time.time() - self.metrics['started_at']
+        return {
+            **self.metrics,
+            'uptime': uptime,
+            'frames_per_second': self.metrics['frames_sent'] / max(uptime, 1e-9),
+            'connections': len(self.connections),
+            'streams': len(self.subscribers),
+            'step_seconds': self.config.step_seconds,
+            'rate_multiplier': self.config.rate_multiplier,
+            'weight': self.limiter.metrics
+        }
+
+
+def _error(status_code: int, code: int, msg: str) -> JSONResponse:
+    return JSONResponse(status_code=status_code, content={'code': code, 'msg': msg})
+
+
+def create_app(config: Optional[SimulatorConfig] = None) -> FastAPI:
+    """建立模擬 Binance REST 與組合流 WebSocket 的應用"""
+    server = SimulatorServer(config or SimulatorConfig())
+    app = FastAPI(title="Binance Simulator")
+    app.state.simulator = server
+
+    @app.on_event("startup")
+    async def start_engine():
+        server.engine_task = asyncio.create_task(server.run())
+        logger.info(
+            f"Binance simulator started: {len(server.market.symbols)} symbols, "
+            f"step {server.config.step_seconds * 1000:.1f}ms, x{server.config.rate_multiplier}"
+        )
+
+    @app.on_event("shutdown")
+    async def stop_engine():
+        if server.engine_task is not None:
+            server.engine_task.cancel()
+
+    @app.middleware("http")
+    async def enforce_weight(request: Request, call_next):
+        if not request.url.path.startswith('/api/'):
+            return await call_next(request)
+
+        weight = get_endpoint_weight(request.url.path, dict(request.query_params))
+        ip = request.client.host if request.client else 'unknown'
+        status_code, headers = server.limiter.check(ip, weight)
+        if status_code != 200:
+            message = 'IP banned.' if status_code == 418 else 'Too much request weight used.'
+            response = _error(status_code, -1003, message)
+        else:
+            response = await call_next(request)
+        response.headers.update(headers)
+        return response
+
+    def _symbol_or_error(symbol: str):
+        state = server.market.get(symbol)
+        if state is None:
+            return None, _error(400, -1121, 'Invalid symbol.')
+        return state, None
+
+    @app.get("/api/v3/ping")
+    async def ping():
+        return {}
+
+    @app.get("/api/v3/time")
+    async def server_time():
+        return {'serverTime': int(time.time() * 1000)}
+
+    @app.get("/api/v3/exchangeInfo")
+    async def exchange_info():
+        return server.market.exchange_info()
+
+    @app.get("/api/v3/klines")
+    async def klines(
+        symbol: str,
+        interval: str,
+        startTime: Optional[int] = None,
+        endTime: Optional[int] = None,
+        limit: int = 500
+    ):
+        state, error = _symbol_or_error(symbol)
+        if error:
+            return error
+        if interval not in KLINE_INTERVALS:
+            return _error(400, -1120, 'Invalid interval.')
+        return state.klines(interval, startTime, endTime, max(1, min(limit, 1000)))
+
+    @app.get("/api/v3/depth")
+    async def depth(symbol: str, limit: int = 100):
+        state, error = _symbol_or_error(symbol)
+        if error:
+            return error
+        return state.depth_snapshot(max(1, min(limit, 5000)))
+
+    @app.get("/api/v3/ticker/24hr")
+    async def ticker_24hr(symbol: Optional[str] = None):
+        now = int(time.time() * 1000)
+        if symbol is None:
+            return [state.ticker_24hr(now) for state in server.market.symbols.values()]
+        state, error = _symbol_or_error(symbol)
+        if error:
+            return error
+        return state.ticker_24hr(now)
+
+    @app.get("/api/v3/ticker/price")
+    async def ticker_price(symbol: Optional[str] = None):
+        now = int(time.time() * 1000)
+        states = server.market.symbols.values() if symbol is None else [server.market.get(symbol)]
+        if None in states:
+            return _error(400, -1121, 'Invalid symbol.')
+        prices = [{'symbol': s.symbol, 'price': s.ticker_24hr(now)['lastPrice']} for s in states]
+        return prices if symbol is None else prices[0]
+
+    @app.get("/simulator/status")
+    async def status():
+        return server.get_status()
+
+    @app.websocket("/stream")
+    async def combined_stream(websocket: WebSocket):
+        await websocket.accept()
+        connection_id = id(websocket)
+        queue = server.register(connection_id)
+        streams = websocket.query_params.get('streams')
+        if streams:
+            server.subscribe(connection_id, streams.split('/'))
+
+        async def writer():
+            while True:
+                frame = await queue.get()
+                if frame is None:
+                    await websocket.close(code=1008)
+                    return
+                await websocket.send_text(frame)
+
+        writer_task = asyncio.create_task(writer())
+        try:
+            while True:
+                message = json.loads(await websocket.receive_text())
+                method = message.get('method')
+                params = message.get('params', [])
+                if method == 'SUBSCRIBE':
+                    invalid = server.subscribe(connection_id, params)
+                    if invalid:
+                        logger.warning(f"Rejected unknown streams: {invalid[:5]}")
+                    result = None
+                elif method == 'UNSUBSCRIBE':
+                    server.unsubscribe(connection_id, params)
+                    result = None
+                elif method == 'LIST_SUBSCRIPTIONS':
+                    result = sorted(server.connections[connection_id][1])
+                else:
+                    await websocket.send_text(json.dumps({
+                        'error': {'code': 2, 'msg': f'Invalid request: unknown method {method}'},
+                        'id': message.get('id')
+                    }))
+                    continue
+                await websocket.send_text(json.dumps({'result': result, 'id': message.get('id')}))
+        except (WebSocketDisconnect, RuntimeError, KeyError):
+            pass
+        finally:
+            writer_task.cancel()
+            server.unregister(connection_id)
+
+    return app
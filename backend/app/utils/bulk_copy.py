@@ -0,0 +1,109 @@
+# backend/app/utils/bulk_copy.py
+
+import csv
+import io
+from datetime import datetime
+from typing import Any, Dict, List, Sequence
+
+from sqlalchemy import Table, insert
+from sqlalchemy.orm import Session
+
+from app.core.logging import logger
+
+
+def columns_to_rows(columns: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    """將欄位陣列轉換為資料列字典"""
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+
+def _format_value(value: Any) -> Any:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return value
+
+
+def _columns_to_csv(columns: Dict[str, Sequence[Any]]) -> io.StringIO:
+    """將欄位陣列轉為 COPY 使用的 CSV 文本；NULL 以未加引號的空值表示"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    formatted = [
+        [_format_value(value) for value in values]
+        for values in columns.values()
+    ]
+    writer.writerows(
+        ['' if value is None else value for value in row]
+        for row in zip(*formatted)
+    )
+    buffer.seek(0)
+    return buffer
+
+
+def copy_columns(db: Session, table: Table, columns: Dict[str, Sequence[Any]]) -> int:
+    """以 PostgreSQL COPY FROM STDIN 寫入欄位陣列，不提交事務"""
+    row_count = len(next(iter(columns.values()), []))
+    if not row_count:
+        return 0
+
+    column_list = ', '.join(f'"{name}"' for name in columns)
+    sql = f'COPY {table.name} ({column_list}) FROM STDIN WITH (FORMAT csv)'
+
+    # 取得底層 psycopg2 連接，COPY 與 session 共用同一事務
+    dbapi_connection = db.connection().connection
+    with dbapi_connection.cursor() as cursor:
+        cursor.copy_expert(sql, _columns_to_csv(columns))
+    return row_count
+
+
+def copy_frame(db: Session, table_name: str, frame) -> int:
+    """以 COPY 寫入 DataFrame（欄名即列名），由 pandas 直接生成 CSV，不提交事務"""
+    if frame.empty:
+        return 0
+
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    column_list = ', '.join(f'"{name}"' for name in frame.columns)
+    sql = f'COPY {table_name} ({column_list}) FROM STDIN WITH (FORMAT csv)'
+    dbapi_connection = db.connection().connection
+    with dbapi_connection.cursor() as cursor:
+        cursor.copy_expert(sql, buffer)
+    return len(frame)
+
+
+def executemany_columns(db: Session, table: Table, columns: Dict[str, Sequence[Any]]) -> int:
+    """以 executemany 寫入欄位陣列，不提交事務"""
+    rows = columns_to_rows(columns)
+    if rows:
+        db.execute(insert(table), rows)
+    return len(rows)
+
+
+def bulk_insert_columns(
+    db: Session,
+    table: Table,
+    columns: Dict[str, Sequence[Any]],
+    method: str = 'auto'
+) -> str:
+    """以欄位陣列批次寫入，返回實際使用的方法（copy / executemany）
+
+    auto 時在 PostgreSQL 上使用 COPY，不支援時退回 executemany。
+    """
+    if method in ('auto', 'copy') and db.get_bind().dialect.name == 'postgresql':
+        try:
+            # 使用 savepoint，COPY 失敗時不影響外層事務
+            with db.begin_nested():
+                copy_columns(db, table, columns)
+            return 'copy'
+        except Exception as e:
+            if method == 'copy':
+                raise
+            logger.warning(f"COPY into {table.name} failed, falling back to executemany: {e}")
+
+    executemany_columns(db, table, columns)
+    return 'executemany'
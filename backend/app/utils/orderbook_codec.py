@@ -0,0 +1,206 @@
+# backend/app/utils/orderbook_codec.py
+
+import math
+import struct
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logging import logger
+
+MAGIC = b'OB'
+VERSION = 1
+# magic, 版本, 寬度代碼, 買檔數, 賣檔數, 價格單位, 數量單位, 最優買價 (ticks), 最優賣價相對最優買價 (ticks)
+HEADER = struct.Struct('<2sBBHHddqq')
+WIDTHS = [np.dtype('<u1'), np.dtype('<u2'), np.dtype('<u4'), np.dtype('<u8')]
+MAX_DECIMALS = 12
+MAX_UNITS = 2 ** 62
+
+Levels = Sequence[Sequence[Any]]
+
+
+def decimals_of(value: Any) -> int:
+    """數值的有效小數位數，如 '42000.01000000' → 2"""
+    exponent = Decimal(value if isinstance(value, str) else repr(float(value))).normalize().as_tuple().exponent
+    return max(-exponent, 0)
+
+
+def infer_increment(values: Sequence[Any]) -> float:
+    """以數值的最大小數位數推斷最小單位"""
+    decimals = max((decimals_of(value) for value in values), default=0)
+    return 10.0 ** -min(decimals, MAX_DECIMALS)
+
+
+def _power_of_ten(increment: float) -> Optional[int]:
+    """increment 為 10 的負冪次時返回小數位數"""
+    decimals = round(-math.log10(increment))
+    if decimals >= 0 and math.isclose(increment, 10.0 ** -decimals, rel_tol=1e-9):
+        return decimals
+    return None
+
+
+def _to_units(values: np.ndarray, increment: Optional[float]) -> Optional[np.ndarray]:
+    """換算為整數單位，無法精確表示時返回 None"""
+    if not increment or increment <= 0:
+        return None
+    scaled = values / increment
+    units = np.rint(scaled)
+    if len(units) and (np.abs(scaled - units).max() > 1e-6 or np.abs(units).max() >= MAX_UNITS):
+        return None
+    return units.astype(np.int64)
+
+
+def _from_units(units: np.ndarray, increment: float) -> np.ndarray:
+    # 以除法還原 10 的冪次單位，結果與原始十進位字串解析出的浮點數一致
+    decimals = _power_of_ten(increment)
+    if decimals is not None:
+        return units / 10.0 ** decimals
+    return units * increment
+
+
+def _scale(
+    values: np.ndarray,
+    sides: Sequence[Optional[Levels]],
+    column: int,
+    increment: Optional[float]
+) -> Tuple[np.ndarray, float]:
+    """優先使用交易規則的單位，不能整除時改用原始數值推斷的單位"""
+    units = _to_units(values, increment)
+    if units is None:
+        increment = infer_increment([level[column] for side in sides for level in side or []])
+        units = _to_units(values, increment)
+        if units is None:
+            raise ValueError("Order book values cannot be scaled to integers")
+    return units, increment
+
+
+def _width_code(values: np.ndarray) -> int:
+    """能容納所有值的最窄無符號整數寬度"""
+    peak = int(values.max()) if len(values) else 0
+    for code, dtype in enumerate(WIDTHS):
+        if peak <= np.iinfo(dtype).max:
+            return code
+    raise ValueError("Order book value out of range")
+
+
+def _levels_array(levels: Optional[Levels]) -> np.ndarray:
+    if not levels:
+        return np.empty((0, 2), dtype=np.float64)
+    return np.asarray(levels, dtype=np.float64).reshape(-1, 2)
+
+
+def encode(
+    bids: Optional[Levels],
+    asks: Optional[Levels],
+    tick_size: Optional[float] = None,
+    step_size: Optional[float] = None
+) -> bytes:
+    """將 [price, quantity] 檔位編碼為緊湊的二進位格式
+
+    價格與數量按 tick / lot 換算為整數，同一邊的相鄰價格只存差值，
+    差值與數量各自以能容納的最窄整數寬度寫入，可直接由 NumPy 讀取。
+    tick_size / step_size 不適用時以數值本身的小數位數推斷。
+    """
+    bid_levels = _levels_array(bids)
+    ask_levels = _levels_array(asks)
+    if len(bid_levels) > 0xFFFF or len(ask_levels) > 0xFFFF:
+        raise ValueError("Too many order book levels")
+
+    # 買單價格由高到低，賣單由低到高，相鄰差值皆為非負
+    bid_levels = bid_levels[np.argsort(-bid_levels[:, 0], kind='stable')]
+    ask_levels = ask_levels[np.argsort(ask_levels[:, 0], kind='stable')]
+    levels = np.concatenate([bid_levels, ask_levels])
+    if not np.isfinite(levels).all() or (len(levels) and levels.min() < 0):
+        raise ValueError("Order book values must be finite and not negative")
+
+    ticks, tick_size = _scale(levels[:, 0], (bids, asks), 0, tick_size)
+    lots, step_size = _scale(levels[:, 1], (bids, asks), 1, step_size)
+
+    n_bids = len(bid_levels)
+    bid_ticks, ask_ticks = ticks[:n_bids], ticks[n_bids:]
+    base = int(bid_ticks[0]) if len(bid_ticks) else (int(ask_ticks[0]) if len(ask_ticks) else 0)
+    ask_offset = int(ask_ticks[0]) - base if len(ask_ticks) else 0
+
+    steps = np.concatenate([-np.diff(bid_ticks), np.diff(ask_ticks)])
+    steps_code = _width_code(steps)
+    lots_code = _width_code(lots)
+
+    return b''.join([
+        HEADER.pack(
+            MAGIC, VERSION, steps_code | (lots_code << 4), n_bids, len(ask_levels),
+            tick_size, step_size, base, ask_offset
+        ),
+        steps.astype(WIDTHS[steps_code]).tobytes(),
+        lots.astype(WIDTHS[lots_code]).tobytes()
+    ])
+
+
+def is_encoded(data: Optional[bytes]) -> bool:
+    return bool(data) and bytes(data[:2]) == MAGIC
+
+
+def decode(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """解碼為 (bids, asks)，各為 shape (n, 2) 的 float64 陣列"""
+    magic, version, codes, n_bids, n_asks, tick_size, step_size, base, ask_offset = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Unsupported order book encoding (version {version})")
+
+    steps_dtype, lots_dtype = WIDTHS[codes & 0x0F], WIDTHS[codes >> 4]
+    n_bid_steps, n_ask_steps = max(n_bids - 1, 0), max(n_asks - 1, 0)
+    steps = np.frombuffer(data, dtype=steps_dtype, count=n_bid_steps + n_ask_steps, offset=HEADER.size)
+    lots = np.frombuffer(
+        data, dtype=lots_dtype, count=n_bids + n_asks,
+        offset=HEADER.size + steps.nbytes
+    )
+
+    steps = steps.astype(np.int64)
+    bid_ticks = base - np.cumsum(np.concatenate([[0], steps[:n_bid_steps]]))[:n_bids]
+    ask_ticks = base + ask_offset + np.cumsum(np.concatenate([[0], steps[n_bid_steps:]]))[:n_asks]
+
+    quantities = _from_units(lots.astype(np.int64), step_size)
+    bids = np.column_stack([_from_units(bid_ticks, tick_size), quantities[:n_bids]])
+    asks = np.column_stack([_from_units(ask_ticks, tick_size), quantities[n_bids:]])
+    return bids, asks
+
+
+def _format_levels(levels: np.ndarray, price_decimals: int, quantity_decimals: int) -> List[List[str]]:
+    return [
+        [f"{price:.{price_decimals}f}", f"{quantity:.{quantity_decimals}f}"]
+        for price, quantity in levels.tolist()
+    ]
+
+
+def decode_levels(data: bytes) -> Dict[str, List[List[str]]]:
+    """解碼為與 JSON 欄位相同的 {'bids': [[price, quantity], ...], 'asks': ...} 字串格式"""
+    _, _, _, _, _, tick_size, step_size, _, _ = HEADER.unpack_from(data)
+    bids, asks = decode(data)
+    price_decimals = _power_of_ten(tick_size)
+    quantity_decimals = _power_of_ten(step_size)
+    price_decimals = MAX_DECIMALS if price_decimals is None else price_decimals
+    quantity_decimals = MAX_DECIMALS if quantity_decimals is None else quantity_decimals
+    return {
+        'bids': _format_levels(bids, price_decimals, quantity_decimals),
+        'asks': _format_levels(asks, price_decimals, quantity_decimals)
+    }
+
+
+def storage_columns(
+    bids: Optional[Levels],
+    asks: Optional[Levels],
+    tick_size: Optional[float] = None,
+    step_size: Optional[float] = None,
+    storage: Optional[str] = None
+) -> Dict[str, Any]:
+    """按 ORDER_BOOK_STORAGE 產生訂單簿表的檔位欄位
+
+    binary 模式只寫入 book_data，bids/asks 為 NULL；無法編碼時退回 JSON。
+    三個欄位總是同時給出，同一批寫入的資料列欄位一致。
+    """
+    if (storage or settings.ORDER_BOOK_STORAGE) == 'binary':
+        try:
+            return {'bids': None, 'asks': None, 'book_data': encode(bids, asks, tick_size, step_size)}
+        except ValueError as e:
+            logger.warning(f"Storing order book as JSON: {e}")
+    return {'bids': bids, 'asks': asks, 'book_data': None}
@@ -3,9 +3,9 @@
 import sys
 from pathlib import Path
 import asyncio
+import argparse
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
-import pandas as pd
+from typing import Dict, List, Optional
 from tqdm import tqdm
 from sqlalchemy import text
 import logging
@@ -15,98 +15,91 @@ sys.path.append(str(Path(__file__).parent.parent))
 from app.core.database import SessionLocal
 from app.core.config import settings
 from app.core.logging import logger
-from app.models.market import TradingPair
-from app.data_collectors.binance.historical_collector import HistoricalDataCollector
+from app.services.symbol_registry import symbol_registry
+from app.services.historical.backfill_planner import BackfillPlanner, FetchWindow
+from app.services.historical.backfill_jobs import BackfillJobRunner
+from app.data_collectors.binance.async_historical_collector import AsyncHistoricalDataCollector
 
 class DataBackfillTool:
     def __init__(self):
         self.db = SessionLocal()
-        self.collector = HistoricalDataCollector(self.db)
-        self.progress_bars: Dict[str, tqdm] = {}
+        symbol_registry.ensure_loaded(self.db)
+        # 每次保存使用獨立 session，主 session 只用於查詢
+        self.collector = AsyncHistoricalDataCollector(self.db, session_factory=SessionLocal)
+        self.planner = BackfillPlanner(self.db)
+        self.runner = BackfillJobRunner(self.collector, SessionLocal)
 
     async def backfill_data(
         self,
         symbols: List[str],
         timeframes: Optional[List[str]] = None,
         days: int = 30,
-        clean_old_data: bool = False
+        clean_old_data: bool = False,
+        dry_run: bool = False
     ):
-        """執行數據回填"""
+        """找出缺失的K線區間，以可續傳的任務只抓取這些區間"""
         try:
-            if not timeframes:
-                timeframes = ['1h', '4h', '1d']
+            timeframes = timeframes or settings.HISTORICAL_DATA_TIMEFRAMES
 
             end_time = datetime.now()
             start_time = end_time - timedelta(days=days)
             
             # 清理舊數據（如果需要）
-            if clean_old_data:
+            if clean_old_data and not dry_run:
                 await self._clean_old_data(symbols, timeframes, start_time)
-            
-            total_tasks = len(symbols) * len(timeframes)
-            main_progress = tqdm(
-                total=total_tasks,
-                desc="Overall Progress",
-                position=0
-            )
 
-            for symbol in symbols:
-                logger.info(f"Starting backfill for {symbol}")
-                
-                for timeframe in timeframes:
-                    try:
-                        main_progress.set_description(
-                            f"Processing {symbol} {timeframe}"
-                        )
-                        
-                        # 檢查是否有重複數據
-                        existing_data = await self._check_existing_data(
-                            symbol, 
-                            timeframe, 
-                            start_time,
-                            end_time
-                        )
-                        
-                        if existing_data:
-                            logger.info(
-                                f"Data already exists for {symbol} {timeframe} "
-                                f"from {existing_data['first_date']} to {existing_data['last_date']}"
-                            )
-                            main_progress.update(1)
-                            continue
-                        
-                        # 收集數據
-                        collected_data = await self._collect_symbol_data(
-                            symbol=symbol,
-                            timeframe=timeframe,
-                            start_time=start_time,
-                            end_time=end_time
-                        )
-                        
-                        if collected_data:
-                            logger.info(
-                                f"Successfully collected {len(collected_data)} "
-                                f"{timeframe} records for {symbol}"
-                            )
-                        
-                        main_progress.update(1)
-                        
-                    except Exception as e:
-                        logger.error(
-                            f"Error collecting {timeframe} data for {symbol}: {e}"
-                        )
-                    
-                    await asyncio.sleep(1)
-            
-            main_progress.close()
-            logger.info("Backfill completed successfully")
+            # 先繼續上次中斷的任務，再規劃剩餘缺口，避免重複抓取
+            unfinished = self.runner.unfinished_jobs(symbols, timeframes)
+            for job in unfinished:
+                logger.info(
+                    f"Resuming backfill job {job.id} {job.symbol} {job.timeframe} "
+                    f"({job.status}, {job.pages_done} pages, {job.bars_saved} bars saved)"
+                )
+            if dry_run:
+                windows = self.planner.plan(symbols, timeframes, start_time, end_time)
+                return self._log_plan(windows)
+
+            if unfinished:
+                await self._run_jobs([job.id for job in unfinished])
+
+            windows = self.planner.plan(symbols, timeframes, start_time, end_time)
+            summary = self._log_plan(windows)
+            if windows:
+                await self._run_jobs(self.runner.create_jobs(windows))
+
+            logger.info(f"Backfill completed: {self.runner.get_metrics()}")
+            return summary
             
         except Exception as e:
             logger.error(f"Error during backfill: {e}")
             raise
         finally:
+            await self.collector.aclose()
             self.db.close()
 
+    def _log_plan(self, windows: List[FetchWindow]) -> Dict:
+        summary = BackfillPlanner.summarize(windows)
+        logger.info(
+            f"Backfill plan: {summary['gaps']} gaps, {summary['missing_bars']} missing bars, "
+            f"{summary['windows']} fetch windows, ~{summary['requests']} requests"
+        )
+        for window in windows:
+            for gap in window.gaps:
+                logger.info(f"Missing {gap}")
+        return summary
+
+    async def _run_jobs(self, job_ids: List[int]):
+        """執行回填任務，每頁提交後更新檢查點，中斷後可重新執行本腳本繼續"""
+        main_progress = tqdm(
+            total=len(job_ids),
+            desc="Overall Progress",
+            position=0
+        )
+
+        # 同時執行的任務數有上限，請求速率由收集器的權重限流器控制
+        await self.runner.run(job_ids, on_job_done=lambda job_id: main_progress.update(1))
+        main_progress.close()
+
     async def _clean_old_data(
         self,
         symbols: List[str],
@@ -116,12 +109,8 @@ class DataBackfillTool:
         """清理指定時間範圍之前的舊數據"""
         try:
             for symbol in symbols:
-                trading_pair = self.db.query(TradingPair).filter_by(
-                    symbol=symbol,
-                    is_active=1
-                ).first()
-                
-                if not trading_pair:
+                trading_pair_id = symbol_registry.get_id(symbol)
+                if not trading_pair_id:
                     continue
                 
                 for timeframe in timeframes:
@@ -135,7 +124,7 @@ class DataBackfillTool:
                     result = self.db.execute(
                         delete_query,
                         {
-                            "pair_id": trading_pair.id,
+                            "pair_id": trading_pair_id,
                             "timeframe": timeframe,
                             "start_time": start_time
                         }
@@ -152,167 +141,30 @@ class DataBackfillTool:
             logger.error(f"Error cleaning old data: {e}")
             self.db.rollback()
 
-    async def _collect_symbol_data(
-        self,
-        symbol: str,
-        timeframe: str,
-        start_time: datetime,
-        end_time: datetime
-    ) -> List[Dict]:
-        """改進的數據收集方法"""
-        try:
-            # 調整收集時間
-            adjusted_start = self._adjust_collection_time(start_time, timeframe)
-            adjusted_end = self._adjust_collection_time(end_time, timeframe, False)
-            
-            data = self.collector.collect_historical_data(
-                symbol=symbol,
-                timeframe=timeframe,
-                start_time=adjusted_start,
-                end_time=adjusted_end
-            )
-            
-            # 驗證數據完整性
-            if data:
-                expected_count = self._calculate_expected_records(
-                    timeframe,
-                    adjusted_start,
-                    adjusted_end
-                )
-                completeness = len(data) / expected_count
-                logger.info(
-                    f"Data completeness for {symbol} {timeframe}: "
-                    f"{completeness:.1%}"
-                )
-            
-            return data
-            
-        except Exception as e:
-            logger.error(f"Error collecting data for {symbol} {timeframe}: {e}")
-            return []
-        
-    async def _check_existing_data(
-        self,
-        symbol: str,
-        timeframe: str,
-        start_time: datetime,
-        end_time: datetime
-    ) -> Optional[Dict]:
-        """檢查指定時間範圍內是否已有數據"""
-        try:
-            trading_pair = self.db.query(TradingPair).filter_by(
-                symbol=symbol,
-                is_active=1
-            ).first()
-            
-            if not trading_pair:
-                return None
-            
-            query = text("""
-                SELECT 
-                    MIN(timestamp) as first_date,
-                    MAX(timestamp) as last_date,
-                    COUNT(*) as record_count
-                FROM historical_metrics
-                WHERE trading_pair_id = :pair_id
-                AND timeframe = :timeframe
-                AND timestamp BETWEEN :start_time AND :end_time
-            """)
-            
-            result = self.db.execute(
-                query,
-                {
-                    "pair_id": trading_pair.id,
-                    "timeframe": timeframe,
-                    "start_time": start_time,
-                    "end_time": end_time
-                }
-            ).fetchone()
-            
-            if not result or not result.record_count:
-                return None
-            
-            # 檢查數據是否完整
-            expected_count = self._calculate_expected_records(
-                timeframe,
-                start_time,
-                end_time
-            )
-            
-            if result.record_count >= expected_count * 0.95:  # 允許5%的誤差
-                return {
-                    'first_date': result.first_date,
-                    'last_date': result.last_date,
-                    'record_count': result.record_count
-                }
-            
-            return None
-            
-        except Exception as e:
-            logger.error(f"Error checking existing data: {e}")
-            return None
-
-    def _calculate_expected_records(
-        self,
-        timeframe: str,
-        start_time: datetime,
-        end_time: datetime
-    ) -> int:
-        """計算指定時間範圍內應該有的記錄數"""
-        time_diff = end_time - start_time
-        hours = time_diff.total_seconds() / 3600
-        
-        if timeframe == '1h':
-            return int(hours)
-        elif timeframe == '4h':
-            return int(hours / 4)
-        elif timeframe == '1d':
-            return int(hours / 24)
-        
-        return 0
-    
-    def _adjust_collection_time(
-        self,
-        dt: datetime,
-        timeframe: str,
-        is_start: bool = True
-    ) -> datetime:
-        """調整數據收集時間以確保完整性"""
-        if timeframe == '1d':
-            # 對於日線，使用UTC 00:00
-            dt = dt.replace(hour=0, minute=0, second=0, microsecond=0)
-            if not is_start:
-                dt += timedelta(days=1)
-        elif timeframe == '4h':
-            # 對於4小時線，調整到4小時的整數倍
-            hour = (dt.hour // 4) * 4
-            dt = dt.replace(hour=hour, minute=0, second=0, microsecond=0)
-            if not is_start:
-                dt += timedelta(hours=4)
-        elif timeframe == '1h':
-            # 對於小時線，調整到整點
-            dt = dt.replace(minute=0, second=0, microsecond=0)
-            if not is_start:
-                dt += timedelta(hours=1)
-        return dt
-
 
 async def main():
+    parser = argparse.ArgumentParser(description="Backfill missing historical klines")
+    parser.add_argument('--symbols', nargs='*', default=['BTCUSDT', 'ETHUSDT'])
+    parser.add_argument('--timeframes', nargs='*', help='default: HISTORICAL_DATA_TIMEFRAMES')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--clean', action='store_true', help='delete data older than the backfill range')
+    parser.add_argument('--dry-run', action='store_true', help='only print the missing intervals')
+    args = parser.parse_args()
+
     logging.basicConfig(
         level=logging.INFO,
         format='%(asctime)s - %(levelname)s - %(message)s'
     )
     
-    symbols = ['BTCUSDT', 'ETHUSDT']
-    
     tool = DataBackfillTool()
     
     try:
         await tool.backfill_data(
-            symbols=symbols,
-            timeframes=['1h', '4h', '1d'],
-            days=365,
-            clean_old_data=True  # 添加此參數來清理舊數據
+            symbols=args.symbols,
+            timeframes=args.timeframes,
+            days=args.days,
+            clean_old_data=args.clean,
+            dry_run=args.dry_run
         )
     except KeyboardInterrupt:
         logger.info("Backfill interrupted by user")
@@ -320,4 +172,4 @@ async def main():
         logger.error(f"Backfill failed: {e}")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# backend/scripts/benchmark_ws_decoder.py
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.data_collectors.binance.websocket import BinanceWebSocket
+from app.data_collectors.binance.messages import available_decoders, get_json_decoder
+
+def build_frames(count: int) -> List[bytes]:
+    """構建交易、行情、深度與K線的樣本消息"""
+    levels = [[f"{60000 - i * 0.01:.2f}", "0.12345000"] for i in range(20)]
+    samples = [
+        {
+            "stream": "btcusdt@trade",
+            "data": {"e": "trade", "E": 1700000000000, "s": "BTCUSDT", "t": 1, "p": "60000.01",
+                     "q": "0.01000000", "T": 1700000000000, "m": True, "M": True}
+        },
+        {
+            "stream": "btcusdt@ticker",
+            "data": {"e": "24hrTicker", "E": 1700000000000, "s": "BTCUSDT", "p": "100.00", "P": "0.17",
+                     "w": "59950.00", "c": "60000.01", "o": "59900.01", "h": "60500.00", "l": "59500.00",
+                     "v": "12345.678", "q": "740740740.12", "n": 123456}
+        },
+        {
+            "stream": "btcusdt@depth20@100ms",
+            "data": {"lastUpdateId": 123456789, "bids": levels, "asks": levels}
+        },
+        {
+            "stream": "btcusdt@kline_1m",
+            "data": {"e": "kline", "E": 1700000000000, "s": "BTCUSDT",
+                     "k": {"t": 1699999980000, "T": 1700000039999, "s": "BTCUSDT", "i": "1m",
+                           "o": "59990.00", "c": "60000.01", "h": "60010.00", "l": "59980.00",
+                           "v": "12.345", "n": 345, "x": False, "q": "740000.00",
+                           "V": "6.1", "Q": "366000.00"}}
+        }
+    ]
+    encoded = [json.dumps(sample).encode() for sample in samples]
+    return [encoded[i % len(encoded)] for i in range(count)]
+
+async def run_benchmark(decoder_name: str, frames: List[bytes], typed: bool) -> Dict:
+    """測量單個解碼器的解碼與分派吞吐量"""
+    # 不使用隊列，直接測量解碼與分派本身
+    websocket = BinanceWebSocket(name=f"bench-{decoder_name}", use_queue=False)
+    websocket.decoder = get_json_decoder(decoder_name)
+
+    async def noop(message):
+        return None
+
+    for stream in ("btcusdt@trade", "btcusdt@ticker", "btcusdt@depth20@100ms", "btcusdt@kline_1m"):
+        await websocket.add_callback(stream, noop, typed=typed)
+
+    # 只解碼
+    start = time.perf_counter()
+    loads = websocket.decoder.loads
+    for frame in frames:
+        loads(frame)
+    decode_elapsed = time.perf_counter() - start
+
+    # 解碼 + 分派
+    start = time.perf_counter()
+    for frame in frames:
+        await websocket.process_frame(frame)
+    dispatch_elapsed = time.perf_counter() - start
+
+    return {
+        'decoder': websocket.decoder.name,
+        'decode_fps': len(frames) / decode_elapsed,
+        'dispatch_fps': len(frames) / dispatch_elapsed
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description="WebSocket decoder micro-benchmark")
+    parser.add_argument('--frames', type=int, default=200000, help='number of frames per decoder')
+    parser.add_argument('--typed', action='store_true', help='deliver typed message structs to callbacks')
+    args = parser.parse_args()
+
+    frames = build_frames(args.frames)
+    print(f"Frames per run: {args.frames} (typed={args.typed})")
+    print(f"{'Decoder':<10} {'Decode fps':>15} {'Decode+dispatch fps':>22}")
+    print("-" * 50)
+
+    for name in available_decoders():
+        result = await run_benchmark(name, frames, args.typed)
+        print(f"{result['decoder']:<10} {result['decode_fps']:>15,.0f} {result['dispatch_fps']:>22,.0f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -59,16 +59,17 @@ class DataChecker:
             .limit(limit)
         )
         
-        results = self.db.execute(query).fetchall()
+        results = self.db.execute(query).scalars().all()
         
         print(f"\nLatest Order Book Data for {symbol}:")
         for ob in results:
+            levels = ob.get_levels()
             print(f"\nTimestamp: {ob.timestamp}")
             print("Top 5 Bids:")
-            for bid in ob.bids[:5]:
+            for bid in levels['bids'][:5]:
                 print(f"Price: {bid[0]}, Amount: {bid[1]}")
             print("\nTop 5 Asks:")
-            for ask in ob.asks[:5]:
+            for ask in levels['asks'][:5]:
                 print(f"Price: {ask[0]}, Amount: {ask[1]}")
     
     def check_data_quality(self):
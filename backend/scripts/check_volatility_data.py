@@ -46,13 +46,13 @@ class VolatilityDataChecker:
     def _check_duplicates(self, symbol: str, timeframe: str, days: int):
         """檢查重複數據"""
         query = text("""
-            SELECT DATE(timestamp) as date, COUNT(*) as count
+            SELECT hm.timestamp, COUNT(*) as count
             FROM historical_metrics hm
             JOIN trading_pairs tp ON hm.trading_pair_id = tp.id
             WHERE tp.symbol = :symbol 
             AND hm.timeframe = :timeframe
-            AND timestamp >= NOW() - :days * INTERVAL '1 day'
-            GROUP BY DATE(timestamp)
+            AND hm.timestamp >= NOW() - :days * INTERVAL '1 day'
+            GROUP BY hm.timestamp
             HAVING COUNT(*) > 1
         """)
         
@@ -65,7 +65,7 @@ class VolatilityDataChecker:
             self.findings.append({
                 "type": "duplicates",
                 "details": [
-                    {"date": row.date.isoformat(), "count": row.count}
+                    {"timestamp": row.timestamp.isoformat(), "count": row.count}
                     for row in results
                 ]
             })
@@ -173,7 +173,7 @@ class VolatilityDataChecker:
             
             if finding['type'] == 'duplicates':
                 for detail in finding['details']:
-                    print(f"Date: {detail['date']} - {detail['count']} records")
+                    print(f"Timestamp: {detail['timestamp']} - {detail['count']} records")
                     
             elif finding['type'] == 'anomalies':
                 for detail in finding['details']:
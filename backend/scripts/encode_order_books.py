@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# backend/scripts/encode_order_books.py
+
+import sys
+import json
+import argparse
+import logging
+from pathlib import Path
+from sqlalchemy import and_, bindparam, null, or_, select, tuple_, update
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.core.database import SessionLocal
+from app.core.logging import logger
+from app.models.market import OrderBook, OrderBookDepth
+from app.utils import orderbook_codec
+
+MODELS = {'order_books': OrderBook, 'order_book_depths': OrderBookDepth}
+
+def convert_table(model, batch_size: int, keep_json: bool, decode: bool) -> int:
+    """以 (timestamp, id) 分頁逐批轉換，每批一個事務，中斷後重跑會跳過已轉換的資料列"""
+    table = model.__table__
+    if decode:
+        pending = table.c.book_data.isnot(None)
+        statement = update(table).values(
+            bids=bindparam('new_bids', type_=table.c.bids.type),
+            asks=bindparam('new_asks', type_=table.c.asks.type),
+            book_data=null()
+        )
+    else:
+        pending = and_(table.c.book_data.is_(None), or_(table.c.bids.isnot(None), table.c.asks.isnot(None)))
+        values = {'book_data': bindparam('new_book_data')}
+        if not keep_json:
+            values.update(bids=null(), asks=null())
+        statement = update(table).values(**values)
+    statement = statement.where(
+        table.c.id == bindparam('row_id'),
+        table.c.timestamp == bindparam('row_timestamp')
+    )
+
+    converted = failed = json_bytes = binary_bytes = 0
+    last_key = None
+    db = SessionLocal()
+    try:
+        while True:
+            query = select(
+                table.c.id, table.c.timestamp, table.c.bids, table.c.asks, table.c.book_data
+            ).where(pending)
+            if last_key is not None:
+                query = query.where(tuple_(table.c.timestamp, table.c.id) > last_key)
+            rows = db.execute(
+                query.order_by(table.c.timestamp, table.c.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_key = (rows[-1].timestamp, rows[-1].id)
+
+            params = []
+            for row in rows:
+                key = {'row_id': row.id, 'row_timestamp': row.timestamp}
+                try:
+                    if decode:
+                        levels = orderbook_codec.decode_levels(row.book_data)
+                        params.append({**key, 'new_bids': levels['bids'], 'new_asks': levels['asks']})
+                    else:
+                        encoded = orderbook_codec.encode(row.bids, row.asks)
+                        params.append({**key, 'new_book_data': encoded})
+                        json_bytes += len(json.dumps([row.bids, row.asks]))
+                        binary_bytes += len(encoded)
+                except ValueError as e:
+                    failed += 1
+                    logger.warning(f"Skipping {table.name} row {row.id}: {e}")
+
+            if params:
+                db.execute(statement, params)
+            db.commit()
+            converted += len(params)
+            logger.info(f"{table.name}: {converted:,} rows converted, up to {last_key[0]}")
+    finally:
+        db.close()
+
+    if binary_bytes:
+        logger.info(
+            f"{table.name}: levels {json_bytes:,} bytes as JSON → {binary_bytes:,} bytes encoded "
+            f"({json_bytes / binary_bytes:.1f}x smaller)"
+        )
+    if failed:
+        logger.warning(f"{table.name}: {failed} rows could not be converted and were left unchanged")
+    return converted
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert order book JSON levels to the binary book_data encoding")
+    parser.add_argument('--tables', nargs='*', choices=list(MODELS), default=list(MODELS))
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--keep-json', action='store_true', help='keep bids/asks after encoding')
+    parser.add_argument('--decode', action='store_true', help='restore bids/asks from book_data (before downgrading)')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    for name in args.tables:
+        convert_table(MODELS[name], args.batch_size, args.keep_json, args.decode)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# backend/scripts/export_cold_store.py
+
+import sys
+import argparse
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from sqlalchemy import func, select
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.logging import logger
+from app.services.symbol_registry import symbol_registry
+from app.services.historical.cold_store import DATASETS, ColdStore, iter_months, month_start
+
+def first_timestamp(db, dataset: str, symbol: str, timeframe: str):
+    spec = DATASETS[dataset]
+    trading_pair_id = symbol_registry.get_id(symbol, active_only=False)
+    if trading_pair_id is None:
+        return None
+    return db.execute(
+        select(func.min(spec.model.timestamp)).where(
+            spec.model.trading_pair_id == trading_pair_id,
+            getattr(spec.model, spec.timeframe_column) == timeframe
+        )
+    ).scalar()
+
+def main():
+    parser = argparse.ArgumentParser(description="Export completed months to the columnar cold store")
+    parser.add_argument('--datasets', nargs='*', choices=list(DATASETS), default=['metrics'])
+    parser.add_argument('--symbols', nargs='*', default=['BTCUSDT', 'ETHUSDT'])
+    parser.add_argument('--timeframes', nargs='*', help='default: HISTORICAL_DATA_TIMEFRAMES')
+    parser.add_argument('--format', choices=['parquet', 'arrow'], help='default: COLD_STORE_FORMAT')
+    parser.add_argument('--overwrite', action='store_true', help='re-export months that already exist')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    store = ColdStore(format=args.format)
+    timeframes = args.timeframes or settings.HISTORICAL_DATA_TIMEFRAMES
+    # 只導出已結束的月份，當月數據仍可能被回填或更新
+    current_month = month_start(datetime.now(timezone.utc))
+
+    db = SessionLocal()
+    try:
+        symbol_registry.ensure_loaded(db)
+        for dataset in args.datasets:
+            for symbol in args.symbols:
+                for timeframe in timeframes:
+                    first = first_timestamp(db, dataset, symbol, timeframe)
+                    if first is None:
+                        continue
+                    # 回填後標記為過期的月份不在其中，會重新導出
+                    existing = set(store.months(dataset, symbol, timeframe))
+                    rows = 0
+                    for month in iter_months(first, current_month):
+                        if month >= current_month or (month in existing and not args.overwrite):
+                            continue
+                        rows += store.export_month(db, dataset, symbol, timeframe, month)
+                    logger.info(f"{dataset} {symbol} {timeframe}: exported {rows:,} rows")
+    finally:
+        db.close()
+
+    metrics = store.get_metrics()
+    logger.info(f"Exported {metrics['months_written']} months, {metrics['rows_written']:,} rows to {store.directory}")
+
+if __name__ == "__main__":
+    main()
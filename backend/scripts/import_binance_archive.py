@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# backend/scripts/import_binance_archive.py
+
+import sys
+import argparse
+import logging
+from pathlib import Path
+from tqdm import tqdm
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.core.database import SessionLocal
+from app.core.logging import logger
+from app.models.market import Exchange
+from app.services.symbol_registry import symbol_registry
+from app.services.historical.archive_importer import ArchiveImporter, discover_archives
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Import Binance public-data kline/aggTrades zip or CSV files"
+    )
+    parser.add_argument('paths', nargs='+', help='archive files or directories (searched recursively)')
+    parser.add_argument('--symbols', nargs='*', help='only import these symbols')
+    parser.add_argument('--workers', type=int, help='process pool size (default: ARCHIVE_IMPORT_WORKERS)')
+    parser.add_argument('--chunk-rows', type=int, help='CSV rows parsed per chunk (default: ARCHIVE_IMPORT_CHUNK_ROWS)')
+    parser.add_argument('--metrics', action='store_true', help='also compute historical_metrics from klines')
+    parser.add_argument('--dry-run', action='store_true', help='only list what would be imported')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    db = SessionLocal()
+    try:
+        exchange = db.query(Exchange).filter_by(name="Binance").first()
+        if exchange is None:
+            logger.error("Exchange 'Binance' not found, run the collector once to create it")
+            return
+        symbol_registry.ensure_loaded(db)
+        exchange_id = exchange.id
+    finally:
+        db.close()
+
+    importer = ArchiveImporter(
+        exchange_id=exchange_id,
+        resolve_id=lambda symbol: symbol_registry.get_id(symbol, active_only=False),
+        workers=args.workers,
+        chunk_rows=args.chunk_rows,
+        metrics=args.metrics
+    )
+    tasks = importer.plan(discover_archives(args.paths, args.symbols))
+    logger.info(f"Found {sum(len(task.files) for task in tasks)} archives in {len(tasks)} groups")
+    for task in tasks:
+        logger.info(f"  {task.name:<24} {len(task.files):>5} files")
+    if args.dry_run or not tasks:
+        return
+
+    progress = tqdm(total=len(tasks), desc="Importing")
+
+    def on_task_done(stats):
+        progress.set_description(f"Finished {stats['task']}")
+        progress.update(1)
+
+    metrics = importer.run(tasks, on_task_done=on_task_done)
+    progress.close()
+
+    logger.info(
+        f"Imported {metrics['files']} files: {metrics['rows_read']:,} rows read, "
+        f"{metrics['rows_inserted']:,} new rows in {metrics['duration']:.1f}s "
+        f"({metrics['rows_read'] / max(metrics['duration'], 1e-9):,.0f} rows/s, {metrics['errors']} errors)"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# backend/scripts/manage_partitions.py
+
+import sys
+import argparse
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.partition_manager import PartitionManager
+
+def show_status(manager: PartitionManager):
+    db = SessionLocal()
+    try:
+        for table, granularity in manager.tables.items():
+            if not manager.is_partitioned(db, table):
+                print(f"{table}: not partitioned")
+                continue
+            partitions = manager.list_partitions(db, table)
+            ranged = [p for p in partitions if not p.is_default]
+            retention = settings.PARTITION_RETENTION_DAYS.get(table)
+            print(
+                f"{table}: {len(ranged)} {granularity} partitions"
+                + (f", {ranged[0].start:%Y-%m-%d} → {ranged[-1].end:%Y-%m-%d}" if ranged else "")
+                + (f", retention {retention} days" if retention else ", kept forever")
+            )
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage time-range partitions")
+    parser.add_argument('command', choices=['status', 'maintain'], help="'maintain' pre-creates and expires partitions")
+    parser.add_argument('--drop', action='store_true', help='drop expired partitions instead of only detaching them')
+    args = parser.parse_args()
+
+    manager = PartitionManager(SessionLocal, drop_expired=True if args.drop else None)
+    if args.command == 'maintain':
+        for table, result in manager.maintain().items():
+            print(f"{table}: created {len(result['created'])}, expired {result['expired'] or 'none'}")
+    show_status(manager)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# backend/scripts/replay_market_data.py
+
+import sys
+import asyncio
+import argparse
+from pathlib import Path
+from collections import Counter
+from typing import Dict, List
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.data_collectors.binance.websocket import BinanceWebSocket
+from app.data_collectors.binance.bar_aggregator import TradeBarAggregator
+from app.data_collectors.binance.recorder import ReplayEngine, list_segments, read_segments
+
+def resolve_segments(paths: List[str]) -> List[Path]:
+    """展開目錄參數為分段文件列表"""
+    segments = []
+    for path in map(Path, paths):
+        segments.extend(list_segments(path) if path.is_dir() else [path])
+    return segments
+
+async def replay(args) -> Dict:
+    segments = resolve_segments(args.paths or [settings.RECORDER_DIRECTORY])
+    if not segments:
+        print("No recorded segments found.")
+        return {}
+
+    # 不連接、不經隊列，直接走 process_frame → dispatch
+    websocket = BinanceWebSocket(name="replay", use_queue=False)
+    counts: Counter = Counter()
+    streams = sorted({frame.stream for frame in read_segments(segments) if frame.stream})
+    if args.streams:
+        streams = [stream for stream in streams if stream in args.streams]
+
+    async def count(stream: str, payload):
+        counts[stream] += 1
+
+    aggregator = None
+    if args.bars:
+        # 只在記憶體中聚合，不寫入數據庫
+        aggregator = TradeBarAggregator(exchange_id=0, session_factory=None, specs=args.bars)
+        aggregator.subscribe(lambda bar: counts.update([f"bar {bar.spec}"]))
+
+    for stream in streams:
+        await websocket.add_callback(stream, lambda payload, stream=stream: count(stream, payload))
+        if aggregator is not None and stream.endswith('@trade'):
+            await websocket.add_callback(stream, aggregator.handle_message)
+
+    speed = None if args.speed == 'max' else float(args.speed)
+    engine = ReplayEngine(websocket, speed=speed, streams=streams)
+    metrics = await engine.replay(read_segments(segments))
+
+    print(f"Segments: {len(segments)}, streams: {len(streams)}")
+    print(
+        f"Replayed {metrics['frames_replayed']} frames in {metrics['duration']:.2f}s "
+        f"(recorded span {metrics['recorded_span']:.2f}s, "
+        f"{metrics['frames_replayed'] / max(metrics['duration'], 1e-9):,.0f} frames/s, "
+        f"{metrics['errors']} errors)"
+    )
+    for name, value in sorted(counts.items()):
+        print(f"  {name:<40} {value:>10}")
+    return metrics
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded Binance WebSocket frames")
+    parser.add_argument('paths', nargs='*', help='segment files or directories (default: RECORDER_DIRECTORY)')
+    parser.add_argument('--speed', default='max', help="1 for real time, N for N× speed, 'max' for no pacing")
+    parser.add_argument('--streams', nargs='*', help='only replay these streams')
+    parser.add_argument('--bars', nargs='*', help='aggregate @trade frames into bars, e.g. time:1m tick:1000')
+    args = parser.parse_args()
+    asyncio.run(replay(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# backend/scripts/run_simulator.py
+
+import sys
+import argparse
+from pathlib import Path
+
+import uvicorn
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.simulator.market import SimulatorConfig
+from app.simulator.server import create_app
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local Binance REST + WebSocket simulator. Point the collectors at it with "
+                    "BINANCE_REST_BASE_URL=http://HOST:PORT BINANCE_WS_BASE_URL=ws://HOST:PORT/stream"
+    )
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--symbols', nargs='*', default=['BTCUSDT', 'ETHUSDT', 'BNBUSDT'])
+    parser.add_argument('--symbol-count', type=int, default=0,
+                        help='add synthetic SIMnUSDT symbols up to this total')
+    parser.add_argument('--rate-multiplier', type=float, default=1.0,
+                        help='message rate relative to production, e.g. 10 or 100')
+    parser.add_argument('--trades-per-second', type=float, default=20.0, help='per symbol, before multiplier')
+    parser.add_argument('--volatility', type=float, default=0.8, help='annualised GBM volatility')
+    parser.add_argument('--drift', type=float, default=0.0, help='annualised GBM drift')
+    parser.add_argument('--depth-levels', type=int, default=1000)
+    parser.add_argument('--depth-changes', type=int, default=20, help='random level changes per step')
+    parser.add_argument('--weight-limit', type=int, default=6000, help='request weight per minute per IP')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    symbols = list(args.symbols)
+    symbols += [f"SIM{i}USDT" for i in range(max(args.symbol_count - len(symbols), 0))]
+
+    config = SimulatorConfig(
+        symbols=symbols,
+        volatility=args.volatility,
+        drift=args.drift,
+        rate_multiplier=args.rate_multiplier,
+        trades_per_second=args.trades_per_second,
+        depth_levels=args.depth_levels,
+        depth_changes_per_tick=args.depth_changes,
+        weight_limit=args.weight_limit,
+        seed=args.seed
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level='warning')
+
+if __name__ == "__main__":
+    main()
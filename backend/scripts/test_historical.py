@@ -15,12 +15,12 @@ def test_historical_data():
         
         # 收集BTCUSDT的1小時和4小時K線數據
         for timeframe in ['1h', '4h']:
-            data = collector.collect_historical_data(
+            saved = collector.collect_historical_data(
                 symbol="BTCUSDT",
                 timeframe=timeframe,
                 start_time=datetime.now() - timedelta(days=30)  # 獲取30天數據
             )
-            print(f"Collected {len(data)} {timeframe} klines for BTCUSDT")
+            print(f"Collected {saved} {timeframe} klines for BTCUSDT")
         
         collector.close()
 
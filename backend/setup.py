@@ -19,8 +19,9 @@ setup(
         "scipy>=1.11.0",
         "ccxt>=4.0.0",
         "python-dotenv>=1.0.0",
-        "httpx>=0.24.1",
+        "httpx[http2]>=0.24.1",
         "websockets>=11.0.3",
+        "sortedcontainers>=2.4.0",
         "psutil>=5.9.0",  # 添加 psutil 依賴
     ],
 )
\ No newline at end of file